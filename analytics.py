@@ -0,0 +1,250 @@
+"""Сводная аналитика каталога: баллы по городам и направлениям.
+
+Считается векторно по колонкам каталога (``UniColumns``) без прохода по
+словарям: коды городов и направлений и баллы оборачиваются в массивы NumPy
+без копирования, направления строки разворачиваются в пары (строка,
+направление) через таблицу комбинаций, а перцентили по группам берутся из
+одного отсортированного массива ключей «группа, балл». Итоговые таблицы —
+pandas.DataFrame.
+
+Баллы без значения (NULL) и некорректные в распределения не попадают, но
+ВУЗы с ними учитываются в количестве. Удалённые строки (``catalog.deleted``)
+не учитываются вовсе.
+
+В боте отчёт строится командой /stats (только для ADMIN_IDS) и кэшируется
+до перезагрузки каталога. Отчёт из консоли:
+
+    python analytics.py [universities.db|catalog.snap] [--top 15] [--csv папка]
+"""
+
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from catalog import norm, parse_score
+from columns import SCORE_NONE, SCORE_RAW
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+HIST_BIN = 10   # ширина столбца гистограммы баллов
+HIST_CELLS = 1 << 22   # до стольких ячеек «группа × балл» перцентили считаются по гистограмме
+STAT_COLUMNS = ["ВУЗов", "с баллом", "мин", "p10", "p25", "медиана", "p75", "p90", "макс", "среднее"]
+
+
+@dataclass
+class CatalogStats:
+    overview: pd.DataFrame      # одна строка «Все ВУЗы»
+    cities: pd.DataFrame        # по городам, по убыванию числа ВУЗов
+    specialties: pd.DataFrame   # по направлениям, так же
+    histogram: pd.Series        # ВУЗов в каждом интервале баллов (левая граница)
+
+
+def _labels(table, key):
+    """Коды значений таблицы -> номера групп по нормализованному ключу (-1 — пусто) и подписи групп."""
+    groups, labels, codes = {}, [], np.full(len(table), -1, dtype=np.int64)
+    for code in range(len(table)):
+        value = table[code].strip()
+        k = key(value)
+        if k:
+            codes[code] = groups.setdefault(k, len(labels))
+            if codes[code] == len(labels):
+                labels.append(value)
+    return codes, labels
+
+
+def _spec_pairs(spec_codes, spec_table):
+    """Пары (строка, направление) для всех строк каталога: индексы строк и номера направлений."""
+    # Все комбинации одной строкой: "," между направлениями, "\x1f" между комбинациями
+    table = spec_table if isinstance(spec_table, list) else [spec_table[c] for c in range(len(spec_table))]
+    text = "\x1f".join(table)
+    # Номер комбинации токена — сколько "\x1f" было до него (байты 0x1f и "," не встречаются внутри UTF-8 символов)
+    raw = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    separators = raw[(raw == 0x1F) | (raw == 0x2C)]
+    combo_of_token = np.r_[0, np.cumsum(separators == 0x1F)]
+
+    # Различных токенов единицы сотен: нормализуем (strip, нижний регистр — как в индексе)
+    # только их, а коды всех токенов переводим в номера направлений одной индексацией
+    token_codes, uniques = pd.factorize(np.asarray(text.replace("\x1f", ",").split(","), dtype=object))
+    groups, labels = {}, []
+    spec_of_token = np.full(len(uniques) + 1, -1, dtype=np.int64)
+    for code, token in enumerate(uniques):
+        label = token.strip()
+        if label:
+            spec_of_token[code] = groups.setdefault(label.lower(), len(labels))
+            if spec_of_token[code] == len(labels):
+                labels.append(label)
+    spec_ids = spec_of_token[token_codes]
+    keep = spec_ids >= 0
+    spec_ids, combo_of_token = spec_ids[keep], combo_of_token[keep]
+
+    # Комбинация -> различные направления по возрастанию кода (CSR: flat + offsets)
+    n_specs = max(len(labels), 1)
+    keys = np.sort(combo_of_token * n_specs + spec_ids)
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+    flat = keys % n_specs
+    offsets = np.zeros(len(spec_table) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // n_specs, minlength=len(spec_table)), out=offsets[1:])
+
+    lengths = np.diff(offsets)[spec_codes]
+    rows = np.repeat(np.arange(len(spec_codes)), lengths)
+    # Позиция каждой пары в flat: начало комбинации строки + номер внутри неё
+    ends = np.cumsum(lengths)
+    within = np.arange(len(rows)) - np.repeat(ends - lengths, lengths)
+    return rows, flat[np.repeat(offsets[:-1][spec_codes], lengths) + within], labels
+
+
+def _group_table(groups, scores, labels) -> pd.DataFrame:
+    """Количество и распределение баллов по группам (scores — float с NaN для строк без балла)."""
+    n_groups = len(labels)
+    counts = np.bincount(groups, minlength=n_groups)
+    scored = ~np.isnan(scores)
+    g, s = groups[scored], scores[scored].astype(np.int64)
+    n = np.bincount(g, minlength=n_groups)
+    has = n > 0
+
+    base = int(s.min()) if len(s) else 0
+    width = int(s.max()) - base + 1 if len(s) else 1
+    keys = g * width + (s - base)
+    if n_groups * width <= HIST_CELLS:
+        # Баллы — небольшие целые: гистограмма «группа × балл» за один bincount,
+        # k-й по величине балл группы — число столбцов, накопленная сумма которых <= k
+        cum = np.bincount(keys, minlength=n_groups * width).reshape(n_groups, width).cumsum(axis=1)
+
+        def value(rank):
+            return base + (cum <= rank[:, None]).sum(axis=1)
+    else:
+        # Один sort по ключу «группа, балл» вместо сортировки внутри каждой группы
+        ordered = np.sort(keys) % width + base
+        starts = np.cumsum(n) - n
+
+        def value(rank):
+            return ordered[np.minimum(starts + rank, max(len(ordered) - 1, 0))]
+
+    last = np.maximum(n - 1, 0)
+
+    def at(rank):
+        return np.where(has, value(rank), np.nan)
+
+    data = {"ВУЗов": counts, "с баллом": n, "мин": at(np.zeros(n_groups, dtype=np.int64))}
+    for q, name in zip(QUANTILES, ("p10", "p25", "медиана", "p75", "p90")):
+        pos = q * last   # линейная интерполяция, как pandas.quantile
+        lo = np.floor(pos).astype(np.int64)
+        low = at(lo)
+        data[name] = low + (at(np.minimum(lo + 1, last)) - low) * (pos - lo)
+    data["макс"] = at(last)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        data["среднее"] = np.bincount(g, weights=s, minlength=n_groups) / n
+    table = pd.DataFrame(data, index=pd.Index(labels, name="группа"), columns=STAT_COLUMNS)
+    return table.sort_values(["ВУЗов", "медиана"], ascending=False, kind="stable")
+
+
+def compute_stats(columns, deleted=frozenset()) -> CatalogStats:
+    """Сводка по колонкам каталога (catalog.columns, catalog.deleted)."""
+    size = len(columns.city_codes)
+    live = np.ones(size, dtype=bool)
+    if deleted:
+        live[np.fromiter(deleted, dtype=np.int64, count=len(deleted))] = False
+
+    raw = np.asarray(memoryview(columns.scores)).astype(np.int64)
+    scores = np.where((raw == SCORE_NONE) | (raw == SCORE_RAW), np.nan, raw.astype(np.float64))
+    for row, value in columns.score_raw.items():
+        ms = parse_score(value)   # строка с целым числом ("85") — тоже балл
+        if ms is not None:
+            scores[row] = ms
+    scores[~live] = np.nan
+
+    city_of_code, city_labels = _labels(columns.city_table, norm)
+    city_groups = city_of_code[np.asarray(memoryview(columns.city_codes))]
+    in_city = live & (city_groups >= 0)
+    cities = _group_table(city_groups[in_city], scores[in_city], city_labels)
+
+    spec_codes = np.asarray(memoryview(columns.spec_codes)).astype(np.int64)
+    pair_rows, pair_specs, spec_labels = _spec_pairs(spec_codes, columns.spec_table)
+    in_pairs = live[pair_rows]
+    specialties = _group_table(pair_specs[in_pairs], scores[pair_rows[in_pairs]], spec_labels)
+
+    overview = _group_table(np.zeros(int(live.sum()), dtype=np.int64), scores[live], ["Все ВУЗы"])
+    valid = scores[~np.isnan(scores)]
+    if len(valid):
+        lo = int(valid.min()) // HIST_BIN * HIST_BIN
+        edges = np.arange(lo, int(valid.max()) + HIST_BIN + 1, HIST_BIN)
+        counts, _ = np.histogram(valid, bins=edges)
+        histogram = pd.Series(counts, index=edges[:-1], name="ВУЗов")
+    else:
+        histogram = pd.Series([], dtype=np.int64, name="ВУЗов")
+    return CatalogStats(overview, cities, specialties, histogram)
+
+
+def _fmt(value) -> str:
+    return "—" if pd.isna(value) else f"{value:.0f}"
+
+
+def _rows(table: pd.DataFrame, top: int, width: int) -> list:
+    lines = [f"{'':{width}} {'ВУЗов':>6} {'p25':>5} {'мед.':>5} {'p75':>5} {'сред.':>5}"]
+    for label, r in table.head(top).iterrows():
+        name = label if len(label) <= width else label[:width - 1] + "…"
+        lines.append(
+            f"{name:{width}} {r['ВУЗов']:6.0f} {_fmt(r['p25']):>5} {_fmt(r['медиана']):>5}"
+            f" {_fmt(r['p75']):>5} {_fmt(r['среднее']):>5}"
+        )
+    return lines
+
+
+def format_report(stats: CatalogStats, top: int = 10, width: int = 16) -> str:
+    """Текстовый отчёт (моноширинные таблицы): общая сводка, топ городов и направлений, гистограмма."""
+    o = stats.overview.iloc[0]
+    lines = [
+        f"Всего ВУЗов: {o['ВУЗов']:.0f}, с баллом: {o['с баллом']:.0f}",
+        f"Балл: мин {_fmt(o['мин'])}, p10 {_fmt(o['p10'])}, p25 {_fmt(o['p25'])}, медиана {_fmt(o['медиана'])},"
+        f" p75 {_fmt(o['p75'])}, p90 {_fmt(o['p90'])}, макс {_fmt(o['макс'])}",
+        "",
+        f"Города (топ {top} из {len(stats.cities)}):",
+        *_rows(stats.cities, top, width),
+        "",
+        f"Направления (топ {top} из {len(stats.specialties)}):",
+        *_rows(stats.specialties, top, width),
+    ]
+    if len(stats.histogram):
+        peak = max(int(stats.histogram.max()), 1)
+        lines += ["", "Распределение баллов:"]
+        for left, count in stats.histogram.items():
+            lines.append(f"{left:>4}–{left + HIST_BIN - 1:<4} {count:>7} {'█' * round(20 * count / peak)}")
+    return "\n".join(lines)
+
+
+def load_columns(path: str):
+    """Колонки каталога из SQLite или снимка (по расширению .snap)."""
+    if path.endswith(".snap"):
+        from snapshot import load_snapshot
+        catalog = load_snapshot(path)
+    else:
+        from dataset import load_catalog
+        catalog = load_catalog(path)
+    if catalog is None:
+        raise SystemExit(f"Не удалось загрузить каталог: {path}")
+    return catalog.columns, catalog.deleted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сводная аналитика каталога ВУЗов")
+    parser.add_argument("source", nargs="?", default=os.getenv("DB_PATH", "universities.db"),
+                        help="universities.db или снимок .snap")
+    parser.add_argument("--top", type=int, default=15, help="строк в таблицах городов и направлений")
+    parser.add_argument("--csv", metavar="DIR", help="сохранить полные таблицы в CSV")
+    args = parser.parse_args(argv)
+
+    stats = compute_stats(*load_columns(args.source))
+    print(format_report(stats, top=args.top, width=24))
+    if args.csv:
+        os.makedirs(args.csv, exist_ok=True)
+        for name in ("overview", "cities", "specialties"):
+            getattr(stats, name).to_csv(os.path.join(args.csv, f"{name}.csv"))
+        stats.histogram.to_csv(os.path.join(args.csv, "histogram.csv"))
+        print(f"\nТаблицы сохранены в {args.csv}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Сводная аналитика (analytics.py) на синтетическом каталоге.
+
+Колонки каталога (``UniColumns``) строятся из синтетических строк, затем
+замеряется ``compute_stats``: распределения баллов по городам и направлениям,
+перцентили и гистограмма. Для сравнения считается то же «в лоб» — DataFrame
+из списка словарей, explode направлений и groupby().quantile(), — и
+проверяется, что числа совпадают.
+
+Запуск из корня репозитория: python benchmarks/bench_analytics.py [строк ...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import compute_stats  # noqa: E402
+from catalog import parse_score  # noqa: E402
+from columns import UniColumns  # noqa: E402
+from synthetic import make_universities  # noqa: E402
+
+NAIVE_LIMIT = 200_000   # «в лоб» дольше — считаем только до этого размера
+
+
+def naive(unis) -> tuple:
+    df = pd.DataFrame(unis)
+    df["score"] = [parse_score(v) if v is not None else None for v in df["MinScore"]]
+    df["score"] = df["score"].astype("float64")
+    df["city"] = df["City"].fillna("").str.strip()
+    by_city = df[df["city"] != ""].groupby(df["city"].str.lower())["score"].quantile([0.25, 0.5, 0.75]).unstack()
+    specs = df.assign(spec=df["Specialties"].fillna("").str.split(",")).explode("spec")
+    specs["spec"] = specs["spec"].str.strip()
+    specs = specs[specs["spec"] != ""].drop_duplicates(["ID", "spec"])
+    by_spec = specs.groupby(specs["spec"].str.lower())["score"].quantile([0.25, 0.5, 0.75]).unstack()
+    return by_city, by_spec
+
+
+def check(table: pd.DataFrame, expected: pd.DataFrame):
+    got = table.set_axis(table.index.str.lower())[["p25", "медиана", "p75"]].sort_index()
+    assert np.allclose(got.to_numpy(), expected.sort_index().to_numpy(), equal_nan=True)
+
+
+def run(n_rows: int):
+    unis = make_universities(n_rows)
+    started = time.perf_counter()
+    columns = UniColumns(unis)
+    built = time.perf_counter() - started
+
+    started = time.perf_counter()
+    stats = compute_stats(columns)
+    elapsed = time.perf_counter() - started
+    pairs = int(stats.specialties["ВУЗов"].sum())
+    print(f"\n== {n_rows} строк ({pairs} пар «ВУЗ, направление»), колонки {built:.1f} с")
+    print(f"compute_stats         {elapsed * 1e3:8.1f} мс")
+
+    if n_rows <= NAIVE_LIMIT:
+        started = time.perf_counter()
+        by_city, by_spec = naive(unis)
+        print(f"pandas «в лоб»        {(time.perf_counter() - started) * 1e3:8.1f} мс")
+        check(stats.cities, by_city)
+        check(stats.specialties, by_spec)
+
+
+if __name__ == "__main__":
+    for n in [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000]:
+        run(n)
@@ -0,0 +1,229 @@
+"""callback_data кнопок: коды и диспетчер по префиксу (callbacks.py) против строк.
+
+Для синтетического каталога сравниваются:
+
+* размер payload — прежние строки с названиями и ID (``citysel:<город>``,
+  ``uni_open:<ID>:<место>``) и коды ``CallbackData``; считается, сколько
+  прежних кнопок не влезли бы в 64 байта;
+* разбор — ``split(":")`` в обработчике, ``CallbackData.unpack`` (с
+  валидацией pydantic), разбор по схеме класса без модели
+  (``fields_parser``) и полный ``CallbackRouter.resolve``: префикс, разбор и
+  перевод кодов в название/ID;
+* диспетчеризация — ``propagate_event("callback_query")`` диспетчера с
+  прежней цепочкой ``@dp.callback_query(F.data.startswith(...))``
+  (обработчики с разбором ``split``) и с одним обработчиком
+  ``CallbackRouter``. Обработчики пустые, к API не обращаются: меряется
+  только выбор обработчика и разбор данных (без общего для обоих разбора
+  Update в ``feed_update``). Синхронные фильтры aiogram выполняет в пуле
+  потоков, поэтому каждый непрошедший фильтр цепочки — ещё один переход в
+  поток и обратно.
+
+Запуск из корня репозитория: python benchmarks/bench_callbacks.py [строк ...]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher, F  # noqa: E402
+from aiogram.types import CallbackQuery  # noqa: E402
+
+from callbacks import PAGE_NEXT, CallbackCodes, CallbackRouter, CityPage, CityPick, Export, SpecPage  # noqa: E402
+from callbacks import CompareAdd, SpecPick, UniOpen, UnisBack, fields_parser  # noqa: E402
+from dataset import Catalog  # noqa: E402
+from synthetic import make_universities  # noqa: E402
+
+LIMIT = 64
+REPEAT = int(os.getenv("BENCH_REPEAT", "20000"))
+EXACT = ("menu", "reset_filters", "show_all", "filter_cities", "filter_specs", "recommend", "cmp_show", "cmp_clear")
+
+
+def legacy_payloads(cat, rnd) -> dict:
+    uid = cat.universities[rnd.randrange(len(cat))]["ID"]
+    return {
+        "menu": "menu",
+        "cmp_clear": "cmp_clear",
+        "citysel": f"citysel:{rnd.choice(cat.cities)}",
+        "specsel": f"specsel:{rnd.choice(cat.specialties)}",
+        "cities": f"cities:{rnd.randrange(10)}",
+        "uni_open": f"uni_open:{uid}:2",
+        "unis_goto": f"unis_goto:2:{uid}",
+        "cmp_add": f"cmp_add:{uid}",
+        "unis_next": f"unis_next:1:120:{uid}",
+        "export": "export:xlsx",
+    }
+
+
+def coded_payloads(codes, cat, rnd) -> dict:
+    uid = cat.universities[rnd.randrange(len(cat))]["ID"]
+    return {
+        "menu": "menu",
+        "cmp_clear": "cmp_clear",
+        "citysel": codes.city_pick(rnd.choice(cat.cities)),
+        "specsel": codes.spec_pick(rnd.choice(cat.specialties)),
+        "cities": CityPage(page=rnd.randrange(10)).pack(),
+        "uni_open": codes.uni_open(uid, 2),
+        "unis_goto": codes.unis_back(uid, 2),
+        "cmp_add": codes.compare_add(uid),
+        "unis_next": f"{PAGE_NEXT}:1:120:{uid}",
+        "export": Export(fmt="xlsx").pack(),
+    }
+
+
+def sizes(cat, codes):
+    """Размер payload с названиями/ID и с кодами, по всем значениям каталога."""
+    print(f"{'кнопка':10} {'строка, байт':>14} {'> 64 байт':>10} {'коды, байт':>11}")
+    kinds = [
+        ("citysel", [f"citysel:{c}" for c in cat.cities], [codes.city_pick(c) for c in cat.cities]),
+        ("specsel", [f"specsel:{s}" for s in cat.specialties], [codes.spec_pick(s) for s in cat.specialties]),
+    ]
+    ids = [cat.universities[r]["ID"] for r in range(0, len(cat), max(1, len(cat) // 10_000))]
+    kinds.append(("uni_open", [f"uni_open:{u}:2" for u in ids], [codes.uni_open(u, 2) for u in ids]))
+    for name, old, new in kinds:
+        old_len = [len(d.encode("utf-8")) for d in old]
+        new_len = [len(d.encode("utf-8")) for d in new]
+        over = sum(n > LIMIT for n in old_len)
+        print(f"{name:10} {max(old_len):>14} {over:>10} {max(new_len):>11}")
+
+
+def timed(fn, items) -> float:
+    """Среднее время на элемент, мкс."""
+    started = time.perf_counter()
+    for _ in range(REPEAT // len(items) + 1):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - started) / ((REPEAT // len(items) + 1) * len(items)) * 1e6
+
+
+def split_parse(data: str):
+    # Как разбирали обработчики: по префиксу, затем split
+    if data.startswith("uni_open:"):
+        parts = data.split(":")
+        return parts[1], int(parts[2])
+    if data.startswith("unis_goto:"):
+        parts = data.split(":", 2)
+        return parts[2], int(parts[1])
+    if data.startswith(("citysel:", "specsel:", "cmp_add:", "export:")):
+        return data.split(":", 1)[1]
+    if data.startswith("cities:"):
+        return int(data.split(":")[1])
+    return data
+
+
+CLASSES = {"c": CityPick, "s": SpecPick, "cp": CityPage, "sp": SpecPage, "o": UniOpen,
+           "b": UnisBack, "a": CompareAdd, "x": Export}
+
+
+PARSERS = {prefix: fields_parser(cls) for prefix, cls in CLASSES.items()}
+
+
+def unpack(data: str):
+    cls = CLASSES.get(data.partition(":")[0])
+    return cls.unpack(data) if cls is not None else data
+
+
+def parse_fields(data: str):
+    parse = PARSERS.get(data.partition(":")[0])
+    return parse(data) if parse is not None else data
+
+
+def legacy_dispatcher() -> Dispatcher:
+    """Цепочка фильтров в том же порядке, что была в main.py."""
+    dp = Dispatcher()
+
+    async def noop(callback):
+        split_parse(callback.data)
+
+    chain = [F.data == "menu", F.data == "reset_filters", F.data == "show_all", F.data == "filter_cities",
+             F.data.startswith("cities:"), F.data.startswith("citysel:"), F.data == "filter_specs",
+             F.data.startswith("specs:"), F.data.startswith("specsel:"), F.data.startswith("unis_prev"),
+             F.data.startswith("unis_next"), F.data.startswith("uni_open:"), F.data.startswith("unis_goto:"),
+             F.data.startswith("export:"), F.data == "recommend", F.data.startswith("cmp_add:"),
+             F.data == "cmp_show", F.data == "cmp_clear"]
+    for flt in chain:
+        dp.callback_query.register(noop, flt)
+    return dp
+
+
+def routed_dispatcher(codes) -> Dispatcher:
+    dp = Dispatcher()
+    router = CallbackRouter(codes)
+
+    async def noop(callback, *args):
+        pass
+
+    for key in EXACT:
+        router.route(key)(noop)
+    router.route(PAGE_NEXT, "unis_next")(noop)
+    router.route("p", "unis_prev")(noop)
+    for cls, legacy in [(CityPage, "cities"), (CityPick, "citysel"), (SpecPage, "specs"), (SpecPick, "specsel"),
+                        (UniOpen, "uni_open"), (UnisBack, "unis_goto"), (CompareAdd, "cmp_add"), (Export, "export")]:
+        router.route(cls, legacy)(noop)
+    dp.callback_query.outer_middleware(router)
+    dp.callback_query.register(router.dispatch)
+    return dp
+
+
+def callback_query(data: str) -> CallbackQuery:
+    return CallbackQuery(id="1", chat_instance="bench", data=data,
+                         from_user={"id": 1, "is_bot": False, "first_name": "user"})
+
+
+async def feed(dp, bot, events) -> float:
+    """Среднее время выбора и вызова обработчика, мкс."""
+    n = max(1, REPEAT // 10 // len(events)) * len(events)
+    started = time.perf_counter()
+    for i in range(n):
+        await dp.propagate_event("callback_query", events[i % len(events)], bot=bot)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def run(n_rows: int):
+    cat = Catalog(make_universities(n_rows))
+    codes = CallbackCodes(cat)
+    print(f"\n== каталог {n_rows} ВУЗов: {len(cat.cities)} городов, {len(cat.specialties)} направлений")
+    sizes(cat, codes)
+
+    rnd = random.Random(1)
+    old = [legacy_payloads(cat, rnd) for _ in range(50)]
+    new = [coded_payloads(codes, cat, rnd) for _ in range(50)]
+    router = routed_dispatcher(codes).callback_query.outer_middleware[0]
+
+    print(f"\n{'кнопка':10} {'split, мкс':>11} {'unpack, мкс':>12} {'по схеме, мкс':>14} {'resolve, мкс':>13}")
+    for kind in old[0]:
+        olds = [p[kind] for p in old]
+        news = [p[kind] for p in new]
+        for data, legacy in zip(news, olds):
+            # Новая кнопка и прежняя строка ведут в один обработчик с одинаковыми аргументами
+            got = router.resolve(data)
+            assert got[1] is not None, data
+            if kind not in ("unis_next", "menu", "cmp_clear", "export"):
+                continue
+            assert router.resolve(legacy)[0] is got[0], legacy
+        print(f"{kind:10} {timed(split_parse, olds):11.2f} {timed(unpack, news):12.2f} "
+              f"{timed(parse_fields, news):14.2f} {timed(router.resolve, news):13.2f}")
+
+    bot = Bot("123456:" + "A" * 35)
+    legacy_updates = [callback_query(d) for p in old for d in p.values()]
+    coded_updates = [callback_query(d) for p in new for d in p.values()]
+
+    async def compare():
+        chain = await feed(legacy_dispatcher(), bot, legacy_updates)
+        routed = await feed(routed_dispatcher(codes), bot, coded_updates)
+        routed_legacy = await feed(routed_dispatcher(codes), bot, legacy_updates)
+        await bot.session.close()
+        return chain, routed, routed_legacy
+
+    chain, routed, routed_legacy = asyncio.run(compare())
+    print(f"\nдиспетчеризация, цепочка F.data (строки)  {chain:8.1f} мкс")
+    print(f"диспетчеризация, CallbackRouter (коды)    {routed:8.1f} мкс")
+    print(f"диспетчеризация, CallbackRouter (старые)  {routed_legacy:8.1f} мкс")
+
+
+if __name__ == "__main__":
+    for n in [int(a) for a in sys.argv[1:]] or [10_000, 100_000]:
+        run(n)
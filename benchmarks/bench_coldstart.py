@@ -0,0 +1,118 @@
+"""Холодный старт и память процесса: каталог из SQLite против снимка (snapshot.py).
+
+Для каждого размера каталога синтетические данные пишутся во временную
+SQLite-базу, из неё собирается снимок. Каждый замер — отдельный свежий процесс
+(как новый воркер cluster.py):
+
+* ``load`` — только загрузка каталога: ``load_catalog(db)`` или ``load_snapshot(snap)``;
+* ``main`` — весь ``import main`` (aiogram, бот, диспетчер, каталог) с DB_PATH
+  или CATALOG_SNAPSHOT.
+
+После загрузки процесс «работает»: проходит по всем строкам списка и делает
+запросы фильтров и поиска, затем читает из /proc/self/status:
+
+* RssAnon — собственная память процесса (растёт с каждым воркером);
+* RssFile — страницы файлов, в том числе снимка: они в page cache и общие
+  для всех процессов, открывших тот же файл.
+
+Запуск из корня репозитория: python benchmarks/bench_coldstart.py [строк ...]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from snapshot import build_snapshot  # noqa: E402
+from synthetic import make_universities, write_db  # noqa: E402
+
+RUNS = int(os.getenv("BENCH_RUNS", "3"))
+
+PROBE = r"""
+import json, os, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+what, source, path = sys.argv[2], sys.argv[3], sys.argv[4]
+
+if what == "main":
+    import main
+    catalog = main.catalog
+elif source == "sqlite":
+    from dataset import load_catalog
+    catalog = load_catalog(path)
+else:
+    from snapshot import load_snapshot
+    catalog = load_snapshot(path)
+ready = time.perf_counter() - started
+
+for uni in catalog.universities:
+    uni["Name"], uni["City"], uni["MinScore"]
+for city in catalog.cities:
+    catalog.index.query(city=city, score=100)
+words = catalog.search.words
+for i in range(min(200, len(words))):
+    catalog.search.search(words[i][:4])
+
+status = {}
+with open("/proc/self/status") as f:
+    for line in f:
+        key, _, value = line.partition(":")
+        if key in ("VmRSS", "RssAnon", "RssFile"):
+            status[key] = int(value.split()[0]) * 1024
+print(json.dumps({"ready": ready, **status}))
+"""
+
+
+def probe(what: str, source: str, path: str) -> dict:
+    env = {
+        **os.environ,
+        "BOT_TOKEN": "123456:BENCHMARK-TOKEN",
+        "METRICS_PORT": "0",
+        "RELOAD_INTERVAL": "0",
+        "DB_PATH": path if source == "sqlite" else os.path.join(ROOT, "universities.db"),
+        "CATALOG_SNAPSHOT": path if source == "snapshot" else "",
+    }
+    best = None
+    for _ in range(RUNS):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE, ROOT, what, source, path],
+            env=env, cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        if best is None or result["ready"] < best["ready"]:
+            best = result
+    return best
+
+
+def mb(n: int) -> str:
+    return f"{n / 2 ** 20:7.1f}"
+
+
+def run(n_rows: int, tmp: str):
+    db_path = os.path.join(tmp, f"unis_{n_rows}.db")
+    snap_path = os.path.join(tmp, f"unis_{n_rows}.snap")
+    write_db(db_path, make_universities(n_rows))
+    started = time.perf_counter()
+    build_snapshot(db_path, snap_path)
+    built = time.perf_counter() - started
+
+    print(f"\n== каталог {n_rows} ВУЗов: база {mb(os.path.getsize(db_path))} МБ, "
+          f"снимок {mb(os.path.getsize(snap_path))} МБ (сборка {built:.1f} с)")
+    print(f"{'':20} {'готов, мс':>10} {'VmRSS':>8} {'RssAnon':>8} {'RssFile':>8}   МБ")
+    for what in ("load", "main"):
+        for source, path in (("sqlite", db_path), ("snapshot", snap_path)):
+            r = probe(what, source, path)
+            print(f"{what + ' / ' + source:20} {r['ready'] * 1e3:10.1f} "
+                  f"{mb(r['VmRSS'])}  {mb(r['RssAnon'])}  {mb(r['RssFile'])}")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 10_000, 100_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            run(n, tmp)
@@ -0,0 +1,123 @@
+"""Импорт CSV (importer.py) и точечная перезагрузка каталога после него.
+
+1. Импорт: синтетический CSV на N строк (по умолчанию 1M) импортируется
+   в пустую базу, затем тот же файл повторно (все строки без изменений),
+   затем файл с 1% изменённых строк.
+2. Подхват ботом: каталог на BENCH_PICKUP_ROWS строк (100k) загружается
+   целиком, в базе меняется BENCH_PICKUP_CHANGES строк, и CatalogWatcher
+   перечитывает только их — время сравнивается с полной перезагрузкой.
+3. Проверка: в одном пакете изменений слово названия переходит от одной
+   строки к другой (постинг сначала опустевает, затем создаётся заново) —
+   поиск по точечно обновлённому каталогу совпадает с полной загрузкой.
+
+Запуск из корня репозитория: python benchmarks/bench_import.py [строк]
+"""
+
+import asyncio
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import CatalogWatcher, load_catalog  # noqa: E402
+from importer import import_file  # noqa: E402
+from synthetic import iter_universities  # noqa: E402
+
+PICKUP_ROWS = int(os.getenv("BENCH_PICKUP_ROWS", "100000"))
+PICKUP_CHANGES = int(os.getenv("BENCH_PICKUP_CHANGES", "1000"))
+
+FIELDS = ("ID", "Name", "City", "Specialties", "MinScore", "About", "Programs",
+          "Admission", "Tour_3d", "International", "Website")
+
+
+def write_csv(path: str, n: int, changed_every: int = 0, renamed=None):
+    """CSV на n строк; каждая changed_every-я строка получает новый балл и название.
+
+    renamed — {номер строки: добавка к названию}.
+    """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=FIELDS)
+        w.writeheader()
+        for i, uni in enumerate(iter_universities(n)):
+            if changed_every and i % changed_every == 0:
+                uni["Name"] += " (обновлено)"
+                uni["MinScore"] = (uni["MinScore"] or 0) + 1
+            if renamed and i in renamed:
+                uni["Name"] += renamed[i]
+            w.writerow(uni)
+
+
+def timed_import(label: str, csv_path: str, db_path: str):
+    started = time.perf_counter()
+    stats = import_file(csv_path, db_path)
+    elapsed = time.perf_counter() - started
+    print(f"{label:28} {elapsed:7.1f} с  {stats['read'] / elapsed:9.0f} строк/с   "
+          f"новых {stats['inserted']}, изменено {stats['updated']}, без изменений {stats['unchanged']}")
+
+
+def bench_import(n: int, tmp: str):
+    csv_path, db_path = os.path.join(tmp, "unis.csv"), os.path.join(tmp, "unis.db")
+    write_csv(csv_path, n)
+    print(f"\n== импорт {n} строк, CSV {os.path.getsize(csv_path) / 2 ** 20:.0f} МБ")
+    timed_import("в пустую базу", csv_path, db_path)
+    timed_import("повторно, без изменений", csv_path, db_path)
+    write_csv(csv_path, n, changed_every=100)
+    timed_import("изменён 1% строк", csv_path, db_path)
+
+
+async def bench_pickup(tmp: str):
+    csv_path, db_path = os.path.join(tmp, "pickup.csv"), os.path.join(tmp, "pickup.db")
+    write_csv(csv_path, PICKUP_ROWS)
+    import_file(csv_path, db_path)
+
+    started = time.perf_counter()
+    current = load_catalog(db_path)
+    full = time.perf_counter() - started
+
+    reloaded = []
+    watcher = CatalogWatcher(db_path, reloaded.append, current=lambda: current)
+    write_csv(csv_path, PICKUP_ROWS, changed_every=max(1, PICKUP_ROWS // PICKUP_CHANGES))
+    stats = import_file(csv_path, db_path)
+    started = time.perf_counter()
+    await watcher.check()
+    incremental = time.perf_counter() - started
+
+    new = reloaded[0]
+    print(f"\n== подхват изменений, каталог {PICKUP_ROWS} строк, изменено {stats['updated']}")
+    print(f"полная загрузка          {full * 1e3:9.1f} мс")
+    print(f"только изменённые строки {incremental * 1e3:9.1f} мс   "
+          f"(точечно: {new.changed_ids is not None}, строк {len(new.changed_ids or ())})")
+
+
+async def check_moved_word(tmp: str, n: int = 1000):
+    """Слово уходит из названия одной строки и появляется у другой в одном пакете."""
+    csv_path, db_path = os.path.join(tmp, "moved.csv"), os.path.join(tmp, "moved.db")
+    word = "Зеленодольский"
+    write_csv(csv_path, n, renamed={0: f" {word}"})
+    import_file(csv_path, db_path)
+    current = load_catalog(db_path)
+
+    reloaded = []
+    watcher = CatalogWatcher(db_path, reloaded.append, current=lambda: current)
+    write_csv(csv_path, n, renamed={1: f" {word}"})
+    import_file(csv_path, db_path)
+    assert await watcher.check(), "каталог не перезагружен"
+    new, full = reloaded[0], load_catalog(db_path)
+    assert new.changed_ids is not None, "ожидалась точечная перезагрузка"
+
+    def found(cat):
+        return [cat.universities[row]["ID"] for row in cat.search.search(word.lower(), k=10)]
+
+    assert found(new) == found(full), (found(new), found(full))
+    print(f"\n== слово перешло к другой строке в одном пакете: найдено {found(new)} — как при полной загрузке")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_import(rows, tmp)
+        asyncio.run(bench_pickup(tmp))
+        asyncio.run(check_moved_word(tmp))
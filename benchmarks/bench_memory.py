@@ -0,0 +1,85 @@
+"""Отчёт о памяти на один ВУЗ: словари против колоночного каталога.
+
+Синтетический каталог записывается во временную SQLite-базу и читается так же,
+как это делает бот, поэтому у каждой строки свои str-объекты.
+
+Запуск из корня репозитория: python benchmarks/bench_memory.py [строк ...]
+"""
+
+import gc
+import os
+import sqlite3
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columns import ByIdView, RowsView, UniColumns  # noqa: E402
+from dataset import LISTING_COLUMNS, load_catalog, row_to_listing, row_to_uni  # noqa: E402
+from synthetic import make_universities, write_db  # noqa: E402
+
+
+def measure(build) -> int:
+    """Прирост памяти (байт), который держит результат build()."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def read_rows(path: str, columns: str, convert):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [convert(r) for r in conn.execute(f"SELECT {columns} FROM universities")]
+    finally:
+        conn.close()
+
+
+def full_dicts(path):
+    """Как было изначально: все 11 колонок в словарях + UNIS_BY_ID."""
+    unis = read_rows(path, "*", row_to_uni)
+    return unis, {u["ID"]: u for u in unis}
+
+
+def listing_dicts(path):
+    """Только колонки списка, но всё ещё словари."""
+    unis = read_rows(path, LISTING_COLUMNS, row_to_listing)
+    return unis, {u["ID"]: u for u in unis}
+
+
+def columnar(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        cols = UniColumns(row_to_listing(r) for r in conn.execute(f"SELECT {LISTING_COLUMNS} FROM universities"))
+    finally:
+        conn.close()
+    return cols, RowsView(cols), ByIdView(cols)
+
+
+def report(n: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "unis.db")
+        write_db(path, make_universities(n))
+        rows = [
+            ("словари, все колонки", measure(lambda: full_dicts(path))),
+            ("словари, колонки списка", measure(lambda: listing_dicts(path))),
+            ("колонки + UniView", measure(lambda: columnar(path))),
+            ("Catalog целиком (с индексами)", measure(lambda: load_catalog(path))),
+        ]
+    print(f"\n== {n} ВУЗов")
+    for title, size in rows:
+        print(f"{title:32} {size / n:10.0f} байт/ВУЗ   {size / 1e6:9.2f} МБ")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 10_000, 100_000]
+    for n in sizes:
+        report(n)
@@ -0,0 +1,72 @@
+"""Проверка планировщика исходящих запросов против локального фейкового Bot API.
+
+Отправляет всплеск сообщений в несколько чатов и серию правок одного сообщения —
+сначала без OutboundLimiter, затем с ним — и сравнивает число ответов 429.
+
+Запуск из корня репозитория: python benchmarks/bench_outbound.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from ratelimit import OutboundLimiter  # noqa: E402
+
+PORT = int(os.getenv("FAKE_API_PORT", "18081"))
+CHATS = 20
+MESSAGES_PER_CHAT = 4
+EDITS = 10
+
+
+async def burst(limited: bool):
+    api = FakeBotAPI()
+    await api.start(PORT)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{PORT}"))
+    bot = Bot(token="123456:FAKE-TOKEN", session=session)
+    limiter = OutboundLimiter()
+    if limited:
+        bot.session.middleware(limiter)
+
+    async def send(chat_id, i):
+        try:
+            await bot.send_message(chat_id, f"msg {i}")
+        except TelegramRetryAfter:
+            pass
+
+    async def edit(i):
+        try:
+            await bot.edit_message_text(f"edit {i}", chat_id=999, message_id=1)
+        except TelegramRetryAfter:
+            pass
+
+    start = time.perf_counter()
+    tasks = [send(c, i) for c in range(1, CHATS + 1) for i in range(MESSAGES_PER_CHAT)]
+    tasks += [edit(i) for i in range(EDITS)]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    await bot.session.close()
+    await api.stop()
+    title = "с OutboundLimiter" if limited else "без ограничителя"
+    print(f"\n== {title}: {len(tasks)} запросов за {elapsed:.2f} с")
+    print(f"ответов 200: {api.count(200)}, ответов 429: {api.count(429)}")
+    if limited:
+        print("limiter:", limiter.stats())
+
+
+async def main():
+    await burst(limited=False)
+    await burst(limited=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""Подбор по баллу ЕНТ (recommend.py) против полного прохода с сортировкой.
+
+Для синтетического каталога и набора запросов (только балл, балл + город,
+балл + направление(я), всё вместе) сравниваются:
+
+* ``scan`` — проход по всем строкам, расчёт fit и полная сортировка (как
+  сделали бы «в лоб» поверх списка словарей);
+* ``index`` — ``Recommender.recommend``: бинарный поиск по отсортированному
+  индексу баллов, куча лучших k и ранняя остановка.
+
+Заодно проверяется, что оба способа возвращают одни и те же строки в том же
+порядке.
+
+Запуск из корня репозитория: python benchmarks/bench_recommend.py [строк ...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import norm, parse_score, split_specs  # noqa: E402
+from dataset import Catalog  # noqa: E402
+from recommend import MARGIN_CAP, MARGIN_WEIGHT, SPEC_WEIGHT, Recommender  # noqa: E402
+from synthetic import make_universities  # noqa: E402
+
+K = 10
+REPEAT = int(os.getenv("BENCH_REPEAT", "20"))
+
+
+def scan(unis, score, cities=(), specs=(), k=K) -> list:
+    """Эталон: fit для каждой строки и полная сортировка."""
+    wanted = {norm(c) for c in cities}
+    prefs = {norm(s) for s in specs if norm(s)}
+    ranked = []
+    for row, uni in enumerate(unis):
+        ms = parse_score(uni["MinScore"])
+        if ms is None or ms > score or (wanted and norm(uni["City"]) not in wanted):
+            continue
+        margin = score - ms
+        fit = MARGIN_WEIGHT * (1.0 - min(margin, MARGIN_CAP) / MARGIN_CAP)
+        if prefs:
+            overlap = len(prefs & {s.lower() for s in split_specs(uni["Specialties"])})
+            fit += SPEC_WEIGHT / len(prefs) * overlap
+        ranked.append((-fit, -ms, row))
+    ranked.sort()
+    return [row for _, _, row in ranked[:k]]
+
+
+def timed(fn) -> float:
+    """Среднее время вызова, мс."""
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - started) / REPEAT * 1e3
+
+
+def run(n_rows: int):
+    unis = make_universities(n_rows)
+    started = time.perf_counter()
+    cat = Catalog(unis)
+    rec = Recommender(cat)
+    print(f"\n== каталог {n_rows} ВУЗов, сборка {time.perf_counter() - started:.1f} с")
+
+    rnd = random.Random(1)
+    cases = {
+        "балл": {},
+        "балл + город": {"cities": [cat.cities[0]]},
+        "балл + направление": {"specs": [cat.specialties[0]]},
+        "балл + 3 направления": {"specs": rnd.sample(cat.specialties, 3)},
+        "всё вместе": {"cities": cat.cities[:2], "specs": rnd.sample(cat.specialties, 2)},
+    }
+    print(f"{'запрос':22} {'балл':>5} {'scan, мс':>10} {'index, мс':>10}")
+    for label, prefs in cases.items():
+        for score in (70, 100, 130):
+            got = [m.row for m in rec.recommend(score, k=K, **prefs)]
+            assert got == scan(unis, score, k=K, **prefs), (label, score)
+            slow = timed(lambda: scan(unis, score, **prefs)) if n_rows <= 100_000 else float("nan")
+            fast = timed(lambda: rec.recommend(score, k=K, **prefs))
+            print(f"{label:22} {score:5} {slow:10.2f} {fast:10.3f}")
+
+
+if __name__ == "__main__":
+    for n in [int(a) for a in sys.argv[1:]] or [10_000, 100_000]:
+        run(n)
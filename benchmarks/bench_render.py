@@ -0,0 +1,77 @@
+"""Микробенчмарк рендеринга: стоимость подготовки ответа на один callback.
+
+Сравнивает построение текста и клавиатур с нуля (как было раньше) и через
+RenderCache. Сеть не используется.
+
+Запуск из корня репозитория: python benchmarks/bench_render.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK-TOKEN")
+
+import main  # noqa: E402
+from callbacks import PAGE_NEXT, PAGE_PREV  # noqa: E402
+from paging import make_cursor  # noqa: E402
+
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "2000"))
+FULL_UNI = None   # полная карточка первого ВУЗа (в каталоге только колонки списка)
+
+
+def callbacks_uncached():
+    """Типичная последовательность callback'ов без кэша рендеринга."""
+    filters = {"city": None, "spec": None, "score": None}
+    cat = main.catalog
+    rows = main.filtered_rows(filters)
+    total_pages = max(1, -(-len(rows) // main.UNIS_PER_PAGE))
+    for page in range(3):
+        # Как render_unis_page: страница со строки start, кнопки листания — курсоры крайних строк
+        start = page * main.UNIS_PER_PAGE
+        end = min(start + main.UNIS_PER_PAGE, len(rows))
+        unis_page = [cat.universities[r] for r in rows[start:end]]
+        main.make_unis_list_text(filters, page, total_pages, len(rows))
+        prev_data = make_cursor(cat, rows, start, False, PAGE_PREV + ":") if start > 0 else None
+        next_data = make_cursor(cat, rows, end - 1, False, PAGE_NEXT + ":") if end < len(rows) else None
+        main.make_unis_keyboard(unis_page, prev_data, next_data)
+    uni = FULL_UNI
+    main.build_uni_card(uni)
+    main.make_card_keyboard(uni["ID"], 0)
+    main.build_cities_keyboard(0)
+    main.build_main_inline_menu()
+
+
+def callbacks_cached():
+    """Та же последовательность через RenderCache."""
+    filters = {"city": None, "spec": None, "score": None}
+    for page in range(3):
+        main.render_unis_page(filters, page * main.UNIS_PER_PAGE)
+    uni = FULL_UNI
+    main.format_uni_card_full(uni)
+    main.render_cache.keyboard(("card", uni["ID"], 0), lambda: main.make_card_keyboard(uni["ID"], 0))
+    main.make_cities_keyboard(0)
+    main.main_inline_menu()
+
+
+def measure(fn) -> float:
+    fn()  # прогрев (и заполнение кэша для cached-варианта)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) / (ROUNDS * 6) * 1e6  # 6 callback'ов за проход
+
+
+if __name__ == "__main__":
+    if not main.catalog.universities:
+        sys.exit("Каталог пуст — проверьте DB_PATH.")
+    first_id = main.catalog.universities[0]["ID"]
+    FULL_UNI = main.uni_details._query([first_id])[first_id]
+    before = measure(callbacks_uncached)
+    after = measure(callbacks_cached)
+    print(f"ВУЗов в каталоге: {len(main.catalog.universities)}, проходов: {ROUNDS}")
+    print(f"без кэша:  {before:8.2f} мкс / callback")
+    print(f"с кэшем:   {after:8.2f} мкс / callback")
+    print(f"ускорение: {before / after:8.1f}x")
+    print("render_cache:", main.render_cache.stats())
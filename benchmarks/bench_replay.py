@@ -0,0 +1,184 @@
+"""Replay-бенчмарк: поток синтетических апдейтов через ``dp.feed_update``.
+
+Каждый пользователь проходит типичный сценарий — /start, список, листание,
+карточка, сравнение, фильтры по городу и направлению, ввод балла, поиск по
+тексту, меню. Сценарии разных пользователей перемешаны. Сессия бота подменена
+записывающей: запросы к Bot API не уходят в сеть, а ответы (Message / True)
+формируются на месте. Лимитер исходящих запросов и метрики выключены.
+
+Каталог масштабируется от universities.db (100 строк) до синтетических 100k:
+для каждого размера строится временная SQLite-база, из которой бот грузит
+каталог и полные карточки так же, как в работе.
+
+В отчёте — апдейты/с, p50/p99 задержки и запросы к API на апдейт, в целом
+и по каждому типу действия.
+
+По умолчанию апдейты обрабатываются по одному. С ``BENCH_TASKS=1`` каждый
+апдейт запускается отдельной задачей, как в polling, а ``BENCH_API_DELAY``
+(секунды) добавляет задержку каждому запросу к API. Так проверяется
+планировщик (scheduler.py, ``UPDATE_CONCURRENCY``): пропускная способность
+и то, что апдейты одного пользователя не перемешиваются.
+
+Запуск из корня репозитория: python benchmarks/bench_replay.py [строк ...]
+"""
+
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK-TOKEN")
+os.environ["OUTBOUND_LIMITS"] = "0"
+os.environ["METRICS_PORT"] = "0"
+os.environ["RELOAD_INTERVAL"] = "0"
+
+import logging  # noqa: E402
+
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import EditMessageText, SendDocument, SendMessage  # noqa: E402
+from aiogram.types import Chat, Document, Message  # noqa: E402
+
+import main  # noqa: E402
+from dataset import DetailsStore, load_catalog  # noqa: E402
+from responses import Responder  # noqa: E402
+from sessions import MemorySessionStore  # noqa: E402
+from synthetic import make_universities, write_db  # noqa: E402
+from updates import make_stream  # noqa: E402
+
+UPDATES = int(os.getenv("BENCH_UPDATES", "5000"))
+USERS = int(os.getenv("BENCH_USERS", "200"))
+TASKS = os.getenv("BENCH_TASKS", "0") == "1"
+API_DELAY = float(os.getenv("BENCH_API_DELAY", "0"))
+
+
+class RecordingSession(BaseSession):
+    """Сессия бота без сети: запоминает вызовы и отвечает правдоподобными объектами."""
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.calls = 0
+        self._message_id = 1000
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if isinstance(method, (SendMessage, EditMessageText)):
+            if isinstance(method, SendMessage):
+                self._message_id += 1
+            return Message(
+                message_id=method.message_id if isinstance(method, EditMessageText) else self._message_id,
+                date=datetime.datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=method.text,
+            )
+        if isinstance(method, SendDocument):
+            # Как у Telegram: загруженный файл получает file_id для повторной отправки
+            self._message_id += 1
+            file_id = method.document if isinstance(method.document, str) else f"file{self._message_id}"
+            return Message(
+                message_id=self._message_id,
+                date=datetime.datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                document=Document(file_id=file_id, file_unique_id=file_id),
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+async def replay(stream: list, session: RecordingSession) -> dict:
+    by_action = {}
+    started = time.perf_counter()
+    for action, update in stream:
+        calls_before = session.calls
+        t0 = time.perf_counter()
+        await main.dp.feed_update(main.bot, update)
+        elapsed = time.perf_counter() - t0
+        entry = by_action.setdefault(action, ([], [0]))
+        entry[0].append(elapsed)
+        entry[1][0] += session.calls - calls_before
+    total = time.perf_counter() - started
+    return {"total": total, "by_action": by_action}
+
+
+async def replay_tasks(stream: list, session: RecordingSession) -> dict:
+    """Все апдейты сразу отдельными задачами; задержка — от постановки до конца обработки."""
+    by_action = {action: ([], [0]) for action, _ in stream}
+
+    async def one(action, update, t0):
+        await main.dp.feed_update(main.bot, update)
+        by_action[action][0].append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(action, update, time.perf_counter()) for action, update in stream))
+    total = time.perf_counter() - started
+    # Запросы к API в этом режиме не разделить по действиям — считаем только общее число
+    return {"total": total, "by_action": by_action}
+
+
+def print_report(n_rows: int, stream: list, result: dict, calls: int):
+    latencies = sorted(x for lat, _ in result["by_action"].values() for x in lat)
+    n = len(stream)
+    mode = f", задачами, UPDATE_CONCURRENCY={main.UPDATE_CONCURRENCY}" if TASKS else ""
+    print(f"\n== каталог {n_rows} ВУЗов, {n} апдейтов{mode}")
+    print(f"{'всего':14} {n / result['total']:10.0f} апд/с   "
+          f"p50 {percentile(latencies, 0.5) * 1e3:7.3f} мс   p99 {percentile(latencies, 0.99) * 1e3:7.3f} мс   "
+          f"API/апд {calls / n:5.2f}")
+    for action, (lat, action_calls) in sorted(result["by_action"].items()):
+        lat.sort()
+        calls_per = "" if TASKS else f"   API/апд {action_calls[0] / len(lat):5.2f}"
+        print(f"{action:14} {len(lat):10d} апд     "
+              f"p50 {percentile(lat, 0.5) * 1e3:7.3f} мс   p99 {percentile(lat, 0.99) * 1e3:7.3f} мс"
+              + calls_per)
+
+
+async def run(n_rows: int, tmp: str):
+    if n_rows <= 100:
+        db_path = main.DB_PATH
+    else:
+        db_path = os.path.join(tmp, f"unis_{n_rows}.db")
+        write_db(db_path, make_universities(n_rows))
+
+    main.uni_details.close()
+    main.uni_details = DetailsStore(db_path, main.DETAILS_CACHE_SIZE)
+    main.install_catalog(load_catalog(db_path))
+    # Новые пользователи для каждого размера каталога
+    main.session_store = MemorySessionStore(maxsize=main.SESSION_MAX_USERS)
+    main.responder = Responder(main.bot, main.get_state, main.save_state)
+
+    session = RecordingSession(API_DELAY)
+    main.bot.session = session
+    main.setup_bot_session(session)
+
+    stream = make_stream(main.catalog, UPDATES, USERS)
+    result = await (replay_tasks if TASKS else replay)(stream, session)
+    print_report(n_rows, stream, result, session.calls)
+
+
+async def bench(sizes: list):
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            await run(n, tmp)
+    main.uni_details.close()
+
+
+if __name__ == "__main__":
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 10_000, 100_000]
+    asyncio.run(bench(sizes))
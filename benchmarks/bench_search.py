@@ -0,0 +1,42 @@
+"""Бенчмарк полнотекстового поиска на синтетическом каталоге.
+
+Запуск из корня репозитория: python benchmarks/bench_search.py [строк ...]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SearchIndex  # noqa: E402
+from synthetic import make_universities  # noqa: E402
+
+QUERIES = [
+    "казну", "КазНУ", "kaznu", "казнуу", "kbtu", "алматы", "IT", "медицина",
+    "университет", "nazarbayev", "каз", "медицинский университет алматы", "kbtu almaty",
+]
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "200"))
+
+
+def bench(n: int):
+    unis = make_universities(n)
+    start = time.perf_counter()
+    index = SearchIndex(unis)
+    build = time.perf_counter() - start
+    print(f"\n== {n} строк: индекс построен за {build:.2f} с, слов в словаре: {len(index.words)}")
+    for q in QUERIES:
+        start = time.perf_counter()
+        index.search(q)  # холодный вызов (без кэша расширений слов)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            index.search(q)
+        warm = (time.perf_counter() - start) / ROUNDS
+        print(f"{q!r:36} холодный {cold * 1e3:7.3f} мс   тёплый {warm * 1e3:7.3f} мс")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 10_000, 100_000]
+    for n in sizes:
+        bench(n)
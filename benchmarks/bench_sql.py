@@ -0,0 +1,80 @@
+"""Фильтры бота в SQL (sqlcatalog.py) против индекса в памяти (CatalogIndex).
+
+Синтетический каталог пишется в SQLite, к базе применяется миграция
+нормализованной схемы. Для набора фильтров (город, направление, балл
+и их сочетания) сравниваются:
+
+* ``memory`` — ``catalog.index.query`` + срез первой страницы;
+* ``sql page`` — ``SQLCatalog.page`` (LIMIT/OFFSET), первая страница;
+* ``sql deep`` — страница в глубине списка: OFFSET против ключа последней
+  строки (``page_after``).
+
+Заодно проверяется, что SQL возвращает те же ID в том же порядке.
+
+Запуск из корня репозитория: python benchmarks/bench_sql.py [строк]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import load_catalog  # noqa: E402
+from sqlcatalog import SQLCatalog, migrate  # noqa: E402
+from synthetic import make_universities, write_db  # noqa: E402
+
+PAGE = 5
+REPEAT = int(os.getenv("BENCH_REPEAT", "200"))
+
+
+def timed(fn) -> float:
+    """Среднее время вызова, мкс."""
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - started) / REPEAT * 1e6
+
+
+def run(n_rows: int, tmp: str):
+    db_path = os.path.join(tmp, f"unis_{n_rows}.db")
+    write_db(db_path, make_universities(n_rows))
+    conn = sqlite3.connect(db_path)
+    started = time.perf_counter()
+    migrate(conn)
+    conn.close()
+    print(f"\n== каталог {n_rows} ВУЗов, миграция {time.perf_counter() - started:.1f} с")
+
+    catalog = load_catalog(db_path)
+    cat = SQLCatalog(db_path)
+    ids = [u["ID"] for u in catalog.universities]
+    city, spec = catalog.cities[0], catalog.specialties[0]
+    cases = {
+        "все": (None, None, None),
+        "город": (city, None, None),
+        "направление": (None, spec, None),
+        "балл >= 100": (None, None, 100),
+        "город + балл": (city, None, 100),
+        "город + напр. + балл": (city, spec, 100),
+    }
+    print(f"{'фильтр':22} {'строк':>7} {'memory':>9} {'sql page':>9} {'offset':>9} {'keyset':>9}   мкс")
+    for label, (c, s, score) in cases.items():
+        rows = catalog.index.query(c, s, score)
+        assert [ids[r] for r in rows] == cat.ids(c, s, score), label
+        deep = max(0, len(rows) // 2 // PAGE * PAGE)
+        _, _, key = cat.page_after(c, s, score, limit=deep) if deep else ([], None, None)
+        memory = timed(lambda: [catalog.universities[r] for r in catalog.index.query(c, s, score)[:PAGE]])
+        first = timed(lambda: cat.page(c, s, score, PAGE))
+        offset = timed(lambda: cat.page(c, s, score, PAGE, deep))
+        keyset = timed(lambda: cat.page_after(c, s, score, after=key, limit=PAGE))
+        print(f"{label:22} {len(rows):7} {memory:9.1f} {first:9.1f} {offset:9.1f} {keyset:9.1f}")
+    cat.close()
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            run(n, tmp)
@@ -0,0 +1,137 @@
+"""Проверка шардированного запуска (cluster.py) на одной машине без Telegram.
+
+Поднимает фейковый Bot API (fake_bot_api.py, без лимитов), запускает cluster.py
+в режиме webhook с N воркерами, общей SQLite-базой сессий и общим каталогом,
+отправляет в приёмник поток сценариев пользователей и ждёт, пока воркеры
+ответят. В конце останавливает кластер и проверяет, что сессии всех
+пользователей сохранены в общей базе.
+
+Запуск из корня репозитория: python benchmarks/cluster_smoke.py [воркеров] [апдейтов]
+"""
+
+import asyncio
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiohttp import ClientError, ClientSession  # noqa: E402
+
+from cluster import SECRET_HEADER, shard_for, update_user_id  # noqa: E402
+from dataset import load_catalog  # noqa: E402
+from fake_bot_api import FakeBotAPI  # noqa: E402
+from updates import make_stream  # noqa: E402
+
+API_PORT = int(os.getenv("FAKE_API_PORT", "18082"))
+FRONT_PORT = int(os.getenv("CLUSTER_FRONT_PORT", "18090"))
+BASE_PORT = int(os.getenv("CLUSTER_BASE_PORT", "18100"))
+SECRET = "smoke-secret"
+
+
+async def wait_ready(http: ClientSession, url: str, timeout: float = 60.0):
+    """Ждёт, пока по адресу начнут отвечать (любым HTTP-статусом)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(url):
+                return
+        except ClientError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} не отвечает")
+
+
+async def wait_quiet(api: FakeBotAPI, quiet: float = 1.5, timeout: float = 120.0) -> float:
+    """Ждёт, пока вызовы Bot API не прекратятся; возвращает время последнего вызова."""
+    deadline = time.monotonic() + timeout
+    seen = -1
+    while time.monotonic() < deadline:
+        await asyncio.sleep(quiet)
+        if len(api.calls) == seen:
+            break
+        seen = len(api.calls)
+    return api.calls[-1][0] if api.calls else time.monotonic()
+
+
+async def main(n_workers: int, n_updates: int):
+    api = FakeBotAPI(global_limit=10 ** 9, chat_limit=10 ** 9)
+    await api.start(API_PORT)
+    tmp = tempfile.mkdtemp()
+    sessions_db = os.path.join(tmp, "sessions.db")
+    env = {
+        **os.environ,
+        "BOT_TOKEN": "123456:CLUSTER-SMOKE",
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{API_PORT}",
+        "BOT_MODE": "webhook",
+        "WEBHOOK_HOST": "127.0.0.1",
+        "WEBHOOK_PORT": str(FRONT_PORT),
+        "WEBHOOK_PATH": "/webhook",
+        "WEBHOOK_SECRET": SECRET,
+        "SESSION_DB_PATH": sessions_db,
+        "SESSION_FLUSH_INTERVAL": "0.5",
+        "METRICS_PORT": "0",
+        "OUTBOUND_LIMITS": "0",
+        "RELOAD_INTERVAL": "0",
+    }
+    cluster = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "cluster.py"), "--workers", str(n_workers), "--base-port", str(BASE_PORT)],
+        env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    catalog = load_catalog(os.path.join(ROOT, "universities.db"))
+    stream = [u.model_dump(mode="json", by_alias=True, exclude_none=True) for _, u in make_stream(catalog, n_updates, 200)]
+    users = {update_user_id(u) for u in stream}
+    per_worker = [0] * n_workers
+    for u in stream:
+        per_worker[shard_for(u, n_workers)] += 1
+
+    url = f"http://127.0.0.1:{FRONT_PORT}/webhook"
+    try:
+        async with ClientSession() as http:
+            await wait_ready(http, url)
+            for i in range(n_workers):
+                await wait_ready(http, f"http://127.0.0.1:{BASE_PORT + i}/update")
+
+            # Параллельно по пользователям, по порядку внутри каждого — как Telegram
+            by_user = {}
+            for u in stream:
+                by_user.setdefault(update_user_id(u), []).append(u)
+
+            async def post_user(updates):
+                for u in updates:
+                    async with http.post(url, json=u, headers={SECRET_HEADER: SECRET}) as resp:
+                        assert resp.status == 200, resp.status
+
+            started = time.monotonic()
+            await asyncio.gather(*(post_user(ups) for ups in by_user.values()))
+            posted = time.monotonic()
+            last_call = await wait_quiet(api)
+    finally:
+        cluster.send_signal(signal.SIGTERM)
+        cluster.wait(30)
+        await api.stop()
+
+    conn = sqlite3.connect(sessions_db)
+    saved = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    conn.close()
+
+    elapsed = last_call - started
+    print(f"\n== {n_workers} воркеров, {len(stream)} апдейтов от {len(users)} пользователей")
+    print(f"по воркерам:        {per_worker}")
+    print(f"отправка в приёмник {posted - started:6.2f} с")
+    print(f"обработка           {elapsed:6.2f} с   ({len(stream) / elapsed:.0f} апд/с)")
+    print(f"запросов к Bot API  {len(api.calls)}   ({len(api.calls) / len(stream):.2f} на апдейт)")
+    print(f"сессий в общей базе {saved} из {len(users)}")
+    if saved < len(users):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    updates = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    asyncio.run(main(workers, updates))
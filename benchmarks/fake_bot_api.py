@@ -0,0 +1,85 @@
+"""Локальная имитация Telegram Bot API для проверки исходящих лимитов.
+
+Отвечает на sendMessage / editMessageText и т.п. как настоящий сервер и, как он,
+возвращает 429 с ``retry_after``, если в скользящем окне превышено 30 сообщений
+всего или ``chat_limit`` сообщений в одном чате. Окно чуть короче секунды —
+запас на сетевой джиттер между клиентом и сервером. Все вызовы записываются.
+
+Использование: ``FakeBotAPI().start(port)`` и бот с сессией
+``AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}"))``.
+"""
+
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+
+class FakeBotAPI:
+    def __init__(self, global_limit: int = 30, chat_limit: int = 1, retry_after: int = 1, window: float = 0.9):
+        self.global_limit = global_limit
+        self.chat_limit = chat_limit
+        self.window = window
+        self.retry_after = retry_after
+        self.calls = []            # (время, метод, chat_id, статус)
+        self._global = deque()
+        self._chats = defaultdict(deque)
+        self._message_id = 0
+        self._runner = None
+
+    def _window(self, q: deque, now: float) -> deque:
+        while q and q[0] <= now - self.window:
+            q.popleft()
+        return q
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        chat_id = data.get("chat_id")
+        now = time.monotonic()
+
+        if chat_id is not None:
+            g = self._window(self._global, now)
+            c = self._window(self._chats[chat_id], now)
+            if len(g) >= self.global_limit or len(c) >= self.chat_limit:
+                self.calls.append((now, method, chat_id, 429))
+                return web.json_response(
+                    {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {self.retry_after}",
+                        "parameters": {"retry_after": self.retry_after},
+                    },
+                    status=429,
+                )
+            g.append(now)
+            c.append(now)
+
+        self.calls.append((now, method, chat_id, 200))
+        if method.lower() in ("sendmessage", "editmessagetext"):
+            self._message_id += 1
+            result = {
+                "message_id": int(data.get("message_id") or self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"},
+                "text": data.get("text", ""),
+            }
+        elif method.lower() == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, port: int, host: str = "127.0.0.1"):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def count(self, status: int) -> int:
+        return sum(1 for c in self.calls if c[3] == status)
@@ -0,0 +1,79 @@
+"""Генератор синтетического каталога для бенчмарков.
+
+Строки имеют ту же форму, что и словари из ``load_from_sqlite()``; названия,
+города и направления комбинируются из реальных значений universities.db,
+поэтому распределение токенов похоже на настоящее.
+"""
+
+import os
+import random
+import sqlite3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB = os.path.join(ROOT, "universities.db")
+
+_SUFFIXES = ["", " (филиал)", " College", " Academy", " им. Абая", " Tech", " Online", " Институт"]
+
+
+def load_seed_rows(db_path: str = DEFAULT_DB) -> list:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(r) for r in conn.execute("SELECT * FROM universities")]
+    finally:
+        conn.close()
+
+
+def make_universities(n: int, seed: int = 42, db_path: str = DEFAULT_DB) -> list:
+    """n синтетических ВУЗов в формате словарей main.universities."""
+    return list(iter_universities(n, seed, db_path))
+
+
+def iter_universities(n: int, seed: int = 42, db_path: str = DEFAULT_DB):
+    """То же, что make_universities, но по одному ВУЗу — для файлов на миллионы строк."""
+    rnd = random.Random(seed)
+    base = load_seed_rows(db_path)
+    cities = sorted({r["city"] for r in base})
+    specs = sorted({s.strip() for r in base for s in (r["specialties"] or "").split(",") if s.strip()})
+
+    for i in range(n):
+        src = base[i % len(base)]
+        name = src["name"] if i < len(base) else f"{src['name']}{rnd.choice(_SUFFIXES)} #{i}"
+        yield {
+            "ID": f"S{i:07d}" if i >= len(base) else src["id"],
+            "Name": name,
+            "City": rnd.choice(cities) if i >= len(base) else src["city"],
+            "Specialties": ", ".join(rnd.sample(specs, rnd.randint(1, 3))) if i >= len(base) else src["specialties"],
+            "MinScore": rnd.randint(50, 140) if i >= len(base) else src["min_score"],
+            "About": src["about"] or "",
+            "Programs": src["programs"] or "",
+            "Admission": src["admission"] or "",
+            "Tour_3d": src["tour_3d"] or "",
+            "International": src["international"] or "",
+            "Website": src["website"] or "",
+        }
+
+
+SCHEMA = """
+CREATE TABLE universities (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL, city TEXT NOT NULL, specialties TEXT,
+    min_score INTEGER, about TEXT, programs TEXT, admission TEXT, tour_3d TEXT,
+    international TEXT, website TEXT
+)
+"""
+
+
+def write_db(path: str, unis: list):
+    """Записывает ВУЗы в новую SQLite-базу с той же схемой, что universities.db."""
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.executemany(
+        "INSERT INTO universities VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+        [
+            (u["ID"], u["Name"], u["City"], u["Specialties"], u["MinScore"], u["About"],
+             u["Programs"], u["Admission"], u["Tour_3d"], u["International"], u["Website"])
+            for u in unis
+        ],
+    )
+    conn.commit()
+    conn.close()
@@ -0,0 +1,117 @@
+"""Генератор потоков апдейтов для бенчмарков: сценарии пользователей бота.
+
+Каждый пользователь проходит типичный сценарий — /start, список, листание,
+карточка, сравнение, фильтры по городу и направлению, ввод балла, поиск по
+тексту (иногда с опечаткой), подбор по баллу, выгрузка списка в CSV,
+инлайн-поиск по мере набора и диплинк на карточку, меню. Кнопки — в
+формате бота (callbacks.py: коды вместо названий и ID), одна — из «старого
+сообщения» в прежнем строковом формате. ``make_stream`` перемешивает
+сценарии разных пользователей, сохраняя порядок внутри каждого.
+"""
+
+import random
+
+from aiogram.types import Update
+
+from callbacks import PAGE_NEXT, CallbackCodes, Export
+from paging import make_cursor
+
+
+class UpdateFactory:
+    def __init__(self):
+        self.update_id = 0
+
+    def _next(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    def message(self, user_id: int, text: str) -> Update:
+        uid = self._next()
+        return Update(update_id=uid, message={
+            "message_id": uid, "date": 0, "text": text,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "user"},
+        })
+
+    def inline(self, user_id: int, query: str, offset: str = "") -> Update:
+        uid = self._next()
+        return Update(update_id=uid, inline_query={
+            "id": str(uid), "query": query, "offset": offset,
+            "from": {"id": user_id, "is_bot": False, "first_name": "user"},
+        })
+
+    def callback(self, user_id: int, data: str) -> Update:
+        uid = self._next()
+        return Update(update_id=uid, callback_query={
+            "id": str(uid), "chat_instance": "bench", "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "user"},
+            # одно «рабочее» сообщение бота на пользователя, как при навигации по меню
+            "message": {"message_id": user_id, "date": 0, "text": "…", "chat": {"id": user_id, "type": "private"}},
+        })
+
+
+def user_script(rnd: random.Random, factory: UpdateFactory, user_id: int, cat, codes: CallbackCodes) -> list:
+    """Сценарий одного пользователя: [(действие, Update), ...]."""
+    uni = cat.universities[rnd.randrange(len(cat))]
+    words = (uni["Name"] or "").split()
+    query = rnd.choice(words) if words else "университет"
+    if rnd.random() < 0.3:
+        query = query[:-1] + "x"   # опечатка
+    m, c, i = factory.message, factory.callback, factory.inline
+    # Курсоры «Далее» первых двух страниц списка без фильтров (как в кнопках бота)
+    rows = cat.index.query()
+    pages = [make_cursor(cat, rows, min(pos, len(rows) - 1), False, PAGE_NEXT + ":") for pos in (4, 9)]
+    return [
+        ("start", m(user_id, "/start")),
+        ("show_all", c(user_id, "show_all")),
+        ("page", c(user_id, pages[0])),
+        ("page", c(user_id, pages[1])),
+        ("card", c(user_id, codes.uni_open(uni["ID"], 2))),
+        ("compare_add", c(user_id, codes.compare_add(uni["ID"]))),
+        ("back", c(user_id, codes.unis_back(uni["ID"], 2))),
+        ("card", c(user_id, f"uni_open:{uni['ID']}:2")),   # кнопка из старого сообщения
+        ("filter", c(user_id, "filter_cities")),
+        ("filter", c(user_id, codes.city_pick(rnd.choice(cat.cities)))),
+        ("filter", c(user_id, "filter_specs")),
+        ("filter", c(user_id, codes.spec_pick(rnd.choice(cat.specialties)))),
+        ("score", m(user_id, "🔢 Поиск по баллу")),
+        ("score", m(user_id, str(rnd.randint(60, 130)))),
+        ("search", m(user_id, query)),
+        ("recommend", c(user_id, "recommend")),
+        ("recommend", m(user_id, str(rnd.randint(60, 130)))),
+        # Инлайн-запросы приходят на каждую букву; второй пользователь с тем же словом — из кэша
+        ("inline", i(user_id, query[:2])),
+        ("inline", i(user_id, query[:4])),
+        ("inline", i(user_id, query)),
+        ("inline", i(user_id, query, "20")),
+        ("deeplink", m(user_id, f"/start uni_{uni['ID']}")),
+        ("export", c(user_id, Export(fmt="csv").pack())),
+        ("compare_show", c(user_id, "cmp_show")),
+        ("menu", c(user_id, "menu")),
+        ("menu", c(user_id, "reset_filters")),
+    ]
+
+
+def make_stream(cat, n_updates: int, n_users: int, seed: int = 7) -> list:
+    """Сценарии пользователей, перемешанные с сохранением порядка внутри каждого."""
+    rnd = random.Random(seed)
+    factory = UpdateFactory()
+    codes = CallbackCodes(cat)   # метка раскладки считается по данным — совпадает с кодами бота
+    scripts, total, user = [], 0, 0
+    while total < n_updates:
+        user += 1
+        script = user_script(rnd, factory, 10_000 + (user % n_users), cat, codes)
+        scripts.append(script)
+        total += len(script)
+    stream = []
+    cursors = [0] * len(scripts)
+    active = list(range(len(scripts)))
+    while active and len(stream) < n_updates:
+        i = rnd.randrange(len(active))
+        s = active[i]
+        stream.append(scripts[s][cursors[s]])
+        cursors[s] += 1
+        if cursors[s] == len(scripts[s]):
+            active[i] = active[-1]
+            active.pop()
+    return stream
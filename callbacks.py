@@ -0,0 +1,323 @@
+"""Типизированные callback_data кнопок и диспетчер по префиксу.
+
+Кнопки несут не названия городов, направлений и ID ВУЗов, а их короткие
+целые коды (``c:48213:7`` вместо ``citysel:Усть-Каменогорск``): название
+направления кириллицей легко превышает 64 байта callback_data, а код — нет.
+Коды городов и направлений — позиции в ``catalog.cities`` /
+``catalog.specialties`` на момент загрузки каталога, код ВУЗа — номер его
+строки (row id). Форматы кнопок — классы ``CallbackData`` aiogram.
+
+Каждая кнопка с кодами несёт метку раскладки каталога — контрольную сумму
+колонки ID и списков городов и направлений. Точечная перезагрузка сохраняет
+row id и коды (новые города и направления дописываются в конец), поэтому
+метка не меняется; после полной перезагрузки с другими данными метка другая,
+и старая кнопка распознаётся как устаревшая, а не открывает чужой ВУЗ. Метка
+считается по данным, а не по времени запуска: после перезапуска бота и во
+всех воркерах кластера на тех же данных коды совпадают.
+
+``CallbackRouter`` выбирает обработчик по префиксу одним поиском в словаре
+(outer-middleware до фильтров aiogram) вместо перебора цепочки
+``F.data.startswith(...)``. Кнопки в старых сообщениях (``citysel:<город>``,
+``uni_open:<ID>:<место>`` и т. п.) разбираются им же и попадают в те же
+обработчики.
+"""
+
+import zlib
+
+from aiogram import BaseMiddleware
+from aiogram.filters.callback_data import CallbackData
+
+TAG_MOD = 1 << 16   # метка раскладки каталога — до 5 десятичных цифр
+
+
+class CityPage(CallbackData, prefix="cp"):
+    page: int
+
+
+class CityPick(CallbackData, prefix="c"):
+    tag: int
+    code: int
+
+
+class SpecPage(CallbackData, prefix="sp"):
+    page: int
+
+
+class SpecPick(CallbackData, prefix="s"):
+    tag: int
+    code: int
+
+
+class UniOpen(CallbackData, prefix="o"):
+    tag: int
+    row: int
+    place: int   # место на странице списка (для «Назад к списку»)
+
+
+class UnisBack(CallbackData, prefix="b"):
+    tag: int
+    row: int
+    place: int
+
+
+class CompareAdd(CallbackData, prefix="a"):
+    tag: int
+    row: int
+
+
+class Export(CallbackData, prefix="x"):
+    fmt: str
+
+
+PAGE_PREV = "p"   # p:<курсор paging.make_cursor> — курсор сам содержит ":", поэтому без CallbackData
+PAGE_NEXT = "n"
+
+
+def layout_tag(catalog) -> int:
+    """Метка раскладки: CRC32 колонки ID (блоб и смещения) и списков городов и направлений."""
+    blob, offsets = catalog.columns.ids.buffers()
+    crc = zlib.crc32(blob)
+    crc = zlib.crc32(offsets, crc)
+    crc = zlib.crc32("\x1f".join(catalog.cities).encode("utf-8"), crc)
+    crc = zlib.crc32("\x1f".join(catalog.specialties).encode("utf-8"), crc)
+    return crc % TAG_MOD
+
+
+class _Codes:
+    """Значение <-> код; коды только дописываются, пока не сменится метка."""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {v: c for c, v in enumerate(self.values)}
+
+    def code(self, value: str) -> int:
+        c = self.codes.get(value)
+        if c is None:
+            c = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+    def value(self, code: int):
+        return self.values[code] if 0 <= code < len(self.values) else None
+
+
+class CallbackCodes:
+    """Коды городов, направлений и ВУЗов текущего каталога для callback_data."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.tag = layout_tag(catalog)
+        self.cities = _Codes(catalog.cities)
+        self.specs = _Codes(catalog.specialties)
+
+    def install(self, catalog):
+        """Новый снимок: после точечной перезагрузки (changed_ids) коды сохраняются, иначе — заново."""
+        if catalog.changed_ids is None:
+            self.__init__(catalog)
+            return
+        self.catalog = catalog
+        for city in catalog.cities:
+            self.cities.code(city)
+        for spec in catalog.specialties:
+            self.specs.code(spec)
+
+    # --- упаковка ---
+
+    def city_pick(self, city: str) -> str:
+        return CityPick(tag=self.tag, code=self.cities.code(city)).pack()
+
+    def spec_pick(self, spec: str) -> str:
+        return SpecPick(tag=self.tag, code=self.specs.code(spec)).pack()
+
+    def uni_open(self, uid: str, place: int = 0) -> str:
+        row = self.catalog.by_id.row_of(uid)
+        return UniOpen(tag=self.tag, row=row, place=place).pack() if row is not None else f"uni_open:{uid}:{place}"
+
+    def unis_back(self, uid: str, place: int) -> str:
+        row = self.catalog.by_id.row_of(uid)
+        return UnisBack(tag=self.tag, row=row, place=place).pack() if row is not None else f"unis_goto:{place}:{uid}"
+
+    def compare_add(self, uid: str) -> str:
+        row = self.catalog.by_id.row_of(uid)
+        return CompareAdd(tag=self.tag, row=row).pack() if row is not None else f"cmp_add:{uid}"
+
+    # --- разбор (None — кнопка устарела или значения уже нет) ---
+
+    def city(self, tag: int, code: int):
+        return self.cities.value(code) if tag == self.tag else None
+
+    def spec(self, tag: int, code: int):
+        return self.specs.value(code) if tag == self.tag else None
+
+    def uid(self, tag: int, row):
+        cat = self.catalog
+        if tag != self.tag or not 0 <= row < len(cat.columns) or row in cat.deleted:
+            return None
+        return cat.columns.ids[row].strip() or None
+
+
+# --- Разбор кнопок: новые форматы и кнопки из старых сообщений -> аргументы обработчика ---
+
+# Поля кнопки (по порядку объявления в классе) -> аргументы обработчика
+ARGS = {
+    CityPage: lambda codes, page: (page,),
+    CityPick: lambda codes, tag, code: (codes.city(tag, code),),
+    SpecPage: lambda codes, page: (page,),
+    SpecPick: lambda codes, tag, code: (codes.spec(tag, code),),
+    UniOpen: lambda codes, tag, row, place: (codes.uid(tag, row), place),
+    UnisBack: lambda codes, tag, row, place: (codes.uid(tag, row), place),
+    CompareAdd: lambda codes, tag, row: (codes.uid(tag, row),),
+    Export: lambda codes, fmt: (fmt,),
+}
+
+
+def fields_parser(cls):
+    """Разбор callback_data по схеме класса без создания модели pydantic.
+
+    ``cls.unpack`` валидирует поля через pydantic и на порядок медленнее
+    ``split``; здесь значения полей просто приводятся к int/str по аннотациям.
+    """
+    prefix, sep = cls.__prefix__, cls.__separator__
+    types = tuple(field.annotation for field in cls.model_fields.values())
+    if not set(types) <= {int, str}:
+        raise TypeError(f"{cls.__name__}: поддерживаются только поля int и str")
+    size = len(types) + 1
+
+    def parse(data: str) -> list:
+        parts = data.split(sep)
+        if len(parts) != size or parts[0] != prefix:
+            raise ValueError(f"не {cls.__name__}: {data!r}")
+        return [t(v) for t, v in zip(types, parts[1:])]
+    return parse
+
+
+def _legacy_value(rest: str, codes) -> tuple:
+    # citysel:<город> / specsel:<направление> / cmp_add:<ID> / export:<формат>
+    if not rest:
+        raise ValueError("пустое значение")
+    return (rest,)
+
+
+def _legacy_page(rest: str, codes) -> tuple:
+    # cities:<страница> / specs:<страница>
+    try:
+        return (int(rest.split(":")[0]),)
+    except ValueError:
+        return (0,)
+
+
+def _legacy_uni_open(rest: str, codes) -> tuple:
+    # uni_open:<ID>:<место на странице> (ещё раньше — номер страницы)
+    uid, sep, place = rest.partition(":")
+    if not sep:
+        raise ValueError("нет места на странице")
+    try:
+        place = int(place.split(":")[0])
+    except ValueError:
+        place = 0
+    return (uid if uid in codes.catalog.by_id else None), place
+
+
+def _legacy_unis_back(rest: str, codes) -> tuple:
+    # unis_goto:<место>:<ID>; совсем старый формат — unis_goto:<страница>
+    place, sep, uid = rest.partition(":")
+    try:
+        place = int(place)
+    except ValueError:
+        place = 0
+    return (uid, place) if sep else (None, 0, place)
+
+
+def _legacy_cursor(rest: str, codes) -> tuple:
+    # unis_next:<курсор> / unis_prev:<курсор>; в самых старых кнопках курсора нет
+    return (rest,)
+
+
+LEGACY = {
+    "cities": _legacy_page,
+    "citysel": _legacy_value,
+    "specs": _legacy_page,
+    "specsel": _legacy_value,
+    "uni_open": _legacy_uni_open,
+    "unis_goto": _legacy_unis_back,
+    "unis_prev": _legacy_cursor,
+    "unis_next": _legacy_cursor,
+    "cmp_add": _legacy_value,
+    "export": _legacy_value,
+}
+
+
+def _exact(data, sep, rest) -> tuple:
+    if sep:
+        raise ValueError("лишние данные")
+    return ()
+
+
+class CallbackRouter(BaseMiddleware):
+    """Диспетчер callback_query: префикс -> (разбор, обработчик) за один поиск в словаре.
+
+    Подключается outer-middleware ``dp.callback_query`` и единственным
+    обработчиком ``dispatch``; имя выбранного обработчика кладётся в
+    ``data["handler_name"]`` для метрик и учёта вызовов.
+    """
+
+    def __init__(self, codes: CallbackCodes):
+        self.codes = codes
+        self.routes = {}   # префикс -> (parse(data, sep, rest) -> кортеж аргументов, обработчик)
+
+    def route(self, key, *legacy):
+        """Декоратор: класс CallbackData, точное значение ("menu") или префикс курсора (PAGE_NEXT),
+        плюс префиксы кнопок старого формата (LEGACY), которые ведут в тот же обработчик."""
+        def decorator(handler):
+            if key in (PAGE_PREV, PAGE_NEXT):
+                self._add(key, lambda data, sep, rest: (rest,), handler)
+            elif isinstance(key, str):
+                self._add(key, _exact, handler)
+            else:
+                self._add(key.__prefix__, self._typed(key), handler)
+            for prefix in legacy:
+                parse = LEGACY[prefix]
+                self._add(prefix, lambda data, sep, rest, parse=parse: parse(rest, self.codes), handler)
+            return handler
+        return decorator
+
+    def _add(self, prefix: str, parse, handler):
+        if prefix in self.routes:
+            raise ValueError(f"префикс callback_data уже занят: {prefix!r}")
+        self.routes[prefix] = (parse, handler)
+
+    def _typed(self, cls):
+        args, parse = ARGS[cls], fields_parser(cls)
+        return lambda data, sep, rest: args(self.codes, *parse(data))
+
+    def resolve(self, data: str):
+        """(обработчик, аргументы) для callback_data; None — неизвестный префикс.
+
+        Некорректные данные известного префикса дают (обработчик, None).
+        """
+        prefix, sep, rest = data.partition(":")
+        entry = self.routes.get(prefix)
+        if entry is None:
+            return None
+        parse, handler = entry
+        try:
+            return handler, parse(data, sep, rest)
+        except (ValueError, TypeError):   # не число в поле, не то число полей
+            return handler, None
+
+    async def __call__(self, handler, event, data):
+        route = self.resolve(event.data or "")
+        data["callback_route"] = route
+        if route is not None:
+            data["handler_name"] = route[0].__name__
+        return await handler(event, data)
+
+    async def dispatch(self, callback, callback_route=None):
+        if callback_route is None:
+            await callback.answer()   # кнопка неизвестного формата
+            return
+        handler, args = callback_route
+        if args is None:
+            await callback.answer("Ошибка данных", show_alert=True)
+            return
+        await handler(callback, *args)
@@ -0,0 +1,279 @@
+"""Индекс каталога ВУЗов: быстрые фильтры по городу, направлению и баллу.
+
+Индекс строится один раз при загрузке данных (см. ``load_from_sqlite`` в main.py),
+после чего каждый запрос фильтра — это пересечение множеств и бинарный поиск,
+а не проход по всем строкам.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from time import monotonic
+
+
+def norm(value) -> str:
+    """Нормализация строки для сравнения: обрезка пробелов и нижний регистр."""
+    return (value or "").strip().lower()
+
+
+def split_specs(raw) -> list:
+    """Разбивает строку направлений ("IT, Математика") на отдельные токены."""
+    return [p.strip() for p in (raw or "").split(",") if p.strip()]
+
+
+def parse_score(value):
+    """MinScore -> int. Пустое значение считается 0, некорректное — None."""
+    if value is None:
+        return 0
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+NO_SCORE = -(2 ** 63)   # некорректный MinScore: строка не проходит фильтр по баллу
+
+
+class CatalogIndex:
+    """Инвертированный индекс по списку ВУЗов.
+
+    Строки идентифицируются своим порядковым номером (row id) в исходном списке.
+    Удалённые строки (``deleted``) остаются в нумерации, но не попадают ни
+    в один индекс и ни в один результат.
+    """
+
+    deleted = frozenset()
+
+    def __init__(self, unis: list):
+        self.size = len(unis)
+        self.by_city = {}   # город (норм.) -> set(row id)
+        self.by_spec = {}   # направление (норм.) -> set(row id)
+
+        scored = []
+        self.scores = array("q")   # MinScore по row id (NO_SCORE — некорректный)
+        for row, uni in enumerate(unis):
+            city = norm(uni.get("City"))
+            if city:
+                self.by_city.setdefault(city, set()).add(row)
+
+            for spec in split_specs(uni.get("Specialties")):
+                self.by_spec.setdefault(spec.lower(), set()).add(row)
+
+            ms = parse_score(uni.get("MinScore"))
+            if ms is not None:
+                scored.append((-ms, row))
+            self.scores.append(NO_SCORE if ms is None else ms)
+
+        # Строки по убыванию балла (при равенстве — в исходном порядке)
+        scored.sort()
+        self.score_order = array("q", (row for _, row in scored))
+        self.neg_scores = array("q", (neg for neg, _ in scored))
+
+    @classmethod
+    def from_parts(cls, size, by_city, by_spec, scores, score_order, neg_scores) -> "CatalogIndex":
+        """Индекс из готовых структур (снимок каталога, snapshot.py).
+
+        by_city/by_spec — отображения «ключ -> отсортированные row id» с методом get,
+        массивы — любые последовательности (array или memoryview).
+        """
+        index = cls.__new__(cls)
+        index.size = size
+        index.by_city = by_city
+        index.by_spec = by_spec
+        index.scores = scores
+        index.score_order = score_order
+        index.neg_scores = neg_scores
+        return index
+
+    def with_changes(self, old: dict, new: dict, size: int, deleted=frozenset()) -> "CatalogIndex":
+        """Копия индекса, в которой обновлены только изменённые строки.
+
+        old/new — row id -> строка до и после изменения (None — строки не было
+        или она удалена). Множества и массивы, которых изменения не касаются,
+        общие с исходным индексом.
+        """
+        by_city, by_spec = dict(self.by_city), dict(self.by_spec)
+        copied = set()   # (id(словаря), ключ) уже скопированных множеств
+
+        def update(mapping, key, row, add):
+            rows = mapping.get(key)
+            if rows is None or (id(mapping), key) not in copied:
+                copied.add((id(mapping), key))
+                rows = mapping[key] = set(rows or ())
+            if add:
+                rows.add(row)
+            else:
+                rows.discard(row)
+                if not rows:
+                    del mapping[key]
+
+        scores = array("q", self.scores)
+        scores.extend([NO_SCORE] * (size - len(scores)))
+        score_order, neg_scores = array("q", self.score_order), array("q", self.neg_scores)
+
+        for row in sorted(old.keys() | new.keys()):
+            for uni, add in ((old.get(row), False), (new.get(row), True)):
+                if uni is None:
+                    continue
+                city = norm(uni.get("City"))
+                if city:
+                    update(by_city, city, row, add)
+                for spec in split_specs(uni.get("Specialties")):
+                    update(by_spec, spec.lower(), row, add)
+
+                ms = parse_score(uni.get("MinScore"))
+                if ms is None:
+                    continue
+                # Строки с равным баллом идут по возрастанию row id
+                lo, hi = bisect_left(neg_scores, -ms), bisect_right(neg_scores, -ms)
+                i = lo + bisect_left(score_order[lo:hi], row)
+                if add:
+                    score_order.insert(i, row)
+                    neg_scores.insert(i, -ms)
+                else:
+                    del score_order[i]
+                    del neg_scores[i]
+
+            uni = new.get(row)
+            ms = parse_score(uni.get("MinScore")) if uni is not None else None
+            scores[row] = NO_SCORE if ms is None else ms
+
+        index = CatalogIndex.from_parts(size, by_city, by_spec, scores, score_order, neg_scores)
+        index.deleted = frozenset(deleted)
+        return index
+
+    def _rows_with_score_at_least(self, score: int) -> list:
+        """Строки с MinScore >= score, уже отсортированные по убыванию балла."""
+        k = bisect_right(self.neg_scores, -score)
+        return self.score_order[:k]
+
+    def query(self, city=None, spec=None, score=None) -> tuple:
+        """Возвращает кортеж row id, подходящих под фильтры.
+
+        Без фильтра по баллу — в исходном порядке, с ним — по убыванию балла.
+        """
+        sets = []
+        if city:
+            sets.append(self.by_city.get(norm(city), set()))
+        if spec:
+            sets.append(self.by_spec.get(norm(spec), set()))
+
+        base = None
+        if sets:
+            sets.sort(key=len)
+            base = set(sets[0]).intersection(*sets[1:])
+
+        if score is None:
+            if base is None:
+                if self.deleted:
+                    return tuple(r for r in range(self.size) if r not in self.deleted)
+                return tuple(range(self.size))
+            return tuple(sorted(base))
+
+        if base is None:
+            return tuple(self._rows_with_score_at_least(score))
+
+        ranged = self._rows_with_score_at_least(score)
+        if len(base) < len(ranged):
+            # Кандидатов по городу/направлению меньше, чем по баллу
+            scores = self.scores
+            picked = [r for r in base if scores[r] != NO_SCORE and scores[r] >= score]
+            picked.sort(key=lambda r: (-scores[r], r))
+            return tuple(picked)
+        return tuple(r for r in ranged if r in base)
+
+
+_MISSING = object()
+
+
+def filter_key(filters: dict) -> tuple:
+    """Нормализованный ключ фильтра: (город, направление, балл)."""
+    score = filters.get("score")
+    return (
+        norm(filters.get("city")) or None,
+        norm(filters.get("spec")) or None,
+        int(score) if score is not None else None,
+    )
+
+
+class LRUCache:
+    """Ограниченный LRU-кэш со счётчиками попаданий и промахов.
+
+    Используется для результатов фильтрации (кортежи row id), общих для всех
+    пользователей и страниц, для готовых клавиатур и полных карточек ВУЗов;
+    очищается при перезагрузке данных.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, compute):
+        """Возвращает закэшированный результат или вычисляет его через compute()."""
+        value = self.lookup(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def lookup(self, key, default=None):
+        """Значение из кэша (с учётом в счётчиках) или default."""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def discard(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+class TTLCache(LRUCache):
+    """LRU-кэш, записи которого живут не дольше ttl секунд.
+
+    Для ответов, которые должны устаревать сами (инлайн-поиск), а не только
+    при перезагрузке каталога. Просроченная запись считается промахом.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def lookup(self, key, default=None):
+        entry = super().lookup(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        deadline, value = entry
+        if deadline < monotonic():
+            self._data.pop(key, None)
+            self.hits -= 1
+            self.misses += 1
+            return default
+        return value
+
+    def put(self, key, value):
+        super().put(key, (monotonic() + self.ttl, value))
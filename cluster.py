@@ -0,0 +1,285 @@
+"""Шардированный запуск: N процессов бота за одним приёмником апдейтов.
+
+Приёмник (этот процесс) получает апдейты — через webhook или long polling — и
+раздаёт их воркерам по ``user_id % N``. Все апдейты одного пользователя
+попадают в один и тот же воркер и пересылаются ему по порядку, поэтому
+очередность и кэш сессий в памяти воркера остаются корректными.
+
+Воркеры — обычные ``main.py`` в режиме webhook на 127.0.0.1:CLUSTER_BASE_PORT+i:
+
+* сессии — общая SQLite-база в режиме WAL (``SESSION_BACKEND=sqlite``);
+* каталог каждый воркер читает из общей read-only базы ``DB_PATH`` или
+  отображает общий снимок ``CATALOG_SNAPSHOT`` (snapshot.py) — страницы
+  файла в памяти одни на всех;
+* запросы к Bot API воркер отправляет сам.
+
+Упавший воркер перезапускается. Запуск на одной машине:
+
+    BOT_TOKEN=... python cluster.py --workers 4                 # polling
+    BOT_MODE=webhook WEBHOOK_SECRET=... python cluster.py -w 4  # webhook
+
+Проверка без Telegram: benchmarks/cluster_smoke.py.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+
+logger = logging.getLogger("cluster")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+WORKER_PATH = "/update"
+
+
+def update_user_id(update: dict):
+    """ID пользователя (или чата), от которого пришёл апдейт; None, если его нет."""
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        for key in ("from", "user"):
+            user = value.get(key)
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+        chat = value.get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return None
+
+
+def shard_for(update: dict, workers: int) -> int:
+    uid = update_user_id(update)
+    return 0 if uid is None else uid % workers
+
+
+class Worker:
+    """Процесс main.py, принимающий апдейты на локальном порту."""
+
+    def __init__(self, index: int, port: int, secret: str, env: dict, workers: int = 1):
+        self.index = index
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}{WORKER_PATH}"
+        self.env = {
+            **env,
+            "BOT_MODE": "webhook",
+            "WEBHOOK_HOST": "127.0.0.1",
+            "WEBHOOK_PORT": str(port),
+            "WEBHOOK_PATH": WORKER_PATH,
+            "WEBHOOK_SECRET": secret,
+            "WEBHOOK_BASE_URL": "",
+            "SESSION_BACKEND": "sqlite",
+            "WORKER_INDEX": str(index),
+        }
+        # Лимит Telegram на отправку общий для бота: каждый воркер получает свою долю
+        # глобального ведра. Чатовые ведра не делятся — чат всегда попадает в один воркер
+        global_rate = float(env.get("OUTBOUND_GLOBAL_RATE", "30"))
+        self.env["OUTBOUND_GLOBAL_RATE"] = repr(global_rate / workers)
+        base_metrics = int(env.get("METRICS_PORT", "9101") or 0)
+        self.env["METRICS_PORT"] = str(base_metrics + index) if base_metrics else "0"
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], env=self.env, cwd=ROOT)
+        logger.info(f"Воркер {self.index} запущен (pid {self.process.pid}, порт {self.port})")
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, timeout: float = 10.0):
+        if not self.alive():
+            return
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class ShardRouter:
+    """Раздаёт апдейты воркерам: отдельная очередь и последовательная пересылка на воркер."""
+
+    def __init__(self, workers: list, secret: str, retries: int = 20):
+        self.workers = workers
+        self.secret = secret
+        self.retries = retries
+        self._queues = [asyncio.Queue() for _ in workers]
+        self._tasks = []
+        self._http = None
+        self.forwarded = [0] * len(workers)
+        self.dropped = 0
+
+    async def start(self):
+        self._http = ClientSession(timeout=ClientTimeout(total=30))
+        self._tasks = [asyncio.create_task(self._forward_loop(i)) for i in range(len(self.workers))]
+
+    def route(self, update: dict):
+        self._queues[shard_for(update, len(self.workers))].put_nowait(update)
+
+    async def join(self):
+        """Ждёт, пока все принятые апдейты будут переданы воркерам."""
+        for q in self._queues:
+            await q.join()
+
+    async def _forward_loop(self, i: int):
+        worker, queue = self.workers[i], self._queues[i]
+        headers = {SECRET_HEADER: self.secret}
+        while True:
+            update = await queue.get()
+            try:
+                for attempt in range(self.retries):
+                    try:
+                        async with self._http.post(worker.url, json=update, headers=headers) as resp:
+                            if resp.status < 500:
+                                self.forwarded[i] += 1
+                                break
+                    except ClientError:
+                        pass
+                    # Воркер ещё стартует или перезапускается
+                    await asyncio.sleep(min(0.1 * 2 ** attempt, 2.0))
+                else:
+                    self.dropped += 1
+                    logger.error(f"Воркер {i} недоступен, апдейт {update.get('update_id')} потерян")
+            finally:
+                queue.task_done()
+
+    async def close(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._http is not None:
+            await self._http.close()
+
+
+async def supervise(workers: list, stop: asyncio.Event):
+    """Перезапускает упавших воркеров, пока не запрошена остановка."""
+    while not stop.is_set():
+        for w in workers:
+            if not w.alive():
+                logger.warning(f"Воркер {w.index} завершился (код {w.process.returncode}), перезапуск")
+                w.start()
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def receive_webhook(router: ShardRouter, stop: asyncio.Event, *, host, port, path, secret, token, base_url):
+    async def handle(request: web.Request) -> web.Response:
+        if request.headers.get(SECRET_HEADER) != secret:
+            return web.Response(status=401)
+        router.route(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Приёмник webhook: http://{host}:{port}{path}")
+
+    if base_url:
+        from aiogram import Bot
+
+        async with Bot(token=token) as bot:
+            await bot.set_webhook(base_url.rstrip("/") + path, secret_token=secret, drop_pending_updates=True)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+async def receive_polling(router: ShardRouter, stop: asyncio.Event, *, token, api_url):
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_url)) if api_url else None
+    async with Bot(token=token, session=session) as bot:
+        await bot.delete_webhook(drop_pending_updates=True)
+        logger.info("Приёмник: long polling")
+        offset = None
+        while not stop.is_set():
+            poll = asyncio.ensure_future(bot.get_updates(offset=offset, timeout=25))
+            stopped = asyncio.ensure_future(stop.wait())
+            done, _ = await asyncio.wait({poll, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            if poll not in done:
+                poll.cancel()
+                break
+            stopped.cancel()
+            try:
+                updates = poll.result()
+            except Exception:
+                logger.exception("Ошибка getUpdates, повтор через 1 с")
+                await asyncio.sleep(1)
+                continue
+            for u in updates:
+                router.route(u.model_dump(mode="json", by_alias=True, exclude_unset=True, exclude_none=True))
+                offset = u.update_id + 1
+
+
+async def run_cluster(n_workers: int, base_port: int):
+    env = dict(os.environ)
+    mode = env.get("BOT_MODE", "polling").strip().lower()
+    token = env.get("BOT_TOKEN", "")
+    worker_secret = secrets.token_urlsafe(24)   # только между приёмником и воркерами
+
+    workers = [Worker(i, base_port + i, worker_secret, env, n_workers) for i in range(n_workers)]
+    for w in workers:
+        w.start()
+    router = ShardRouter(workers, worker_secret)
+    await router.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    supervisor = asyncio.create_task(supervise(workers, stop))
+    try:
+        if mode == "webhook":
+            secret = env.get("WEBHOOK_SECRET", "")
+            if not secret:
+                logger.error("Для режима webhook задайте WEBHOOK_SECRET.")
+                return
+            await receive_webhook(
+                router, stop,
+                host=env.get("WEBHOOK_HOST", "0.0.0.0"),
+                port=int(env.get("WEBHOOK_PORT", "8080")),
+                path=env.get("WEBHOOK_PATH", "/webhook"),
+                secret=secret,
+                token=token,
+                base_url=env.get("WEBHOOK_BASE_URL", ""),
+            )
+        else:
+            await receive_polling(router, stop, token=token, api_url=env.get("TELEGRAM_API_URL", ""))
+    finally:
+        stop.set()
+        logger.info("Остановка кластера...")
+        try:
+            await asyncio.wait_for(router.join(), timeout=10)
+        except asyncio.TimeoutError:
+            logger.warning("Не все апдейты переданы воркерам до остановки")
+        await router.close()
+        await supervisor
+        for w in workers:
+            w.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Запуск бота несколькими процессами с шардированием по user_id.")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.getenv("CLUSTER_WORKERS", os.cpu_count() or 2)))
+    parser.add_argument("--base-port", type=int, default=int(os.getenv("CLUSTER_BASE_PORT", "8100")))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_cluster(args.workers, args.base_port))
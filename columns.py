@@ -0,0 +1,307 @@
+"""Компактное колоночное хранение каталога ВУЗов.
+
+Вместо списка словарей (по dict и набору str-объектов на каждый ВУЗ) строки
+каталога лежат в колонках:
+
+* ID и названия — одна UTF-8 строка-блоб + массив смещений (``StringTable``);
+* город и набор направлений — коды в ``array`` + таблица уникальных значений
+  (одинаковые строки хранятся один раз);
+* MinScore — ``array("i")``, без повторного int() при каждом обращении.
+
+Обработчики продолжают работать со «словарями»: ``UniView`` — тонкое
+представление одной строки с интерфейсом Mapping (``uni["Name"]``,
+``uni.get("City")``), а ``RowsView`` ведёт себя как список таких строк.
+
+Колонки можно собрать и из готовых буферов (``from_parts``): так снимок
+каталога (snapshot.py) отображает их из файла через mmap без копирования.
+``with_changes`` даёт копию с заменёнными и дописанными строками — для
+точечной перезагрузки после импорта (importer.py): неизменённые участки
+копируются срезами, без разбора каждой строки.
+"""
+
+from array import array
+from collections.abc import Mapping, Sequence
+
+FIELDS = ("ID", "Name", "City", "Specialties", "MinScore")
+
+SCORE_NONE = -(2 ** 31)        # MinScore отсутствует (NULL)
+SCORE_RAW = -(2 ** 31) + 1     # нецелое значение, хранится в score_raw
+
+
+class StringTable:
+    """Неизменяемый список строк в одном UTF-8 блобе."""
+
+    __slots__ = ("_blob", "_offsets")
+
+    def __init__(self, strings):
+        offsets = array("I", [0])
+        parts = []
+        pos = 0
+        for s in strings:
+            b = s.encode("utf-8")
+            parts.append(b)
+            pos += len(b)
+            offsets.append(pos)
+        self._blob = b"".join(parts)
+        self._offsets = offsets
+
+    @classmethod
+    def from_buffers(cls, blob, offsets) -> "StringTable":
+        """Таблица поверх готовых буферов (bytes/memoryview и массив смещений)."""
+        table = cls.__new__(cls)
+        table._blob = blob
+        table._offsets = offsets
+        return table
+
+    def with_changes(self, changes: dict) -> "StringTable":
+        """Копия, где строки changes (номер -> str) заменены; номера от len() и дальше дописываются."""
+        blob, old = self._blob, self._offsets
+        n = len(self)
+        parts = []
+        offsets = array("I", [0])
+        start = 0   # первая ещё не скопированная строка
+        for row in sorted(changes):
+            end = min(row, n)
+            if start < end:
+                parts.append(blob[old[start]:old[end]])
+                shift = offsets[-1] - old[start]
+                tail = old[start + 1:end + 1]
+                offsets.extend(tail if shift == 0 else array("I", [o + shift for o in tail]))
+            if row >= n and row != max(start, n):
+                raise ValueError(f"дописываемые строки должны идти подряд: {row}")
+            b = changes[row].encode("utf-8")
+            parts.append(b)
+            offsets.append(offsets[-1] + len(b))
+            start = row + 1
+        if start < n:
+            parts.append(blob[old[start]:old[n]])
+            shift = offsets[-1] - old[start]
+            tail = old[start + 1:n + 1]
+            offsets.extend(tail if shift == 0 else array("I", [o + shift for o in tail]))
+        return StringTable.from_buffers(b"".join(parts), offsets)
+
+    def buffers(self) -> tuple:
+        """(блоб, массив смещений) — для записи в снимок каталога."""
+        return self._blob, self._offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def nbytes(self) -> int:
+        return len(self._blob) + self._offsets.itemsize * len(self._offsets)
+
+
+class _Interner:
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {v: c for c, v in enumerate(self.values)}
+
+    def code(self, value: str) -> int:
+        c = self.codes.get(value)
+        if c is None:
+            c = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+
+def _encode_score(ms, row: int, score_raw: dict) -> int:
+    """MinScore -> значение колонки scores; нецелое значение откладывается в score_raw."""
+    if ms is None:
+        return SCORE_NONE
+    if isinstance(ms, int) and SCORE_RAW < ms < 2 ** 31:
+        return ms
+    score_raw[row] = ms
+    return SCORE_RAW
+
+
+class UniColumns:
+    """Колонки каталога; строятся из итерируемого набора словарей с ключами FIELDS."""
+
+    def __init__(self, rows):
+        ids, names = [], []
+        cities, specs = _Interner(), _Interner()
+        city_codes, spec_codes = array("I"), array("I")
+        scores = array("i")
+        score_raw = {}
+
+        for row, uni in enumerate(rows):
+            ids.append(uni["ID"])
+            names.append(uni["Name"] or "")
+            city_codes.append(cities.code(uni["City"] or ""))
+            spec_codes.append(specs.code(uni["Specialties"] or ""))
+
+            scores.append(_encode_score(uni["MinScore"], row, score_raw))
+
+        self.ids = StringTable(ids)
+        self.names = StringTable(names)
+        self.city_codes = city_codes
+        self.city_table = cities.values
+        self.spec_codes = spec_codes
+        self.spec_table = specs.values
+        self.scores = scores
+        self.score_raw = score_raw
+
+    @classmethod
+    def from_parts(cls, ids, names, city_codes, city_table, spec_codes, spec_table, scores, score_raw) -> "UniColumns":
+        cols = cls.__new__(cls)
+        cols.ids = ids
+        cols.names = names
+        cols.city_codes = city_codes
+        cols.city_table = city_table
+        cols.spec_codes = spec_codes
+        cols.spec_table = spec_table
+        cols.scores = scores
+        cols.score_raw = score_raw
+        return cols
+
+    def with_changes(self, changes: dict) -> "UniColumns":
+        """Копия колонок: строки changes (row id -> словарь FIELDS) заменены,
+        номера от len() подряд дописываются в конец."""
+        cities, specs = _Interner(self.city_table), _Interner(self.spec_table)
+        city_codes, spec_codes = array("I", self.city_codes), array("I", self.spec_codes)
+        scores = array("i", self.scores)
+        score_raw = dict(self.score_raw)
+
+        for row in sorted(changes):
+            uni = changes[row]
+            score_raw.pop(row, None)
+            values = (
+                cities.code(uni["City"] or ""),
+                specs.code(uni["Specialties"] or ""),
+                _encode_score(uni["MinScore"], row, score_raw),
+            )
+            for column, value in zip((city_codes, spec_codes, scores), values):
+                if row < len(column):
+                    column[row] = value
+                else:
+                    column.append(value)
+
+        return UniColumns.from_parts(
+            ids=self.ids.with_changes({r: u["ID"] for r, u in changes.items()}),
+            names=self.names.with_changes({r: u["Name"] or "" for r, u in changes.items()}),
+            city_codes=city_codes,
+            city_table=cities.values,
+            spec_codes=spec_codes,
+            spec_table=specs.values,
+            scores=scores,
+            score_raw=score_raw,
+        )
+
+    def __len__(self):
+        return len(self.scores)
+
+    def min_score(self, row: int):
+        ms = self.scores[row]
+        if ms == SCORE_NONE:
+            return None
+        if ms == SCORE_RAW:
+            return self.score_raw[row]
+        return ms
+
+    def nbytes(self) -> int:
+        """Оценка занимаемой памяти колонками (без таблиц уникальных значений)."""
+        arrays = (self.city_codes, self.spec_codes, self.scores)
+        return self.ids.nbytes() + self.names.nbytes() + sum(a.itemsize * len(a) for a in arrays)
+
+
+class UniView(Mapping):
+    """Строка каталога в виде словаря только для чтения."""
+
+    __slots__ = ("_cols", "_row")
+
+    def __init__(self, cols: UniColumns, row: int):
+        self._cols = cols
+        self._row = row
+
+    def __getitem__(self, key):
+        c, r = self._cols, self._row
+        if key == "ID":
+            return c.ids[r]
+        if key == "Name":
+            return c.names[r]
+        if key == "City":
+            return c.city_table[c.city_codes[r]]
+        if key == "Specialties":
+            return c.spec_table[c.spec_codes[r]]
+        if key == "MinScore":
+            return c.min_score(r)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __repr__(self):
+        return f"UniView({dict(self)!r})"
+
+
+class RowsView(Sequence):
+    """Список строк каталога: ``rows[i]`` возвращает UniView."""
+
+    __slots__ = ("_cols",)
+
+    def __init__(self, cols: UniColumns):
+        self._cols = cols
+
+    def __len__(self):
+        return len(self._cols)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [UniView(self._cols, r) for r in range(len(self._cols))[row]]
+        if row < 0:
+            row += len(self._cols)
+        if not 0 <= row < len(self._cols):
+            raise IndexError(row)
+        return UniView(self._cols, row)
+
+
+class ByIdView(Mapping):
+    """ID ВУЗа -> UniView; хранит только отображение ID -> номер строки.
+
+    По умолчанию это dict, построенный по колонке ID; снимок каталога передаёт
+    готовое отображение ``rows`` (отсортированные ID в mmap).
+    """
+
+    __slots__ = ("_cols", "_rows")
+
+    def __init__(self, cols: UniColumns, rows=None):
+        self._cols = cols
+        if rows is not None:
+            self._rows = rows
+            return
+        self._rows = {}
+        for row in range(len(cols)):
+            uid = cols.ids[row].strip()
+            if uid:
+                self._rows[uid] = row
+
+    def __getitem__(self, uid):
+        return UniView(self._cols, self._rows[uid])
+
+    def __contains__(self, uid):
+        return uid in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def row_of(self, uid):
+        return self._rows.get(uid)
+
+    def rows_with_changes(self, added: dict, removed) -> dict:
+        """Копия отображения ID -> row id: added добавлены, ID из removed удалены."""
+        rows = dict(self._rows)
+        for uid in removed:
+            rows.pop(uid, None)
+        rows.update(added)
+        return rows
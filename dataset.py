@@ -0,0 +1,434 @@
+"""Слой доступа к данным: снимок каталога ВУЗов и его (пере)загрузка из SQLite.
+
+``Catalog`` — неизменяемый после построения объект со строками и всеми
+производными структурами (индексы, списки городов и направлений). Новый снимок
+собирается целиком в отдельном потоке, а затем подменяется одной операцией
+присваивания в потоке событий, поэтому обработчики никогда не видят
+наполовину очищенный каталог.
+
+В памяти каталога держатся только колонки, нужные спискам и фильтрам
+(ID, Name, City, Specialties, MinScore), в компактном колоночном виде
+(см. columns.py). Длинные тексты карточки (about,
+programs, admission, ...) читает ``DetailsStore`` по запросу — в отдельном
+потоке, с небольшим LRU-кэшем.
+
+Если база ведёт журнал изменений (таблица ``catalog_changes`` с триггерами,
+её создаёт importer.py), ``CatalogWatcher`` перечитывает только изменённые
+строки и собирает новый снимок через ``Catalog.with_changes`` — индексы
+обновляются точечно, без полного пересчёта.
+
+Вместо SQLite каталог можно открыть из заранее собранного бинарного снимка
+(snapshot.py): колонки, индексы, готовые карточки и полные тексты там уже
+лежат в файле и отображаются через mmap.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog import CatalogIndex, LRUCache, split_specs
+from columns import ByIdView, RowsView, UniColumns
+from search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+
+class Catalog:
+    """Снимок каталога: строки, словарь по ID, города, направления и индексы.
+
+    ``universities`` и ``by_id`` отдают строки как словари только для чтения
+    (UniView), сами данные хранятся в колонках ``columns``.
+
+    У снимка из файла (snapshot.py) есть ещё ``cards`` и ``details`` — готовый
+    HTML и JSON полной карточки по row id; у каталога из SQLite они None.
+    """
+
+    cards = None
+    details = None
+    snapshot = None   # метаданные снимка: версия данных, источник, время сборки
+    deleted = frozenset()   # row id удалённых строк (после with_changes)
+    change_seq = None       # последняя учтённая запись журнала catalog_changes
+    changed_ids = None      # ID, изменённые относительно предыдущего снимка (None — полная загрузка)
+
+    def __init__(self, rows, version: int = 0):
+        self.version = version
+        self.columns = UniColumns(rows)
+        self.universities = RowsView(self.columns)
+        self.by_id = ByIdView(self.columns)
+
+        self.cities = sorted({c.strip() for c in self.columns.city_table if c.strip()})
+        self.specialties = sorted({s for combo in self.columns.spec_table for s in split_specs(combo)})
+        self.index = CatalogIndex(self.universities)
+        self.search = SearchIndex(self.universities)
+
+    @classmethod
+    def from_parts(cls, columns, by_id_rows, index, search, cities, specialties,
+                   cards=None, details=None, snapshot=None, version: int = 0) -> "Catalog":
+        """Каталог из готовых структур без пересчёта индексов."""
+        cat = cls.__new__(cls)
+        cat.version = version
+        cat.columns = columns
+        cat.universities = RowsView(columns)
+        cat.by_id = ByIdView(columns, by_id_rows)
+        cat.cities = cities
+        cat.specialties = specialties
+        cat.index = index
+        cat.search = search
+        cat.cards = cards
+        cat.details = details
+        cat.snapshot = snapshot
+        return cat
+
+    def with_changes(self, upserts: list, deleted_ids) -> "Catalog":
+        """Новый снимок, в котором строки upserts (словари как у row_to_listing)
+        добавлены или заменены, а ID из deleted_ids удалены.
+
+        Изменённые строки сохраняют свои row id, новые дописываются в конец,
+        удалённые остаются в колонках, но пропадают из индексов и by_id.
+        Исходный снимок не меняется.
+        """
+        if self.cards is not None:
+            raise ValueError("снимок из файла обновляется только целиком")
+        old, new, changes = {}, {}, {}
+        added, removed = {}, set()
+        next_row = len(self.columns)
+
+        for uid in deleted_ids:
+            row = self.by_id.row_of(uid)
+            if row is not None:
+                old[row], new[row] = self.universities[row], None
+                removed.add(uid)
+        for uni in upserts:
+            uid = uni["ID"].strip()
+            if not uid:
+                continue
+            row = self.by_id.row_of(uid)
+            if row is None:
+                row = added.get(uid)
+                if row is None:
+                    row = added[uid] = next_row
+                    next_row += 1
+            else:
+                old[row] = self.universities[row]
+            new[row] = changes[row] = uni
+
+        columns = self.columns.with_changes(changes)
+        deleted = self.deleted | {row for row, uni in new.items() if uni is None}
+        cat = Catalog.from_parts(
+            columns,
+            by_id_rows=self.by_id.rows_with_changes(added, removed),
+            index=self.index.with_changes(old, new, len(columns), deleted),
+            search=self.search.with_changes(old, new),
+            cities=_live_values(columns.city_codes, columns.city_table, deleted, str.strip),
+            specialties=_live_values(columns.spec_codes, columns.spec_table, deleted, split_specs),
+            version=self.version,
+        )
+        cat.deleted = deleted
+        cat.changed_ids = frozenset(removed) | {u["ID"].strip() for u in upserts}
+        return cat
+
+    def __len__(self):
+        return len(self.universities) - len(self.deleted)
+
+    def card(self, uid: str):
+        """Готовый HTML карточки из снимка; None — если его нет."""
+        if self.cards is None:
+            return None
+        row = self.by_id.row_of(uid)
+        return None if row is None else self.cards[row]
+
+    def detail(self, uid: str):
+        """Полная карточка (dict) из снимка; None — если её нет."""
+        if self.details is None:
+            return None
+        row = self.by_id.row_of(uid)
+        return None if row is None else json.loads(self.details[row])
+
+
+def _live_values(codes, table, deleted, expand) -> list:
+    """Отсортированные значения (города или направления) живых строк."""
+    if deleted:
+        used = {codes[r] for r in range(len(codes)) if r not in deleted}
+    else:
+        used = set(codes)
+    values = set()
+    for code in used:
+        value = expand(table[code])
+        if isinstance(value, str):
+            value = [value]
+        values.update(v for v in value if v)
+    return sorted(values)
+
+
+LISTING_COLUMNS = "id, name, city, specialties, min_score"
+CHANGES_TABLE = "catalog_changes"
+
+
+def row_to_listing(row) -> dict:
+    """Компактная строка для списков и фильтров."""
+    return {
+        "ID": str(row["id"]),
+        "Name": row["name"] or "",
+        "City": row["city"] or "",
+        "Specialties": row["specialties"] or "",
+        "MinScore": row["min_score"],
+    }
+
+
+def row_to_uni(row) -> dict:
+    """Полная карточка ВУЗа."""
+    return {
+        "ID": str(row["id"]),
+        "Name": row["name"] or "",
+        "City": row["city"] or "",
+        "Specialties": row["specialties"] or "",
+        "MinScore": row["min_score"],
+        "About": row["about"] or "",
+        "Programs": row["programs"] or "",
+        "Admission": row["admission"] or "",
+        "Tour_3d": row["tour_3d"] or "",
+        "International": row["international"] or "",
+        "Website": row["website"] or "",
+    }
+
+
+def load_catalog(db_path: str, version: int = 0):
+    """Читает таблицу universities и строит Catalog. None — если БД недоступна.
+
+    Блокирующая функция: в работающем боте вызывается через asyncio.to_thread.
+    """
+    if not os.path.exists(db_path):
+        logger.error(f"Файл базы данных {db_path} не найден. Проверьте путь.")
+        return None
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        # Журнал читается до строк: изменения после этой точки применятся повторно, а не потеряются
+        seq = read_change_seq(conn)
+        cursor = conn.execute(f"SELECT {LISTING_COLUMNS} FROM universities")
+        # Строки сразу раскладываются по колонкам, без промежуточного списка
+        cat = Catalog((row_to_listing(r) for r in cursor), version=version)
+        cat.change_seq = seq
+        return cat
+    except sqlite3.OperationalError:
+        logger.error("Таблица universities не найдена в БД. Убедитесь, что таблица существует.")
+        return Catalog([], version=version)
+    finally:
+        conn.close()
+
+
+def read_change_seq(conn):
+    """Номер последней записи журнала catalog_changes; None — журнала в базе нет."""
+    try:
+        conn.execute(f"SELECT 1 FROM {CHANGES_TABLE} LIMIT 1")
+    except sqlite3.OperationalError:
+        return None
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (CHANGES_TABLE,)).fetchone()
+    return row[0] if row else 0
+
+
+def load_changes(db_path: str, since: int, max_rows: int):
+    """Изменения после записи since: (seq, [строки], [удалённые ID]).
+
+    None — инкрементально не получится (журнала нет, он обрезан или изменений
+    больше max_rows), нужна полная перезагрузка.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        last = read_change_seq(conn)
+        if last is None:
+            return None
+        if last <= since:
+            return last, [], []
+        first = conn.execute(f"SELECT MIN(seq) FROM {CHANGES_TABLE}").fetchone()[0]
+        if first is None or first > since + 1:
+            return None
+        ids = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT id FROM {CHANGES_TABLE} WHERE seq > ? AND seq <= ?", (since, last))]
+        if len(ids) > max_rows:
+            return None
+        found = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            query = f"SELECT rowid, {LISTING_COLUMNS} FROM universities WHERE id IN ({placeholders})"
+            for r in conn.execute(query, chunk):
+                found[str(r["id"])] = (r["rowid"], row_to_listing(r))
+        # Новые строки дописываются в порядке rowid — как при полной загрузке
+        upserts = [uni for _, uni in sorted(found.values(), key=lambda item: item[0])]
+        return last, upserts, [uid for uid in ids if uid not in found]
+    finally:
+        conn.close()
+
+
+class DetailsStore:
+    """Полные карточки ВУЗов по ID: чтение из SQLite в отдельном потоке + LRU-кэш."""
+
+    def __init__(self, db_path: str, maxsize: int = 256):
+        self.db_path = db_path
+        self.cache = LRUCache(maxsize)
+        self._generation = 0   # увеличивается при перезагрузке данных
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-details")
+
+    def _query(self, ids: list) -> dict:
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            placeholders = ",".join("?" * len(ids))
+            rows = conn.execute(
+                f"SELECT * FROM universities WHERE id IN ({placeholders})", ids
+            ).fetchall()
+        finally:
+            conn.close()
+        return {str(r["id"]): row_to_uni(r) for r in rows}
+
+    async def get_many(self, ids: list) -> dict:
+        """{ID: карточка} для найденных ID; недостающие читаются одним запросом."""
+        found = {}
+        missing = []
+        for uid in ids:
+            uni = self.cache.lookup(uid)
+            if uni is None:
+                missing.append(uid)
+            else:
+                found[uid] = uni
+
+        if missing:
+            generation = self._generation
+            loop = asyncio.get_running_loop()
+            try:
+                fetched = await loop.run_in_executor(self._executor, self._query, missing)
+            except sqlite3.Error:
+                logger.exception("Не удалось прочитать карточки ВУЗов из БД.")
+                fetched = {}
+            for uid, uni in fetched.items():
+                # Данные, прочитанные до перезагрузки, в кэш не кладём
+                if generation == self._generation:
+                    self.cache.put(uid, uni)
+                found[uid] = uni
+        return found
+
+    async def get(self, uid: str):
+        return (await self.get_many([uid])).get(uid)
+
+    def clear(self):
+        self._generation += 1
+        self.cache.clear()
+
+    def forget(self, ids):
+        """Сбрасывает карточки только этих ID (точечная перезагрузка каталога)."""
+        self._generation += 1
+        for uid in ids:
+            self.cache.discard(uid)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def db_fingerprint(db_path: str):
+    """(inode, mtime, размер) файла БД и его WAL-журнала; меняется при любой записи."""
+    fp = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+        except OSError:
+            fp.append(None)
+        else:
+            fp.append((st.st_ino, st.st_mtime_ns, st.st_size))
+    return tuple(fp)
+
+
+class CatalogWatcher:
+    """Фоновая задача: следит за файлом БД и перезагружает каталог при изменениях.
+
+    on_reload(catalog) вызывается в потоке событий с уже полностью построенным снимком.
+    loader(path) строит каталог (по умолчанию из SQLite; для файла снимка —
+    snapshot.load_snapshot).
+
+    Если передан current() — текущий каталог — и база ведёт журнал изменений,
+    перечитываются только изменённые строки. Полная перезагрузка — когда журнала
+    нет, он обрезан, или изменённых (и накопленных удалённых) строк больше
+    ``incremental_fraction`` каталога.
+    """
+
+    def __init__(self, db_path: str, on_reload, interval: float = 5.0, loader=None, current=None,
+                 incremental_fraction: float = 0.1):
+        self.db_path = db_path
+        self.on_reload = on_reload
+        self.interval = interval
+        self.loader = loader or load_catalog
+        self.current = current
+        self.incremental_fraction = incremental_fraction
+        self._fingerprint = db_fingerprint(db_path)
+        self._task = None
+
+    async def check(self) -> bool:
+        """Одна проверка; True — если каталог был перезагружен."""
+        fp = db_fingerprint(self.db_path)
+        if fp == self._fingerprint:
+            return False
+        try:
+            new_catalog = await self._load_incremental()
+        except Exception:
+            # Что бы ни сломалось в точечном пути, каталог перечитывается целиком —
+            # иначе отпечаток не сменится и та же ошибка будет повторяться каждую проверку
+            logger.exception("Точечная перезагрузка не удалась, перечитываю каталог целиком.")
+            new_catalog = None
+        if new_catalog is False:
+            self._fingerprint = fp   # файл изменился, но строки каталога — нет
+            return False
+        if new_catalog is None:
+            try:
+                new_catalog = await asyncio.to_thread(self.loader, self.db_path)
+            except (sqlite3.Error, OSError, ValueError):
+                logger.exception("Не удалось перечитать БД, оставляю текущий каталог.")
+                return False
+        self._fingerprint = fp
+        if new_catalog is None:
+            return False
+        self.on_reload(new_catalog)
+        return True
+
+    async def _load_incremental(self):
+        """Каталог с применёнными изменениями; False — изменений нет; None — нужна полная загрузка."""
+        current = self.current() if self.current is not None else None
+        if current is None or self.loader is not load_catalog or current.change_seq is None:
+            return None
+        budget = int(len(current) * self.incremental_fraction) - len(current.deleted)
+        if budget <= 0:
+            return None
+        changes = await asyncio.to_thread(load_changes, self.db_path, current.change_seq, budget)
+        if changes is None:
+            return None
+        seq, upserts, deleted = changes
+        if not upserts and not deleted:
+            return False
+        new_catalog = await asyncio.to_thread(current.with_changes, upserts, deleted)
+        new_catalog.change_seq = seq
+        return new_catalog
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Ошибка при проверке обновлений БД.")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
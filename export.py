@@ -0,0 +1,103 @@
+"""Выгрузка отфильтрованного списка ВУЗов в CSV/XLSX.
+
+Файл собирается в памяти из снимка каталога (ID, название, город,
+направления, минимальный балл) построчно, без промежуточного списка
+словарей, в отдельном пуле потоков — большая выгрузка не блокирует цикл
+событий. Готовый файл кэшируется по ключу фильтра и формату, а после первой
+отправки запоминается его file_id в Telegram: повторно тот же файл уходит
+без генерации и без загрузки. Кэш сбрасывается при перезагрузке каталога.
+
+XLSX пишется через openpyxl (необязательная зависимость, режим write_only);
+без неё доступен только CSV (UTF-8 с BOM, чтобы Excel открыл кириллицу).
+"""
+
+import asyncio
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog import LRUCache
+
+FORMATS = ("csv", "xlsx")
+HEADER = ("ID", "Название", "Город", "Направления", "Мин. балл")
+
+
+def _records(columns, rows):
+    """Строки выгрузки прямо из колонок каталога (без UniView на каждую строку)."""
+    ids, names, min_score = columns.ids, columns.names, columns.min_score
+    city_codes, spec_codes, spec_table = columns.city_codes, columns.spec_codes, columns.spec_table
+    cities = [columns.city_table[c] for c in range(len(columns.city_table))]   # городов единицы десятков
+    for r in rows:
+        ms = min_score(r)
+        yield ids[r], names[r], cities[city_codes[r]], spec_table[spec_codes[r]], "" if ms is None else ms
+
+
+def write_csv(columns, rows) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(HEADER)
+    writer.writerows(_records(columns, rows))
+    return buf.getvalue().encode("utf-8-sig")
+
+
+def write_xlsx(columns, rows) -> bytes:
+    from openpyxl import Workbook   # ImportError — XLSX недоступен
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("ВУЗы")
+    ws.append(HEADER)
+    for record in _records(columns, rows):
+        ws.append(record)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def write_export(columns, rows, fmt: str) -> bytes:
+    """Файл формата fmt ("csv"/"xlsx") со строками rows каталога (columns — catalog.columns)."""
+    return write_xlsx(columns, rows) if fmt == "xlsx" else write_csv(columns, rows)
+
+
+class ExportCache:
+    """Готовые файлы выгрузки и их file_id в Telegram по ключу (версия каталога, фильтр, формат)."""
+
+    def __init__(self, files_maxsize: int = 16, workers: int = 2):
+        self.files = LRUCache(files_maxsize)               # ключ -> bytes
+        self.file_ids = LRUCache(files_maxsize * 16)       # ключ -> file_id отправленного документа
+        self._pending = {}                                 # ключ -> future генерации
+        self._generation = 0                               # увеличивается при перезагрузке данных
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+
+    async def get(self, key, build) -> bytes:
+        """Файл из кэша или build() в пуле потоков; одинаковые запросы ждут одну генерацию."""
+        data = self.files.lookup(key)
+        if data is not None:
+            return data
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, build)
+            self._pending[key] = future
+            generation = self._generation
+            try:
+                data = await asyncio.shield(future)   # отмена одного ожидающего не отменяет генерацию
+            finally:
+                self._pending.pop(key, None)
+            # Файл, собранный до перезагрузки, в кэш не кладём
+            if generation == self._generation:
+                self.files.put(key, data)
+            return data
+        return await asyncio.shield(future)
+
+    def file_id(self, key):
+        return self.file_ids.lookup(key)
+
+    def remember(self, key, file_id: str):
+        self.file_ids.put(key, file_id)
+
+    def clear(self):
+        self._generation += 1
+        self.files.clear()
+        self.file_ids.clear()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
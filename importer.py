@@ -0,0 +1,329 @@
+"""Импорт каталога ВУЗов из CSV/XLSX в universities.db.
+
+    python importer.py universities_kz_filled.csv
+    python importer.py data.xlsx --db universities.db --sheet Лист1 --delete-missing
+
+Файл читается потоком, порциями по ``--chunk`` строк. Каждая строка
+проверяется (ID, название и город обязательны, MinScore — целое число или
+пусто), для неё считается хэш содержимого. Строки, чей хэш совпадает с
+сохранённым в базе, пропускаются; остальные записываются апсертом через
+``executemany``, одна транзакция на порцию. Файл — полный источник строки:
+колонки, которых в нём нет, записываются пустыми.
+
+При первом запуске схема дополняется:
+
+* колонка ``content_hash`` (для уже существующих строк заполняется сразу);
+* журнал ``catalog_changes`` и триггеры, записывающие в него ID каждой
+  вставленной, изменённой или удалённой строки — любым способом, не только
+  импортом.
+
+По журналу работающий бот (CatalogWatcher) перечитывает только изменённые
+строки. Журнал обрезается до последних ``CHANGELOG_KEEP`` записей; если бот
+отстал сильнее, он перезагружает каталог целиком.
+
+Если к базе применена нормализованная схема (sqlcatalog.py), её справочники
+и FTS обновляются триггерами; если импорт переписывает заметную долю таблицы
+(``BULK_FRACTION``), они пересчитываются один раз в конце.
+
+XLSX читается через openpyxl (необязательная зависимость).
+"""
+
+import argparse
+from contextlib import ExitStack
+import csv
+import hashlib
+import json
+import os
+from operator import itemgetter
+import sqlite3
+import sys
+import time
+
+from dataset import CHANGES_TABLE
+from sqlcatalog import bulk_load, is_migrated
+
+COLUMNS = ("id", "name", "city", "specialties", "min_score", "about", "programs",
+           "admission", "tour_3d", "international", "website")
+REQUIRED = ("id", "name", "city")
+_REQUIRED_POS = tuple(COLUMNS.index(c) for c in REQUIRED)
+_SCORE = COLUMNS.index("min_score")
+# Заголовки файла (как в universities_kz_filled.csv) -> колонки таблицы
+HEADERS = {
+    "id": "id", "name": "name", "city": "city", "specialties": "specialties",
+    "minscore": "min_score", "min_score": "min_score", "about": "about", "programs": "programs",
+    "admission": "admission", "tour_3d": "tour_3d", "tour3d": "tour_3d",
+    "international": "international", "website": "website",
+}
+
+CHUNK_SIZE = 10_000
+CHANGELOG_KEEP = 200_000
+# Когда записано больше этой доли таблицы, триггеры нормализованной схемы
+# (sqlcatalog.py) снимаются до конца импорта: поддержка справочников и FTS
+# триггерами стоит ~0,2 мс на изменённую строку, пересчёт — ~55 мкс на строку таблицы
+BULK_FRACTION = 0.25
+MAX_REPORTED_ERRORS = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS universities (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    city TEXT NOT NULL,
+    specialties TEXT,
+    min_score INTEGER,
+    about TEXT,
+    programs TEXT,
+    admission TEXT,
+    tour_3d TEXT,
+    international TEXT,
+    website TEXT,
+    content_hash TEXT
+);
+"""
+
+CHANGELOG = f"""
+CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS universities_log_insert AFTER INSERT ON universities
+BEGIN
+    INSERT INTO {CHANGES_TABLE} (id) VALUES (NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS universities_log_update
+AFTER UPDATE OF {", ".join(COLUMNS)} ON universities
+BEGIN
+    INSERT INTO {CHANGES_TABLE} (id) SELECT OLD.id WHERE OLD.id IS NOT NEW.id;
+    INSERT INTO {CHANGES_TABLE} (id) VALUES (NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS universities_log_delete AFTER DELETE ON universities
+BEGIN
+    INSERT INTO {CHANGES_TABLE} (id) VALUES (OLD.id);
+END;
+"""
+
+UPSERT = (
+    f"INSERT INTO universities ({', '.join(COLUMNS)}, content_hash) "
+    f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))}) "
+    "ON CONFLICT(id) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in COLUMNS[1:] + ("content_hash",))
+    + " WHERE universities.content_hash IS NOT excluded.content_hash"
+)
+# То же для всей порции одним оператором (строки — JSON-массив массивов). FTS5
+# сбрасывает буфер в конце каждого оператора, и при executemany триггеры
+# нормализованной схемы записывали бы в индекс по сегменту на строку
+JSON_UPSERT = (
+    f"INSERT INTO universities ({', '.join(COLUMNS)}, content_hash) "
+    "SELECT " + ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(COLUMNS) + 1))
+    + " FROM json_each(?) WHERE true "
+    + UPSERT[UPSERT.index("ON CONFLICT"):]
+)
+
+
+class RowError(ValueError):
+    """Строка файла не прошла проверку."""
+
+
+def content_hash(values) -> str:
+    """Хэш содержимого строки (кортеж в порядке COLUMNS: строки и MinScore — int или None)."""
+    ms = values[_SCORE]
+    text = "\x1f".join(values[:_SCORE] + ("" if ms is None else str(ms),) + values[_SCORE + 1:])
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)   # числа из XLSX: 120.0 -> "120"
+    return str(value).strip()
+
+
+def parse_min_score(value):
+    """MinScore -> int или None (пусто). RowError — если это не целое число."""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+        raise RowError(f"MinScore {value} — не целое число")
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            number = float(text)
+        except ValueError:
+            number = None
+        if number is not None and number.is_integer():
+            return int(number)
+        raise RowError(f"MinScore «{text}» — не целое число") from None
+
+
+def clean_row(raw) -> tuple:
+    """Проверенная строка: raw — строки в порядке COLUMNS (как отдаёт read_rows)."""
+    values = [v.strip() for v in raw]
+    for i in _REQUIRED_POS:
+        if not values[i]:
+            raise RowError(f"пустое поле {COLUMNS[i]}")
+    values[_SCORE] = parse_min_score(values[_SCORE])
+    return tuple(values)
+
+
+def _picker(header):
+    """Функция: строка файла -> кортеж значений в порядке COLUMNS ("" для отсутствующих колонок)."""
+    positions = {}
+    for i, h in enumerate(header):
+        column = HEADERS.get(_text(h).lower())
+        if column is not None:
+            positions.setdefault(column, i)
+    missing = [c for c in REQUIRED if c not in positions]
+    if missing:
+        raise ValueError(f"в файле нет колонок: {', '.join(missing)}")
+    # Отсутствующие колонки берутся из дописанной в конец пустой ячейки
+    width = len(header)
+    get = itemgetter(*(positions.get(c, width) for c in COLUMNS))
+
+    def pick(row: list):
+        if len(row) != width:
+            row = (row + [""] * width)[:width]
+        return get(row + [""])
+
+    return pick
+
+
+def read_rows(path: str, sheet: str = None):
+    """(номер строки файла, кортеж строк в порядке COLUMNS) — потоком, без чтения файла целиком."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise SystemExit("Для XLSX установите openpyxl: pip install openpyxl") from None
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = (wb[sheet] if sheet else wb.active).iter_rows(values_only=True)
+            pick = _picker(next(rows, ()))
+            for line, row in enumerate(rows, start=2):
+                if any(v is not None for v in row):
+                    yield line, pick([_text(v) for v in row])
+        finally:
+            wb.close()
+        return
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        pick = _picker(next(reader, ()))
+        for row in reader:
+            if any(row):
+                yield reader.line_num, pick(row)
+
+
+def ensure_schema(conn: sqlite3.Connection):
+    """Создаёт/дополняет таблицу, заполняет content_hash и включает журнал изменений."""
+    conn.executescript(SCHEMA)
+    if "content_hash" not in {r[1] for r in conn.execute("PRAGMA table_info(universities)")}:
+        conn.execute("ALTER TABLE universities ADD COLUMN content_hash TEXT")
+    # Триггер на UPDATE не следит за content_hash, поэтому заполнение не попадает в журнал
+    missing = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM universities WHERE content_hash IS NULL").fetchall()
+    conn.executemany("UPDATE universities SET content_hash = ? WHERE id = ?",
+                     ((content_hash(_db_values(r)), r[0]) for r in missing))
+    conn.executescript(CHANGELOG)
+    conn.commit()
+
+
+def _db_values(row) -> tuple:
+    """Строка из базы в том же виде, что clean_row: NULL -> "", MinScore как есть."""
+    return tuple(v if i == _SCORE else ("" if v is None else str(v)) for i, v in enumerate(row))
+
+
+def import_file(path: str, db_path: str, chunk: int = CHUNK_SIZE, sheet: str = None,
+                delete_missing: bool = False) -> dict:
+    """Импортирует файл в базу; возвращает счётчики и первые ошибки проверки."""
+    stats = {"read": 0, "invalid": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "errors": []}
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_schema(conn)
+        known = dict(conn.execute("SELECT id, content_hash FROM universities"))
+        seen = set()
+        batch = []
+        written, bulk_mode = 0, False
+        normalized = is_migrated(conn)
+
+        with ExitStack() as bulk:
+            def flush():
+                nonlocal written, bulk_mode
+                written += len(batch)
+                if not bulk_mode and written >= BULK_FRACTION * len(known):
+                    bulk.enter_context(bulk_load(conn))
+                    bulk_mode = True
+                with conn:   # одна транзакция на порцию
+                    if normalized and not bulk_mode:
+                        conn.execute(JSON_UPSERT, (json.dumps(batch, ensure_ascii=False),))
+                    else:
+                        conn.executemany(UPSERT, batch)
+                batch.clear()
+
+            for line, raw in read_rows(path, sheet):
+                stats["read"] += 1
+                # ID помечается до проверки полей: строка с опечаткой не должна
+                # превращать ВУЗ в «отсутствующий в файле» для --delete-missing
+                uid = raw[0].strip()
+                seen.add(uid)
+                try:
+                    values = clean_row(raw)
+                except RowError as e:
+                    stats["invalid"] += 1
+                    if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                        where = f"строка {line} ({uid})" if uid else f"строка {line}"
+                        stats["errors"].append(f"{where}: {e}")
+                    continue
+                h = content_hash(values)
+                old = known.get(uid)
+                if old == h:
+                    stats["unchanged"] += 1
+                    continue
+                stats["updated" if uid in known else "inserted"] += 1
+                known[uid] = h
+                batch.append(values + (h,))
+                if len(batch) >= chunk:
+                    flush()
+            if batch:
+                flush()
+
+            if delete_missing:
+                gone = [(uid,) for uid in known if uid not in seen]
+                for i in range(0, len(gone), chunk):
+                    with conn:
+                        conn.executemany("DELETE FROM universities WHERE id = ?", gone[i:i + chunk])
+                stats["deleted"] = len(gone)
+
+        with conn:
+            conn.execute(f"DELETE FROM {CHANGES_TABLE} WHERE seq <= (SELECT MAX(seq) FROM {CHANGES_TABLE}) - ?",
+                         (CHANGELOG_KEEP,))
+    finally:
+        conn.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт ВУЗов из CSV/XLSX в SQLite с инкрементальным апсертом.")
+    parser.add_argument("path", help="CSV или XLSX с колонками ID, Name, City, Specialties, MinScore, ...")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "universities.db"))
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="строк на транзакцию")
+    parser.add_argument("--sheet", help="лист XLSX (по умолчанию активный)")
+    parser.add_argument("--delete-missing", action="store_true", help="удалить из базы ВУЗы, которых нет в файле")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    stats = import_file(args.path, args.db, args.chunk, args.sheet, args.delete_missing)
+    elapsed = time.perf_counter() - started
+    for error in stats.pop("errors"):
+        print(f"  ! {error}", file=sys.stderr)
+    print(", ".join(f"{k}: {v}" for k, v in stats.items()) + f" — {elapsed:.1f} с")
+    if stats["invalid"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
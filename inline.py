@@ -0,0 +1,130 @@
+"""Инлайн-режим: поиск ВУЗов из любого чата (``@бот запрос``).
+
+Инлайн-запросы приходят на каждое нажатие клавиши, поэтому ответ собирается
+из готовых частей:
+
+* ``InlineQueryResultArticle`` строится один раз на ВУЗ и переиспользуется
+  во всех ответах (объекты aiogram заморожены), см. ``articles``;
+* готовая страница ответа (список статей + next_offset) кэшируется по
+  нормализованному запросу и смещению на ``ttl`` секунд, см. ``results``.
+  Повторный запрос — один поиск в словаре, без поиска по индексу и без
+  новых объектов.
+
+Ранжирование то же, что у текстового поиска в чате (``SearchIndex.search``),
+пустой запрос показывает каталог по порядку. Страницы по ``page_size``
+результатов, всего не больше ``max_results``; Telegram сам кэширует ответы
+на ``cache_time`` секунд (см. обработчик в main.py).
+"""
+
+import re
+from itertools import islice
+
+from aiogram.types import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    LinkPreviewOptions,
+)
+
+from catalog import LRUCache, TTLCache
+from render import build_uni_summary
+from search import normalize
+
+RESULT_ID_LIMIT = 64     # байт в id результата
+MAX_OFFSET_LEN = 8       # next_offset — не больше 64 байт, нам хватает числа
+_START_PARAM = re.compile(r"[A-Za-z0-9_-]{1,60}")   # допустимый ?start= (с префиксом uni_ — до 64)
+_NO_PREVIEW = LinkPreviewOptions(is_disabled=True)
+_EMPTY = ([], "")
+
+
+def deep_link_param(uid: str):
+    """Параметр /start для карточки ВУЗа (None — ID не помещается в диплинк)."""
+    return f"uni_{uid}" if _START_PARAM.fullmatch(uid) else None
+
+
+class InlineSearch:
+    """Страницы ответов на инлайн-запросы с кэшем статей и результатов."""
+
+    def __init__(self, page_size: int = 20, max_results: int = 100, ttl: float = 60.0,
+                 cache_size: int = 2048, articles_size: int = 4096):
+        self.page_size = page_size
+        self.max_results = max_results
+        self.results = TTLCache(cache_size, ttl)   # (запрос, смещение) -> (статьи, next_offset)
+        self.articles = LRUCache(articles_size)    # ID ВУЗа -> InlineQueryResultArticle
+        self.bot_username = None                   # для кнопки-диплинка на полную карточку
+
+    def page(self, catalog, query: str, offset: str = ""):
+        """(статьи, next_offset) для запроса query начиная со смещения offset."""
+        start = int(offset) if offset.isdigit() and len(offset) <= MAX_OFFSET_LEN else 0
+        if start >= self.max_results:
+            return _EMPTY
+        key = (normalize(query), start)
+        cached = self.results.lookup(key)
+        if cached is None:
+            cached = self._build_page(catalog, key[0], start)
+            self.results.put(key, cached)
+        return cached
+
+    def _build_page(self, catalog, query: str, start: int):
+        stop = min(start + self.page_size, self.max_results)
+        if query:
+            # Тот же k для всех смещений — страницы одного запроса не пересекаются
+            rows = catalog.search.search(query, k=self.max_results)[start:stop + 1]
+        else:
+            deleted = catalog.deleted
+            live = (r for r in range(len(catalog.universities)) if r not in deleted)
+            rows = list(islice(live, start, stop + 1))
+        if not rows:
+            return _EMPTY
+        more = len(rows) > stop - start and stop < self.max_results
+        unis = catalog.universities
+        articles = [self.article(unis[r], r) for r in rows[:stop - start]]
+        return articles, str(stop) if more else ""
+
+    def article(self, uni, row: int) -> InlineQueryResultArticle:
+        uid = uni["ID"]
+        result = self.articles.lookup(uid)
+        if result is None:
+            result = self._build_article(uni, row)
+            self.articles.put(uid, result)
+        return result
+
+    def _build_article(self, uni, row: int) -> InlineQueryResultArticle:
+        uid = uni["ID"]
+        score = str(uni.get("MinScore", ""))
+        description = " · ".join(p for p in (
+            uni.get("City") or "",
+            f"балл от {score}" if score else "",
+            uni.get("Specialties") or "",
+        ) if p)
+        markup = None
+        param = deep_link_param(uid)
+        if self.bot_username and param:
+            markup = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+                text="📖 Подробнее в боте", url=f"https://t.me/{self.bot_username}?start={param}",
+            )]])
+        return InlineQueryResultArticle(
+            id=uid if len(uid.encode("utf-8")) <= RESULT_ID_LIMIT else f"row{row}",
+            title=uni.get("Name") or "Без названия",
+            description=description[:200],
+            input_message_content=InputTextMessageContent(
+                message_text=build_uni_summary(uni),
+                parse_mode="HTML",
+                link_preview_options=_NO_PREVIEW,
+            ),
+            reply_markup=markup,
+        )
+
+    def clear(self):
+        self.results.clear()
+        self.articles.clear()
+
+    def invalidate(self, uids):
+        """Точечная перезагрузка: статьи изменённых ВУЗов и все страницы (в них другой состав)."""
+        self.results.clear()
+        for uid in uids:
+            self.articles.discard(uid)
+
+    def stats(self) -> dict:
+        return {"results": self.results.stats(), "articles": self.articles.stats()}
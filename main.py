@@ -1,35 +1,111 @@
 
-# Исправлённый main.py с добавленной кнопкой "📄 Полный список ВУЗов"
-# - Кнопка добавлена в главное меню, в карточку университета и в просмотр сравнения.
-# - Кнопка открывает ссылку на Google Drive с полной таблицей (url).
+# Исправлённый main.py с выгрузкой списка ВУЗов файлом
+# - Кнопка «📥 Скачать список» есть в главном меню, в списке, в карточке университета и в сравнении.
+# - Кнопка присылает CSV/XLSX с ВУЗами по текущим фильтрам (export.py).
+# - Кнопки несут короткие коды вместо названий и ID, разбор — по префиксу (callbacks.py).
 #
 # Запустите: python main.py
 
 import os
 import asyncio
 import logging
-import sqlite3
 from math import ceil
-from random import choice
+from random import randrange
 import html
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.filters import CommandStart
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.types import (
+    BufferedInputFile,
     Message,
     CallbackQuery,
-    ReplyKeyboardRemove,
+    InlineQuery,
     InlineKeyboardMarkup,
     InlineKeyboardButton,
 )
-from aiogram.exceptions import TelegramBadRequest
+
+from callbacks import (
+    PAGE_NEXT,
+    PAGE_PREV,
+    CallbackCodes,
+    CallbackRouter,
+    CityPage,
+    CityPick,
+    CompareAdd,
+    Export,
+    SpecPage,
+    SpecPick,
+    UniOpen,
+    UnisBack,
+)
+from catalog import LRUCache, filter_key, norm
+from dataset import Catalog, CatalogWatcher, DetailsStore, load_catalog
+from export import FORMATS as EXPORT_FORMATS, ExportCache, write_export
+from inline import InlineSearch
+from metrics import BotMetrics
+from paging import make_cursor, row_position, seek
+from ratelimit import OutboundLimiter
+from recommend import Recommender
+from render import RenderCache, build_uni_card
+from responses import CallStats, Responder
+from scheduler import UserScheduler
+from snapshot import SnapshotDetails, load_snapshot
+from sessions import MemorySessionStore, SQLiteSessionStore, SessionFSMStorage
 
 # ================== НАСТРОЙКИ ==================
 BOT_TOKEN = os.getenv("BOT_TOKEN", "ВАШ_ТОКЕН_ЗДЕСЬ")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")  # свой Bot API сервер; пусто — api.telegram.org
 DB_PATH = os.getenv("DB_PATH", "universities.db")
-
-# Ссылка на полный список ВУЗов (Google Drive)
-FULL_UNIS_URL = "https://drive.google.com/drive/folders/1fjZvILeJXRLSkiL2zhaz_fcngD7nKkoU"
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", "256"))
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "1024"))
+DETAILS_CACHE_SIZE = int(os.getenv("DETAILS_CACHE_SIZE", "256"))  # полные карточки в памяти
+RELOAD_INTERVAL = float(os.getenv("RELOAD_INTERVAL", "5"))  # проверка изменений БД, сек; 0 — выкл.
+# Готовый снимок каталога (python snapshot.py build); пусто — каталог строится из DB_PATH
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "")
+
+# Инлайн-режим (@бот запрос в любом чате; включается в @BotFather командой /setinline)
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))    # кэш ответа на стороне Telegram, сек
+INLINE_RESULTS_TTL = float(os.getenv("INLINE_RESULTS_TTL", "60"))  # кэш страниц ответа в боте, сек
+INLINE_PAGE_SIZE = int(os.getenv("INLINE_PAGE_SIZE", "20"))        # результатов в одном ответе (до 50)
+
+# Режим получения апдейтов: "polling" (по умолчанию) или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").strip().lower()
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")  # публичный HTTPS-адрес; пусто — без set_webhook
+
+# Хранилище сессий: "memory" (по умолчанию) или "sqlite" (переживает перезапуск)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").strip().lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_MAX_USERS = int(os.getenv("SESSION_MAX_USERS", "100000"))  # сколько сессий держать в памяти
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(30 * 24 * 3600)))  # секунды; 0 — без ограничения
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))
+
+# Лимиты исходящих запросов (Telegram: ~30 сообщений/с всего и ~1/с в один чат)
+OUTBOUND_LIMITS = os.getenv("OUTBOUND_LIMITS", "1") != "0"
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "1"))
+
+# Параллельная обработка: не больше UPDATE_CONCURRENCY обработчиков одновременно,
+# апдейты одного пользователя — строго по очереди; 0 — как в aiogram (без ограничений)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+
+# Метрики Prometheus на http://METRICS_HOST:METRICS_PORT/metrics; порт 0 — выключены
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
+
+# Telegram ID администраторов через запятую: им доступна команда /stats
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+
+# Выгрузка списка в CSV/XLSX: не больше EXPORT_MAX_ROWS строк, генерация в EXPORT_WORKERS потоках
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "100000"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_CACHE_SIZE = int(os.getenv("EXPORT_CACHE_SIZE", "16"))   # готовых файлов в памяти
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,154 +113,168 @@ logger = logging.getLogger(__name__)
 if not BOT_TOKEN or BOT_TOKEN == "ВАШ_ТОКЕН_ЗДЕСЬ":
     logger.warning("⚠️ ПРЕДУПРЕЖДЕНИЕ: Введите реальный токен бота в переменную BOT_TOKEN!")
 
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
+if SESSION_BACKEND == "sqlite":
+    session_store = SQLiteSessionStore(
+        SESSION_DB_PATH,
+        maxsize=SESSION_MAX_USERS,
+        ttl=SESSION_TTL or None,
+        flush_interval=SESSION_FLUSH_INTERVAL,
+    )
+else:
+    session_store = MemorySessionStore(maxsize=SESSION_MAX_USERS, ttl=SESSION_TTL or None)
+
+if TELEGRAM_API_URL:
+    bot = Bot(token=BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+else:
+    bot = Bot(token=BOT_TOKEN)
+outbound_limiter = OutboundLimiter(
+    global_rate=OUTBOUND_GLOBAL_RATE,
+    chat_rate=OUTBOUND_CHAT_RATE,
+    chat_burst=OUTBOUND_CHAT_BURST,
+)
+call_stats = CallStats()   # запросы к Bot API на один вызов обработчика
+bot_metrics = BotMetrics() if METRICS_PORT else None
+
+
+def setup_bot_session(session):
+    """Подключает request-middleware к сессии бота: метрики, учёт вызовов, затем лимиты."""
+    if bot_metrics is not None:
+        session.middleware(bot_metrics.request_middleware())
+    session.middleware(call_stats.request_middleware())
+    if OUTBOUND_LIMITS:
+        session.middleware(outbound_limiter)
+
+
+setup_bot_session(bot.session)
+dp = Dispatcher(storage=SessionFSMStorage(session_store))
+update_scheduler = UserScheduler(UPDATE_CONCURRENCY) if UPDATE_CONCURRENCY > 0 else None
+if update_scheduler is not None:
+    dp.update.outer_middleware(update_scheduler)
+dp.message.middleware(call_stats.action_middleware())
+dp.callback_query.middleware(call_stats.action_middleware())
+dp.inline_query.middleware(call_stats.action_middleware())
+if bot_metrics is not None:
+    bot_metrics.setup_dispatcher(dp)
 
 # ================== ГЛОБАЛЬНЫЕ ДАННЫЕ ==================
-universities = []
-UNIS_BY_ID = {}
-cities = []
-specialties = []
-
-user_state = {}      # user_id -> {"filters": {...}, "page": int, "await_score": bool}
-compare_list = {}    # user_id -> [ID, ID, ID]
+# Текущий снимок каталога. Подменяется целиком (см. install_catalog), поэтому
+# обработчик, взявший ссылку на catalog, видит согласованные данные.
+catalog = Catalog([])
+recommender = Recommender(catalog)
+stats_report = None   # (версия каталога, текст /stats) — считается по запросу, живёт до перезагрузки
+filter_cache = LRUCache(FILTER_CACHE_SIZE)
+render_cache = RenderCache(RENDER_CACHE_SIZE, RENDER_CACHE_SIZE)
+export_cache = ExportCache(EXPORT_CACHE_SIZE, EXPORT_WORKERS)
+inline_search = InlineSearch(page_size=INLINE_PAGE_SIZE, ttl=INLINE_RESULTS_TTL)
+# Коды городов, направлений и ВУЗов в callback_data; все кнопки разбирает один диспетчер по префиксу
+callback_codes = CallbackCodes(catalog)
+callback_router = CallbackRouter(callback_codes)
+dp.callback_query.outer_middleware(callback_router)
+dp.callback_query.register(callback_router.dispatch)
+if CATALOG_SNAPSHOT:
+    # Полные тексты уже лежат в снимке текущего каталога
+    uni_details = SnapshotDetails(lambda: catalog)
+else:
+    uni_details = DetailsStore(DB_PATH, DETAILS_CACHE_SIZE)
 
 CITIES_PER_PAGE = 8
 SPECS_PER_PAGE = 8
 UNIS_PER_PAGE = 5   # Количество ВУЗов на странице (кнопок)
+EXPORT_CSV = Export(fmt="csv").pack()
+EXPORT_XLSX = Export(fmt="xlsx").pack()
+RECOMMEND_TOP = 10  # ВУЗов в подборе по баллу
 
 # ================== РАБОТА С БАЗОЙ ==================
 
-def load_from_sqlite():
-    """Загружаем все вузы из SQLite в память."""
-    global universities, UNIS_BY_ID, cities, specialties
-
-    if not os.path.exists(DB_PATH):
-        logging.error(f"Файл базы данных {DB_PATH} не найден. Проверьте путь.")
+def install_catalog(new_catalog: Catalog):
+    """Атомарно подменяет каталог и сбрасывает зависящие от него кэши."""
+    global catalog, recommender, stats_report
+    new_catalog.version = catalog.version + 1
+    catalog = new_catalog
+    callback_codes.install(new_catalog)
+    recommender = Recommender(new_catalog)
+    stats_report = None
+    filter_cache.clear()
+    export_cache.clear()
+    changed = new_catalog.changed_ids
+    if changed is None:
+        render_cache.clear()
+        uni_details.clear()
+        inline_search.clear()
+    else:
+        # Точечная перезагрузка: карточки остальных ВУЗов остаются в кэше
+        render_cache.invalidate(changed)
+        uni_details.forget(changed)
+        inline_search.invalidate(changed)
+        logging.info(f"Обновлено строк каталога: {len(changed)} (версия данных {catalog.version})")
         return
+    snap = catalog.snapshot
+    source = f"снимка {snap['path']} ({snap['data_version']})" if snap else "БД"
+    logging.info(f"Загружено вузов из {source}: {len(catalog)} (версия данных {catalog.version})")
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT * FROM universities")
-        rows = cur.fetchall()
-    except sqlite3.OperationalError:
-        logging.error("Таблица universities не найдена в БД. Убедитесь, что таблица существует.")
-        rows = []
-    finally:
-        conn.close()
-
-    universities.clear()
-    UNIS_BY_ID.clear()
-    city_set = set()
-    spec_set = set()
-
-    for row in rows:
-        uni = {
-            "ID": str(row["id"]),
-            "Name": row["name"] or "",
-            "City": row["city"] or "",
-            "Specialties": row["specialties"] or "",
-            "MinScore": row["min_score"],
-            "About": row["about"] or "",
-            "Programs": row["programs"] or "",
-            "Admission": row["admission"] or "",
-            "Tour_3d": row["tour_3d"] or "",
-            "International": row["international"] or "",
-            "Website": row["website"] or "",
-        }
-        universities.append(uni)
-
-        uid = uni["ID"].strip()
-        if uid:
-            UNIS_BY_ID[uid] = uni
-
-        c = (uni["City"] or "").strip()
-        if c:
-            city_set.add(c)
-
-        specs_raw = uni["Specialties"] or ""
-        for part in specs_raw.split(","):
-            part = part.strip()
-            if part:
-                spec_set.add(part)
-
-    cities[:] = sorted(list(city_set))
-    specialties[:] = sorted(list(spec_set))
-
-    logging.info(f"Загружено вузов из БД: {len(universities)}")
+
+def load_from_sqlite():
+    """Загружаем все вузы из SQLite в память (или открываем снимок CATALOG_SNAPSHOT)."""
+    if CATALOG_SNAPSHOT:
+        new_catalog = load_snapshot(CATALOG_SNAPSHOT)
+    else:
+        new_catalog = load_catalog(DB_PATH)
+    if new_catalog is not None:
+        install_catalog(new_catalog)
 
 
 load_from_sqlite()
+if CATALOG_SNAPSHOT:
+    catalog_watcher = CatalogWatcher(CATALOG_SNAPSHOT, install_catalog, RELOAD_INTERVAL or 5.0, loader=load_snapshot)
+else:
+    catalog_watcher = CatalogWatcher(DB_PATH, install_catalog, RELOAD_INTERVAL or 5.0, current=lambda: catalog)
 
 # ================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==================
 
 def get_state(user_id: int):
-    st = user_state.get(user_id)
-    if not st:
-        st = {
-            "filters": {
-                "city": None,
-                "spec": None,
-                "score": None,
-            },
-            "page": 0,
-            "await_score": False,
-        }
-        user_state[user_id] = st
-    return st
+    """Сессия пользователя: {"filters": {...}, "start": int, "await_score": bool, "await_rec": bool, "compare": [ID, ...]}."""
+    return session_store.get(user_id)
+
+
+def save_state(user_id: int):
+    """Вызывается после изменения сессии: в SQLite записываются только изменённые."""
+    session_store.save(user_id)
+
+
+# Ответ одним сообщением; старая Reply-клавиатура снимается один раз за сессию
+responder = Responder(bot, get_state, save_state)
 
 
 def main_inline_menu() -> InlineKeyboardMarkup:
+    """Главное инлайн-меню (строится один раз и переиспользуется)."""
+    return render_cache.static_markup("main_menu", build_main_inline_menu)
+
+
+def build_main_inline_menu() -> InlineKeyboardMarkup:
     """Генерирует главное инлайн-меню с добавленной кнопкой полного списка."""
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="📍 Города", callback_data="filter_cities")],
             [InlineKeyboardButton(text="📚 Специальности", callback_data="filter_specs")],
             [InlineKeyboardButton(text="🔎 Показать ВУЗы", callback_data="show_all")],
+            [InlineKeyboardButton(text="🎯 Куда я прохожу по баллу", callback_data="recommend")],
             [InlineKeyboardButton(text="🧹 Сбросить фильтры", callback_data="reset_filters")],
-            # Кнопка внешней ссылки на полный список
-            [InlineKeyboardButton(text="📄 Полный список ВУЗов", url=FULL_UNIS_URL)],
+            # Выгрузка ВУЗов по текущим фильтрам файлом
+            [InlineKeyboardButton(text="📥 Скачать список (Excel)", callback_data=EXPORT_XLSX)],
         ]
     )
 
 
-def apply_filters(filters: dict):
-    """Применяем фильтры к списку университетов."""
-    res = universities
-
-    city = filters.get("city")
-    if city:
-        city_l = city.strip().lower()
-        res = [
-            u for u in res
-            if (u.get("City") or "").strip().lower() == city_l
-        ]
+def filtered_rows(filters: dict) -> tuple:
+    """Row id университетов под фильтры (через индекс и кэш результатов)."""
+    key = filter_key(filters)
+    return filter_cache.get(key, lambda: catalog.index.query(*key))
 
-    spec = filters.get("spec")
-    if spec:
-        spec_l = spec.lower()
-        res = [
-            u for u in res
-            if spec_l in (u.get("Specialties") or "").lower()
-        ]
-
-    score = filters.get("score")
-    if score is not None:
-        filtered = []
-        for u in res:
-            ms_val = u.get("MinScore")
-            try:
-                ms = int(ms_val) if ms_val is not None else 0
-            except (ValueError, TypeError):
-                continue
-            if ms >= score:
-                filtered.append(u)
-        filtered.sort(key=lambda x: int(x.get("MinScore") or 0), reverse=True)
-        res = filtered
 
-    return res
+def apply_filters(filters: dict):
+    """Применяем фильтры к списку университетов."""
+    unis = catalog.universities
+    return [unis[r] for r in filtered_rows(filters)]
 
 
 def describe_filters(filters: dict, total: int) -> str:
@@ -212,41 +302,19 @@ def describe_filters(filters: dict, total: int) -> str:
 
 
 def format_uni_card_full(uni: dict) -> str:
-    """Полное форматирование карточки ВУЗа (HTML-экранирование содержимого)."""
-    name = html.escape(uni.get("Name", "Без названия"))
-    city = html.escape(uni.get("City", "Не указан"))
-    specs = html.escape(uni.get("Specialties", ""))
-    min_score = uni.get("MinScore", "")
-    about = html.escape(uni.get("About", ""))
-    programs = html.escape(uni.get("Programs", ""))
-    admission = html.escape(uni.get("Admission", ""))
-    international = html.escape(uni.get("International", ""))
-    website = html.escape(uni.get("Website", ""))
-
-    lines = [
-        f"🎓 <b>{name}</b>",
-        "",
-        f"🏙 Город: <b>{city}</b>",
-        f"📊 Минимальный балл: {html.escape(str(min_score))}" if str(min_score) != "" else "",
-        f"📚 Направления: {specs}" if specs else "",
-        "━━━━━━━━━━━━━━━━━━",
-        "ℹ️ <b>Об университете</b>",
-        about or "Нет данных.",
-        "━━━━━━━━━━━━━━━━━━",
-        "🎓 <b>Программы</b>",
-        programs or "Нет данных.",
-        "━━━━━━━━━━━━━━━━━━",
-        "🎖 <b>Приём и стипендии</b>",
-        admission or "Нет данных.",
-        "━━━━━━━━━━━━━━━━━━",
-        "🌍 <b>Международное сотрудничество</b>",
-        international or "Нет данных.",
-        "━━━━━━━━━━━━━━━━━━",
-        f"🔗 <b>Сайт:</b>\n{website}" if website else "🔗 Сайт не указан",
-    ]
-
-    res = [l for l in lines if l]
-    return "\n".join(res)
+    """Карточка ВУЗа из кэша (HTML строится один раз на ВУЗ до перезагрузки данных)."""
+    return render_cache.card(uni["ID"], lambda: build_uni_card(uni))
+
+
+async def get_uni_card(uid: str):
+    """HTML полной карточки ВУЗа; тексты читаются из БД только при промахе кэша."""
+    text = catalog.card(uid) or render_cache.cached_card(uid)   # снимок хранит готовый HTML
+    if text is None:
+        uni = await uni_details.get(uid)
+        if uni is None:
+            return None
+        text = format_uni_card_full(uni)
+    return text
 
 
 # --- ФУНКЦИИ ОТОБРАЖЕНИЯ СПИСКА ---
@@ -262,35 +330,35 @@ def make_unis_list_text(filters: dict, page: int, total_pages: int, total_count:
     return text
 
 
-def make_unis_keyboard(unis_page, page: int, total_pages: int) -> InlineKeyboardMarkup:
+def make_unis_keyboard(unis_page, prev_data: str = None, next_data: str = None) -> InlineKeyboardMarkup:
     """Генерация клавиатуры со списком ВУЗов в формате: каждая строка — 2 кнопки (Открыть / В сравнение).
        Навигация и сервисные кнопки — отдельные широкие строки (как на скриншоте)."""
     rows = []
 
     # 1. Для каждого ВУЗа: две кнопки в одной строке
-    for u in unis_page:
+    for i, u in enumerate(unis_page):
         uid = (u.get("ID") or "").strip()
         if not uid:
             continue
 
-        # Кнопка открыть (отправляет uni_open:<uid>:<page>)
+        # Кнопка открыть (код строки ВУЗа и место на странице)
         btn_open = InlineKeyboardButton(
             text="🔍 Открыть",
-            callback_data=f"uni_open:{uid}:{page}"
+            callback_data=callback_codes.uni_open(uid, i)
         )
         # Кнопка добавить в сравнение
         btn_cmp = InlineKeyboardButton(
             text="➕ В сравнение",
-            callback_data=f"cmp_add:{uid}"
+            callback_data=callback_codes.compare_add(uid)
         )
         rows.append([btn_open, btn_cmp])
 
-    # 2. Навигация: назад / далее по одной строке (широкие)
+    # 2. Навигация: назад / далее по одной строке (широкие), с курсорами крайних строк
     nav_row = []
-    if page > 0:
-        nav_row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data="unis_prev"))
-    if page < total_pages - 1:
-        nav_row.append(InlineKeyboardButton(text="➡️ Далее", callback_data="unis_next"))
+    if prev_data:
+        nav_row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=prev_data))
+    if next_data:
+        nav_row.append(InlineKeyboardButton(text="➡️ Далее", callback_data=next_data))
     if nav_row:
         rows.append(nav_row)
 
@@ -298,8 +366,11 @@ def make_unis_keyboard(unis_page, page: int, total_pages: int) -> InlineKeyboard
     rows.append([InlineKeyboardButton(text="⚖ Сравнить выбр", callback_data="cmp_show")])
     rows.append([InlineKeyboardButton(text="🧹 Сбросить фильт", callback_data="reset_filters")])
 
-    # 4. Ссылка на полный список ВУЗов (широкая кнопка)
-    rows.append([InlineKeyboardButton(text="📄 Полный список ВУЗов", url=FULL_UNIS_URL)])
+    # 4. Выгрузка всего отфильтрованного списка файлом
+    rows.append([
+        InlineKeyboardButton(text="📥 CSV", callback_data=EXPORT_CSV),
+        InlineKeyboardButton(text="📥 Excel", callback_data=EXPORT_XLSX),
+    ])
 
     # 5. Главное меню
     rows.append([InlineKeyboardButton(text="🏠 Меню", callback_data="menu")])
@@ -307,73 +378,165 @@ def make_unis_keyboard(unis_page, page: int, total_pages: int) -> InlineKeyboard
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+def build_empty_results_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="🧹 Сбросить фильтры", callback_data="reset_filters")],
+            [InlineKeyboardButton(text="🏠 Меню", callback_data="menu")],
+        ]
+    )
+
+
+def render_unis_page(filters: dict, start: int):
+    """Текст и клавиатура страницы списка, начиная со строки start; кэшируются по (фильтр, start).
+
+    Возвращает (text, kb, start) с приведённым к допустимому диапазону start
+    или None, если по фильтрам ничего не найдено.
+    """
+    unis = catalog.universities
+    rows = filtered_rows(filters)
+    if not rows:
+        return None
+
+    start = max(0, min(start, len(rows) - 1))
+    by_score = filters.get("score") is not None
+
+    def build():
+        end = min(start + UNIS_PER_PAGE, len(rows))
+        unis_page = [unis[r] for r in rows[start:end]]
+        # После перезагрузки каталога страница может начинаться не с кратной позиции
+        before, after = ceil(start / UNIS_PER_PAGE), ceil((len(rows) - start) / UNIS_PER_PAGE)
+        text = make_unis_list_text(filters, before, before + after, len(rows))
+        prev_data = make_cursor(catalog, rows, start, by_score, PAGE_PREV + ":") if start > 0 else None
+        next_data = make_cursor(catalog, rows, end - 1, by_score, PAGE_NEXT + ":") if end < len(rows) else None
+        kb = make_unis_keyboard(unis_page, prev_data, next_data)
+        return text, kb
+
+    text, kb = render_cache.keyboard(("unis", filter_key(filters), start), build)
+    return text, kb, start
+
+
 # ================== ОТПРАВКА СПИСКА (УНИВЕРСАЛЬНАЯ ФУНКЦИЯ) ==================
 
-async def send_unis_list(message_or_call, user_id: int, page: int = None):
-    """Отправляет/обновляет список вузов."""
+async def send_unis_list(message_or_call, user_id: int, start: int = None):
+    """Отправляет/обновляет список вузов со строки start (по умолчанию — с последней показанной)."""
     st = get_state(user_id)
     filters = st["filters"]
     
-    if page is None:
-        page = st.get("page", 0)
-    else:
-        st["page"] = page
+    if start is None:
+        start = st.get("start", 0)
 
-    all_unis = apply_filters(filters)
+    rendered = render_unis_page(filters, start)
     
-    if not all_unis:
+    if rendered is None:
         text = describe_filters(filters, 0) + "\n\nНичего не найдено по таким условиям."
-        kb = InlineKeyboardMarkup(
-            inline_keyboard=[
-                [InlineKeyboardButton(text="🧹 Сбросить фильтры", callback_data="reset_filters")],
-                [InlineKeyboardButton(text="📄 Полный список ВУЗов", url=FULL_UNIS_URL)],
-                [InlineKeyboardButton(text="🏠 Меню", callback_data="menu")],
-            ]
-        )
+        kb = render_cache.static_markup("empty_results", build_empty_results_keyboard)
         
         if isinstance(message_or_call, CallbackQuery):
-            try:
-                await message_or_call.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-            except TelegramBadRequest as e:
-                logger.exception("Не удалось edit_text (empty results). Отправляю новое сообщение.")
-                await bot.send_message(message_or_call.message.chat.id, text, parse_mode="HTML", reply_markup=kb)
+            await responder.edit(message_or_call.message, text, parse_mode="HTML", reply_markup=kb)
         else:
-            await message_or_call.answer(text, parse_mode="HTML", reply_markup=ReplyKeyboardRemove())
+            await responder.answer(message_or_call, text, parse_mode="HTML")
         return
 
-    total_pages = max(1, ceil(len(all_unis) / UNIS_PER_PAGE))
-    page = max(0, min(page, total_pages - 1))
-    st["page"] = page
-
-    start = page * UNIS_PER_PAGE
-    end = start + UNIS_PER_PAGE
-    unis_page = all_unis[start:end]
-
-    text = make_unis_list_text(filters, page, total_pages, len(all_unis))
-    kb = make_unis_keyboard(unis_page, page, total_pages)
+    text, kb, start = rendered
+    if st.get("start") != start:
+        st["start"] = start
+        save_state(user_id)
 
     if isinstance(message_or_call, CallbackQuery):
         # При листании/возврате назад редактируем сообщение
-        try:
-            await message_or_call.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-        except TelegramBadRequest:
-            # fallback: отправить новое сообщение
-            logger.exception("edit_text failed in send_unis_list; sending new message.")
-            await bot.send_message(message_or_call.message.chat.id, text, parse_mode="HTML", reply_markup=kb)
+        await responder.edit(message_or_call.message, text, parse_mode="HTML", reply_markup=kb)
     else:
-        # При поиске отправляем новое сообщение и удаляем Reply-клавиатуру в одном сообщении
-        await message_or_call.answer(text, parse_mode="HTML", reply_markup=ReplyKeyboardRemove())
-        await message_or_call.answer(text, parse_mode="HTML", reply_markup=kb)
+        # При поиске отправляем одно новое сообщение
+        await responder.answer(message_or_call, text, parse_mode="HTML", reply_markup=kb)
+
+
+async def send_export(chat_id: int, user_id: int, fmt: str):
+    """Отправляет документом ВУЗы по текущим фильтрам пользователя (файл и file_id кэшируются)."""
+    filters = get_state(user_id)["filters"]
+    cat = catalog
+    rows = filtered_rows(filters)
+    if not rows:
+        await responder.send(chat_id, user_id, describe_filters(filters, 0) + "\n\nВыгружать нечего.", parse_mode="HTML")
+        return
+
+    caption = describe_filters(filters, len(rows))
+    if len(rows) > EXPORT_MAX_ROWS:
+        caption += f"\nВ файле первые {EXPORT_MAX_ROWS}."
+        rows = rows[:EXPORT_MAX_ROWS]
+    key = (cat.version, filter_key(filters), fmt)
+    file_id = export_cache.file_id(key)
+    if file_id is not None:
+        await bot.send_document(chat_id, file_id, caption=caption, parse_mode="HTML")
+        return
+
+    try:
+        data = await export_cache.get(key, lambda: write_export(cat.columns, rows, fmt))
+    except ImportError:
+        logger.warning("Для выгрузки в XLSX установите openpyxl; отправляю CSV.")
+        fmt = "csv"
+        key = (cat.version, filter_key(filters), fmt)
+        data = await export_cache.get(key, lambda: write_export(cat.columns, rows, fmt))
+    msg = await bot.send_document(
+        chat_id,
+        BufferedInputFile(data, filename=f"universities_{len(rows)}.{fmt}"),
+        caption=caption,
+        parse_mode="HTML",
+    )
+    if msg.document is not None:
+        export_cache.remember(key, msg.document.file_id)
+
+
+def render_recommendations(filters: dict, score: int):
+    """Текст и клавиатура подбора по баллу (город и направление из фильтров); кэшируются до перезагрузки."""
+    city, spec = filters.get("city"), filters.get("spec")
+
+    def build():
+        unis = catalog.universities
+        matches = recommender.recommend(score, [city] if city else (), [spec] if spec else (), k=RECOMMEND_TOP)
+        parts = [f"🎯 <b>Куда проходит балл {score}</b>"]
+        if city:
+            parts.append(f"🏙 Город: <b>{html.escape(city)}</b>")
+        if spec:
+            parts.append(f"📚 Направление: <b>{html.escape(spec)}</b>")
+        if not matches:
+            parts.append("\nПроходных ВУЗов не найдено. Попробуй сбросить фильтры.")
+            return "\n".join(parts), render_cache.static_markup("empty_results", build_empty_results_keyboard)
+
+        parts.append("\nСначала — совпадение направления, затем самые сильные ВУЗы, куда хватает балла:")
+        rows = []
+        for i, m in enumerate(matches, 1):
+            u = unis[m.row]
+            mark = " ✅" if m.overlap else ""
+            parts.append(
+                f"{i}. <b>{html.escape(u['Name'] or 'Без названия')}</b> — {html.escape(u['City'] or '')}\n"
+                f"    📊 от {score - m.margin} (запас +{m.margin}){mark}"
+            )
+            rows.append([InlineKeyboardButton(text=f"🎓 {i}. {u['Name'] or 'Без названия'}", callback_data=callback_codes.uni_open(u['ID']))])
+        rows.append([InlineKeyboardButton(text="🏠 Меню", callback_data="menu")])
+        return "\n".join(parts), InlineKeyboardMarkup(inline_keyboard=rows)
+
+    return render_cache.keyboard(("recommend", norm(city) or None, norm(spec) or None, score), build)
 
 
 # ================== ХЕНДЛЕРЫ ==================
 
 @dp.message(CommandStart())
-async def cmd_start(message: Message):
-    get_state(message.from_user.id)
-    # Удаляем Reply-клавиатуру и показываем инлайн-меню
-    await message.answer("👋 Привет! Это DataHub ВУЗов Казахстана.", reply_markup=ReplyKeyboardRemove())
-    await message.answer(
+async def cmd_start(message: Message, command: CommandObject):
+    # Диплинк из инлайн-результата: /start uni_<ID> — сразу полная карточка
+    args = command.args or ""
+    if args.startswith("uni_"):
+        uid = args[4:]
+        text = await get_uni_card(uid) if uid in catalog.by_id else None
+        if text is not None:
+            kb = render_cache.keyboard(("card", uid, 0), lambda: make_card_keyboard(uid, 0))
+            await responder.answer(message, text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
+            return
+
+    # Приветствие и инлайн-меню одним сообщением (Reply-клавиатуру снимет responder)
+    await responder.answer(
+        message,
+        "👋 Привет! Это DataHub ВУЗов Казахстана.\n\n"
         "Найди ВУЗ по городу, направлению, баллу или сравни несколько между собой.\n\nВыберите фильтр:",
         reply_markup=main_inline_menu(),
         parse_mode="HTML",
@@ -382,46 +545,77 @@ async def cmd_start(message: Message):
 
 @dp.message(F.text == "Фильтры")
 async def show_filters(message: Message):
-    await message.answer("Выберите фильтр:", reply_markup=main_inline_menu())
+    await responder.answer(message, "Выберите фильтр:", reply_markup=main_inline_menu())
 
 
 @dp.message(F.text == "Помощь")
 async def help_message(message: Message):
-    await message.answer(
+    await responder.answer(
+        message,
         "ℹ <b>Как пользоваться ботом:</b>\n\n"
         "• Фильтры — выбираешь город, специальность.\n"
         "• Сравнение — сравни до 3-х ВУЗов.\n"
         "• Случайный ВУЗ — рекомендация наугад.\n"
-        "• Поиск по баллу — фильтр по ЕНТ.\n\n"
+        "• Поиск по баллу — фильтр по ЕНТ.\n"
+        "• Куда я прохожу — подбор ВУЗов под твой балл ЕНТ.\n\n"
         "Можно также писать название города или ВУЗа в чат. Для навигации используйте 🏠 Меню.",
         parse_mode="HTML",
     )
 
 
+def build_stats_report(cat) -> str:
+    """Сводка analytics.py по снимку каталога (NumPy/pandas грузятся только при первом /stats)."""
+    from analytics import compute_stats, format_report
+    return format_report(compute_stats(cat.columns, cat.deleted))
+
+
+@dp.message(Command("stats"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_stats(message: Message):
+    global stats_report
+    cat = catalog
+    if stats_report is None or stats_report[0] != cat.version:
+        try:
+            text = await asyncio.to_thread(build_stats_report, cat)
+        except ImportError as e:
+            await responder.answer(message, f"Для /stats установите numpy и pandas: {e}")
+            return
+        if cat is catalog:   # за время расчёта каталог могли перезагрузить
+            stats_report = (cat.version, text)
+    else:
+        text = stats_report[1]
+    await responder.answer(message, f"📈 <b>Аналитика каталога</b>\n<pre>{html.escape(text)}</pre>", parse_mode="HTML")
+
+
 @dp.message(F.text == "Таблица ВУЗов Excel")
 async def excel_link(message: Message):
-    await message.answer(
-        "📊 Полная таблица ВУЗов Казахстана в Excel:\n" + FULL_UNIS_URL,
-        parse_mode="HTML",
-    )
+    await send_export(message.chat.id, message.from_user.id, "xlsx")
 
 
 @dp.message(F.text == "🎲 Случайный ВУЗ")
 async def random_uni(message: Message):
-    if not universities:
-        await message.answer("База ВУЗов пустая.")
+    cat = catalog
+    if not len(cat):
+        await responder.answer(message, "База ВУЗов пустая.")
+        return
+    # Удалённые строки остаются в нумерации до полной перезагрузки, их доля мала —
+    # просто выбираем заново
+    row = randrange(len(cat.universities))
+    while row in cat.deleted:
+        row = randrange(len(cat.universities))
+    uid = cat.universities[row]["ID"]
+    card = await get_uni_card(uid)
+    if card is None:
+        await responder.answer(message, "Университет не найден")
         return
-    uni = choice(universities)
-    text = "🎲 <b>Случайный ВУЗ:</b>\n\n" + format_uni_card_full(uni)
+    text = "🎲 <b>Случайный ВУЗ:</b>\n\n" + card
     
-    uid = uni["ID"]
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="➕ В сравнение", callback_data=f"cmp_add:{uid}")],
-        [InlineKeyboardButton(text="📄 Полный список ВУЗов", url=FULL_UNIS_URL)],
+    kb = render_cache.keyboard(("random", uid), lambda: InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="➕ В сравнение", callback_data=callback_codes.compare_add(uid))],
+        [InlineKeyboardButton(text="📥 Скачать список (Excel)", callback_data=EXPORT_XLSX)],
         [InlineKeyboardButton(text="🏠 Меню", callback_data="menu")]
-    ])
+    ]))
     
-    await message.answer(text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
+    await responder.answer(message, text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
 
 
 @dp.message(F.text == "⚖ Сравнение")
@@ -433,7 +627,10 @@ async def compare_button(message: Message):
 async def ask_score(message: Message):
     st = get_state(message.from_user.id)
     st["await_score"] = True
-    await message.answer(
+    st["await_rec"] = False
+    save_state(message.from_user.id)
+    await responder.answer(
+        message,
         "Введи минимальный балл ЕНТ (например, <code>90</code>):",
         parse_mode="HTML",
     )
@@ -441,45 +638,44 @@ async def ask_score(message: Message):
 
 # --- CALLBACKS ГЛАВНОГО МЕНЮ ---
 
-@dp.callback_query(F.data == "menu")
+@callback_router.route("menu")
 async def cb_menu(callback: CallbackQuery):
     await callback.answer()
-    try:
-        await callback.message.edit_text(
-            "🏠 <b>Главное меню</b>\nВыберите действие:",
-            reply_markup=main_inline_menu(),
-            parse_mode="HTML"
-        )
-    except TelegramBadRequest:
-        await callback.message.reply("🏠 <b>Главное меню</b>\nВыберите действие:", reply_markup=main_inline_menu(), parse_mode="HTML")
+    await responder.edit(
+        callback.message,
+        "🏠 <b>Главное меню</b>\nВыберите действие:",
+        reply_markup=main_inline_menu(),
+        parse_mode="HTML",
+    )
 
 
-@dp.callback_query(F.data == "reset_filters")
+@callback_router.route("reset_filters")
 async def cb_reset_filters(callback: CallbackQuery):
     st = get_state(callback.from_user.id)
     st["filters"] = {"city": None, "spec": None, "score": None}
-    st["page"] = 0
+    st["start"] = 0
+    save_state(callback.from_user.id)
     await callback.answer("Фильтры сброшены")
-    try:
-        await callback.message.edit_text(
-            "✅ Фильтры сброшены. Выберите действие:",
-            reply_markup=main_inline_menu(),
-        )
-    except TelegramBadRequest:
-        await callback.message.reply("✅ Фильтры сброшены. Выберите действие:", reply_markup=main_inline_menu())
+    await responder.edit(callback.message, "✅ Фильтры сброшены. Выберите действие:", reply_markup=main_inline_menu())
 
 
-@dp.callback_query(F.data == "show_all")
+@callback_router.route("show_all")
 async def cb_show_all(callback: CallbackQuery):
     await callback.answer()
     st = get_state(callback.from_user.id)
-    st["page"] = 0
-    await send_unis_list(callback, callback.from_user.id, page=0)
+    st["start"] = 0
+    save_state(callback.from_user.id)
+    await send_unis_list(callback, callback.from_user.id, start=0)
 
 
 # --- CALLBACKS ГОРОДОВ ---
 
 def make_cities_keyboard(page: int) -> InlineKeyboardMarkup:
+    return render_cache.keyboard(("cities", page), lambda: build_cities_keyboard(page))
+
+
+def build_cities_keyboard(page: int) -> InlineKeyboardMarkup:
+    cities = catalog.cities
     total_pages = max(1, ceil(len(cities) / CITIES_PER_PAGE))
     page = max(0, min(page, total_pages - 1))
     start = page * CITIES_PER_PAGE
@@ -487,15 +683,15 @@ def make_cities_keyboard(page: int) -> InlineKeyboardMarkup:
     items = cities[start:end]
 
     rows = [
-        [InlineKeyboardButton(text=c, callback_data=f"citysel:{c}")]
+        [InlineKeyboardButton(text=c, callback_data=callback_codes.city_pick(c))]
         for c in items
     ]
 
     nav_row = []
     if page > 0:
-        nav_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"cities:{page - 1}"))
+        nav_row.append(InlineKeyboardButton(text="⬅️", callback_data=CityPage(page=page - 1).pack()))
     if page < total_pages - 1:
-        nav_row.append(InlineKeyboardButton(text="➡️", callback_data=f"cities:{page + 1}"))
+        nav_row.append(InlineKeyboardButton(text="➡️", callback_data=CityPage(page=page + 1).pack()))
     if nav_row:
         rows.append(nav_row)
 
@@ -503,53 +699,45 @@ def make_cities_keyboard(page: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
-@dp.callback_query(F.data == "filter_cities")
+@callback_router.route("filter_cities")
 async def cb_filter_cities(callback: CallbackQuery):
     await callback.answer()
     kb = make_cities_keyboard(page=0)
-    try:
-        await callback.message.edit_text("📍 Выберите город:", reply_markup=kb)
-    except TelegramBadRequest:
-        await callback.message.reply("📍 Выберите город:", reply_markup=kb)
+    await responder.edit(callback.message, "📍 Выберите город:", reply_markup=kb)
 
 
-@dp.callback_query(F.data.startswith("cities:"))
-async def cb_cities_page(callback: CallbackQuery):
-    data = callback.data or ""
-    try:
-        page = int(data.split(":")[1])
-    except (IndexError, ValueError):
-        page = 0
+@callback_router.route(CityPage, "cities")
+async def cb_cities_page(callback: CallbackQuery, page: int):
     await callback.answer()
     kb = make_cities_keyboard(page)
-    try:
-        await callback.message.edit_text("📍 Выберите город:", reply_markup=kb)
-    except TelegramBadRequest:
-        await callback.message.reply("📍 Выберите город:", reply_markup=kb)
+    await responder.edit(callback.message, "📍 Выберите город:", reply_markup=kb)
 
 
-@dp.callback_query(F.data.startswith("citysel:"))
-async def cb_city_select(callback: CallbackQuery):
-    data = callback.data or ""
-    try:
-        city = data.split(":", 1)[1]
-        if not city:
-            raise ValueError("Empty city")
-    except Exception:
-        await callback.answer("Ошибка выбора", show_alert=True)
+@callback_router.route(CityPick, "citysel")
+async def cb_city_select(callback: CallbackQuery, city):
+    if city is None:
+        # Кнопка из сообщения до полной перезагрузки каталога: коды городов уже другие
+        await callback.answer("🔄 Список городов обновился")
+        await responder.edit(callback.message, "📍 Выберите город:", reply_markup=make_cities_keyboard(0))
         return
 
     st = get_state(callback.from_user.id)
     st["filters"]["city"] = city
-    st["page"] = 0
+    st["start"] = 0
+    save_state(callback.from_user.id)
 
     await callback.answer(f"Выбран город: {city}")
-    await send_unis_list(callback, callback.from_user.id, page=0)
+    await send_unis_list(callback, callback.from_user.id, start=0)
 
 
 # --- CALLBACKS СПЕЦИАЛЬНОСТЕЙ ---
 
 def make_specs_keyboard(page: int) -> InlineKeyboardMarkup:
+    return render_cache.keyboard(("specs", page), lambda: build_specs_keyboard(page))
+
+
+def build_specs_keyboard(page: int) -> InlineKeyboardMarkup:
+    specialties = catalog.specialties
     total_pages = max(1, ceil(len(specialties) / SPECS_PER_PAGE))
     page = max(0, min(page, total_pages - 1))
     start = page * SPECS_PER_PAGE
@@ -557,15 +745,15 @@ def make_specs_keyboard(page: int) -> InlineKeyboardMarkup:
     items = specialties[start:end]
 
     rows = [
-        [InlineKeyboardButton(text=s, callback_data=f"specsel:{s}")]
+        [InlineKeyboardButton(text=s, callback_data=callback_codes.spec_pick(s))]
         for s in items
     ]
 
     nav_row = []
     if page > 0:
-        nav_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"specs:{page - 1}"))
+        nav_row.append(InlineKeyboardButton(text="⬅️", callback_data=SpecPage(page=page - 1).pack()))
     if page < total_pages - 1:
-        nav_row.append(InlineKeyboardButton(text="➡️", callback_data=f"specs:{page + 1}"))
+        nav_row.append(InlineKeyboardButton(text="➡️", callback_data=SpecPage(page=page + 1).pack()))
     if nav_row:
         rows.append(nav_row)
 
@@ -573,153 +761,170 @@ def make_specs_keyboard(page: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
-@dp.callback_query(F.data == "filter_specs")
+@callback_router.route("filter_specs")
 async def cb_filter_specs(callback: CallbackQuery):
     await callback.answer()
     kb = make_specs_keyboard(page=0)
-    try:
-        await callback.message.edit_text("📚 Выберите специальность:", reply_markup=kb)
-    except TelegramBadRequest:
-        await callback.message.reply("📚 Выберите специальность:", reply_markup=kb)
+    await responder.edit(callback.message, "📚 Выберите специальность:", reply_markup=kb)
 
 
-@dp.callback_query(F.data.startswith("specs:"))
-async def cb_specs_page(callback: CallbackQuery):
-    data = callback.data or ""
-    try:
-        page = int(data.split(":")[1])
-    except (IndexError, ValueError):
-        page = 0
+@callback_router.route(SpecPage, "specs")
+async def cb_specs_page(callback: CallbackQuery, page: int):
     await callback.answer()
     kb = make_specs_keyboard(page)
-    try:
-        await callback.message.edit_text("📚 Выберите специальность:", reply_markup=kb)
-    except TelegramBadRequest:
-        await callback.message.reply("📚 Выберите специальность:", reply_markup=kb)
+    await responder.edit(callback.message, "📚 Выберите специальность:", reply_markup=kb)
 
 
-@dp.callback_query(F.data.startswith("specsel:"))
-async def cb_spec_select(callback: CallbackQuery):
-    data = callback.data or ""
-    try:
-        spec = data.split(":", 1)[1]
-        if not spec:
-            raise ValueError("Empty spec")
-    except Exception:
-        await callback.answer("Ошибка выбора", show_alert=True)
+@callback_router.route(SpecPick, "specsel")
+async def cb_spec_select(callback: CallbackQuery, spec):
+    if spec is None:
+        await callback.answer("🔄 Список специальностей обновился")
+        await responder.edit(callback.message, "📚 Выберите специальность:", reply_markup=make_specs_keyboard(0))
         return
 
     st = get_state(callback.from_user.id)
     st["filters"]["spec"] = spec
-    st["page"] = 0
+    st["start"] = 0
+    save_state(callback.from_user.id)
 
     await callback.answer(f"Выбрана специальность: {spec}")
-    await send_unis_list(callback, callback.from_user.id, page=0)
+    await send_unis_list(callback, callback.from_user.id, start=0)
 
 
 # --- НАВИГАЦИЯ ПО СПИСКУ ВУЗОВ ---
 
-@dp.callback_query(F.data == "unis_prev")
-async def cb_unis_prev(callback: CallbackQuery):
+async def flip_unis_page(callback: CallbackQuery, cursor: str, forward: bool):
+    """Листание по курсору из кнопки: n:<курсор последней строки> / p:<курсор первой>."""
     st = get_state(callback.from_user.id)
-    new_page = max(0, st.get("page", 0) - 1)
-    await callback.answer()
-    await send_unis_list(callback, callback.from_user.id, page=new_page)
-
+    filters = st["filters"]
+    rows = filtered_rows(filters)
+    found = seek(catalog, rows, cursor, filters.get("score") is not None, after=forward) if cursor else None
+    if found is None:
+        # Кнопка из старого сообщения (без курсора) или строки курсора уже нет: от последней показанной страницы
+        stale = False
+        start = st.get("start", 0) + (UNIS_PER_PAGE if forward else -UNIS_PER_PAGE)
+    else:
+        pos, stale = found
+        start = pos if forward else pos - UNIS_PER_PAGE
+    await callback.answer("🔄 Список обновился" if stale else None)
+    await send_unis_list(callback, callback.from_user.id, start=max(0, start))
 
-@dp.callback_query(F.data == "unis_next")
-async def cb_unis_next(callback: CallbackQuery):
-    st = get_state(callback.from_user.id)
-    new_page = st.get("page", 0) + 1
-    await callback.answer()
-    await send_unis_list(callback, callback.from_user.id, page=new_page)
 
+@callback_router.route(PAGE_PREV, "unis_prev")
+async def cb_unis_prev(callback: CallbackQuery, cursor: str):
+    await flip_unis_page(callback, cursor, forward=False)
 
-# --- ОТКРЫТИЕ КАРТОЧКИ ВУЗА ---
 
-@dp.callback_query(F.data.startswith("uni_open:"))
-async def cb_uni_open(callback: CallbackQuery):
-    # Формат: uni_open:<uid>:<page>
-    data = callback.data or ""
-    parts = data.split(":")
-    if len(parts) < 3:
-        await callback.answer("Ошибка данных", show_alert=True)
-        return
-    uid = parts[1]
-    try:
-        page = int(parts[2])
-    except ValueError:
-        page = 0
+@callback_router.route(PAGE_NEXT, "unis_next")
+async def cb_unis_next(callback: CallbackQuery, cursor: str):
+    await flip_unis_page(callback, cursor, forward=True)
 
-    uni = UNIS_BY_ID.get(uid)
-    if not uni:
-        await callback.answer("Университет не найден", show_alert=True)
-        return
 
-    text = format_uni_card_full(uni)
+# --- ОТКРЫТИЕ КАРТОЧКИ ВУЗА ---
 
-    kb = InlineKeyboardMarkup(
+def make_card_keyboard(uid: str, place: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="➕ В сравнение", callback_data=f"cmp_add:{uid}"),
-                InlineKeyboardButton(text="⬅️ Назад к списку", callback_data=f"unis_goto:{page}"),
+                InlineKeyboardButton(text="➕ В сравнение", callback_data=callback_codes.compare_add(uid)),
+                InlineKeyboardButton(text="⬅️ Назад к списку", callback_data=callback_codes.unis_back(uid, place)),
             ],
-            [InlineKeyboardButton(text="📄 Полный список ВУЗов", url=FULL_UNIS_URL)],
+            [InlineKeyboardButton(text="📥 Скачать список (Excel)", callback_data=EXPORT_XLSX)],
             [InlineKeyboardButton(text="🏠 Меню", callback_data="menu")],
         ]
     )
+
+
+@callback_router.route(UniOpen, "uni_open")
+async def cb_uni_open(callback: CallbackQuery, uid, place: int):
+    # uid — None, если строки уже нет или кнопка из сообщения до полной перезагрузки каталога
+    place = max(0, min(place, UNIS_PER_PAGE - 1))
+    text = await get_uni_card(uid) if uid is not None and uid in catalog.by_id else None
+    if text is None:
+        await callback.answer("Университет не найден", show_alert=True)
+        return
+
+    kb = render_cache.keyboard(("card", uid, place), lambda: make_card_keyboard(uid, place))
     
     await callback.answer()
-    try:
-        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
-    except TelegramBadRequest:
-        logger.exception("edit_text failed for uni card; sending message")
-        await bot.send_message(callback.message.chat.id, text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
+    await responder.edit(callback.message, text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
 
 
-@dp.callback_query(F.data.startswith("unis_goto:"))
-async def cb_unis_goto(callback: CallbackQuery):
-    """Обработчик кнопки 'Назад к списку' из карточки."""
-    data = callback.data or ""
-    try:
-        page = int(data.split(":")[1])
-    except Exception:
-        page = 0
+@callback_router.route(UnisBack, "unis_goto")
+async def cb_unis_goto(callback: CallbackQuery, uid, place: int, page: int = None):
+    """Обработчик кнопки 'Назад к списку' из карточки: страница, на которой был открытый ВУЗ."""
     st = get_state(callback.from_user.id)
-    st["page"] = page
+    start = st.get("start", 0)
+    if uid is not None:
+        filters = st["filters"]
+        pos = row_position(catalog, filtered_rows(filters), uid, filters.get("score") is not None)
+        if pos is not None:
+            start = pos - place
+    elif page is not None:
+        start = page * UNIS_PER_PAGE   # старый формат unis_goto:<страница>
     
     await callback.answer()
-    await send_unis_list(callback, callback.from_user.id, page=page)
+    await send_unis_list(callback, callback.from_user.id, start=max(0, start))
+
+
+# --- ВЫГРУЗКА СПИСКА ---
+
+@callback_router.route(Export, "export")
+async def cb_export(callback: CallbackQuery, fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        await callback.answer("Ошибка данных", show_alert=True)
+        return
+    await callback.answer("📥 Готовлю файл…")
+    await send_export(callback.message.chat.id, callback.from_user.id, fmt)
+
+
+# --- ПОДБОР ПО БАЛЛУ ---
+
+@callback_router.route("recommend")
+async def cb_recommend(callback: CallbackQuery):
+    st = get_state(callback.from_user.id)
+    st["await_rec"] = True
+    st["await_score"] = False
+    save_state(callback.from_user.id)
+    await callback.answer()
+    await responder.edit(
+        callback.message,
+        "🎯 Введи свой балл ЕНТ (например, <code>95</code>) — покажу ВУЗы, куда он проходит.\n"
+        "Выбранные город и направление тоже учтутся.",
+        parse_mode="HTML",
+    )
 
 
 # --- СРАВНЕНИЕ ---
 
 def add_to_compare(user_id: int, uni_id: str):
-    ids = compare_list.get(user_id, [])
+    st = get_state(user_id)
+    ids = st.get("compare", [])
     if uni_id in ids:
         return ids, False
     if len(ids) >= 3:
         return ids, False
     new_ids = ids + [uni_id]
-    compare_list[user_id] = new_ids
+    st["compare"] = new_ids
+    save_state(user_id)
     return new_ids, True
 
 
 async def send_compare_view(chat_id: int, user_id: int):
-    ids = compare_list.get(user_id, [])
-    
-    await bot.send_message(chat_id, " ", reply_markup=ReplyKeyboardRemove())
+    ids = get_state(user_id).get("compare", [])
 
     if not ids:
         text = "Список сравнения пуст.\nДобавь ВУЗы через кнопку «➕ В сравнение»."
-        kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🏠 Меню", callback_data="menu"),
-                                                    InlineKeyboardButton(text="📄 Полный список ВУЗов", url=FULL_UNIS_URL)]])
-        await bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=kb)
+        kb = render_cache.static_markup("compare_empty", lambda: InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🏠 Меню", callback_data="menu"),
+             InlineKeyboardButton(text="📥 Скачать список", callback_data=EXPORT_XLSX)]]))
+        await responder.send(chat_id, user_id, text, parse_mode="HTML", reply_markup=kb)
         return
 
+    details = await uni_details.get_many(ids[:3])
     items = []
     for uid in ids[:3]:
-        u = UNIS_BY_ID.get(uid)
+        u = details.get(uid)
         if not u:
             continue
         name = html.escape(u.get("Name", "Без названия"))
@@ -743,24 +948,21 @@ async def send_compare_view(chat_id: int, user_id: int):
 
     text = "⚖ <b>Сравнение ВУЗов</b>\n\n" + "\n\n━━━━━━━━━━━━\n\n".join(items)
 
-    kb = InlineKeyboardMarkup(
+    kb = render_cache.static_markup("compare", lambda: InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="🧹 Очистить сравнение", callback_data="cmp_clear")],
-            [InlineKeyboardButton(text="📄 Полный список ВУЗов", url=FULL_UNIS_URL)],
+            [InlineKeyboardButton(text="📥 Скачать список (Excel)", callback_data=EXPORT_XLSX)],
             [InlineKeyboardButton(text="🏠 Меню", callback_data="menu")],
         ]
-    )
+    ))
     
-    await bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
+    await responder.send(chat_id, user_id, text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
 
 
-@dp.callback_query(F.data.startswith("cmp_add:"))
-async def cb_cmp_add(callback: CallbackQuery):
+@callback_router.route(CompareAdd, "cmp_add")
+async def cb_cmp_add(callback: CallbackQuery, uid):
     user_id = callback.from_user.id
-    data = callback.data or ""
-    uid = data.split(":", 1)[1] if ":" in data else ""
-    
-    if uid not in UNIS_BY_ID:
+    if uid is None or uid not in catalog.by_id:
         await callback.answer("Ошибка добавления", show_alert=True)
         return
 
@@ -775,21 +977,19 @@ async def cb_cmp_add(callback: CallbackQuery):
             await callback.answer("Уже в списке!")
 
 
-@dp.callback_query(F.data == "cmp_show")
+@callback_router.route("cmp_show")
 async def cb_cmp_show(callback: CallbackQuery):
     await callback.answer()
     await send_compare_view(callback.message.chat.id, callback.from_user.id)
 
 
-@dp.callback_query(F.data == "cmp_clear")
+@callback_router.route("cmp_clear")
 async def cb_cmp_clear(callback: CallbackQuery):
     user_id = callback.from_user.id
-    compare_list[user_id] = []
+    get_state(user_id)["compare"] = []
+    save_state(user_id)
     await callback.answer("Список сравнения очищен")
-    try:
-        await callback.message.edit_text("⚖ Список сравнения пуст.", reply_markup=main_inline_menu())
-    except TelegramBadRequest:
-        await callback.message.reply("⚖ Список сравнения пуст.", reply_markup=main_inline_menu())
+    await responder.edit(callback.message, "⚖ Список сравнения пуст.", reply_markup=main_inline_menu())
 
 
 # --- ОБРАБОТКА ТЕКСТА (ПОИСК) ---
@@ -800,41 +1000,50 @@ async def text_handler(message: Message):
     st = get_state(user_id)
     txt = (message.text or "").strip()
 
+    # Балл для подбора «куда я прохожу»
+    if st.get("await_rec"):
+        try:
+            score = int(txt)
+        except ValueError:
+            await responder.answer(message, "Нужно ввести целое число, например: 95")
+            return
+        st["await_rec"] = False
+        save_state(user_id)
+        text, kb = render_recommendations(st["filters"], score)
+        await responder.answer(message, text, parse_mode="HTML", reply_markup=kb)
+        return
+
     # Ввод балла
     if st.get("await_score"):
         try:
             score = int(txt)
         except ValueError:
-            await message.answer("Нужно ввести целое число, например: 95")
+            await responder.answer(message, "Нужно ввести целое число, например: 95")
             return
 
         st["filters"]["score"] = score
-        st["page"] = 0
+        st["start"] = 0
         st["await_score"] = False
+        save_state(user_id)
 
         # После ввода балла показываем список с фильтром
-        await send_unis_list(message, user_id, page=0)
+        await send_unis_list(message, user_id, start=0)
         return
 
-    # Поиск по тексту (название/город)
-    q = txt.lower()
-    results = []
-    for u in universities:
-        name = (u.get("Name") or "").lower()
-        city = (u.get("City") or "").lower()
-        specs = (u.get("Specialties") or "").lower()
-        if q in name or q == city or q in specs:
-            results.append(u)
+    # Поиск по тексту (название/город/направление), лучшие 5 по релевантности
+    cat = catalog
+    results = [cat.universities[r] for r in cat.search.search(txt, k=5)]
 
     if not results:
-        await message.answer(
+        await responder.answer(
+            message,
             f"Ничего не найдено по запросу: <b>{html.escape(txt)}</b>",
             parse_mode="HTML",
             reply_markup=main_inline_menu() # Предлагаем вернуться в меню
         )
         return
 
-    limit_res = results[:5]
+    limit_res = results
     text_msg = f"🔎 Результаты по запросу: <b>{html.escape(txt)}</b>"
     
     rows = []
@@ -842,19 +1051,135 @@ async def text_handler(message: Message):
     for u in limit_res:
         uid = u["ID"]
         name = html.escape(u["Name"] or "Без названия")
-        btn = InlineKeyboardButton(text=f"🎓 {name}", callback_data=f"uni_open:{uid}:0")
+        btn = InlineKeyboardButton(text=f"🎓 {name}", callback_data=callback_codes.uni_open(uid))
         rows.append([btn])
     
     rows.append([InlineKeyboardButton(text="🏠 Меню", callback_data="menu")])
     kb = InlineKeyboardMarkup(inline_keyboard=rows)
     
-    await message.answer(text_msg, parse_mode="HTML", reply_markup=ReplyKeyboardRemove())
-    await message.answer(text_msg, parse_mode="HTML", reply_markup=kb)
+    await responder.answer(message, text_msg, parse_mode="HTML", reply_markup=kb)
+
+
+# --- ИНЛАЙН-РЕЖИМ ---
+
+@dp.inline_query()
+async def inline_handler(query: InlineQuery):
+    # Готовые статьи и страницы из кэша inline_search; Telegram кэширует ответ ещё на INLINE_CACHE_TIME
+    results, next_offset = inline_search.page(catalog, query.query, query.offset)
+    await query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=False,
+        next_offset=next_offset,
+    )
+
+
+# ================== МЕТРИКИ ==================
+
+def collect_app_stats():
+    """Статистика кэшей, индексов, сессий и лимитера для /metrics."""
+    cat = catalog
+    caches = {
+        "filter": filter_cache.stats(),
+        "render_cards": render_cache.cards.stats(),
+        "render_keyboards": render_cache.keyboards.stats(),
+        "search_expansions": cat.search.stats()["expansions"],
+        "export_files": export_cache.files.stats(),
+        "export_file_ids": export_cache.file_ids.stats(),
+        "inline_results": inline_search.results.stats(),
+        "inline_articles": inline_search.articles.stats(),
+    }
+    if not CATALOG_SNAPSHOT:
+        caches["details"] = uni_details.cache.stats()
+    for name, st in caches.items():
+        labels = {"cache": name}
+        yield "bot_cache_hits_total", "counter", "Попадания в кэш", labels, st["hits"]
+        yield "bot_cache_misses_total", "counter", "Промахи кэша", labels, st["misses"]
+        yield "bot_cache_entries", "gauge", "Записей в кэше", labels, st["size"]
+
+    search = cat.search.stats()
+    yield "bot_catalog_rows", "gauge", "ВУЗов в каталоге", {}, len(cat)
+    yield "bot_catalog_version", "gauge", "Версия снимка каталога", {}, cat.version
+    yield "bot_catalog_cities", "gauge", "Городов в каталоге", {}, len(cat.cities)
+    yield "bot_catalog_specialties", "gauge", "Направлений в каталоге", {}, len(cat.specialties)
+    yield "bot_catalog_bytes", "gauge", "Память колонок каталога", {}, cat.columns.nbytes()
+    if cat.snapshot is not None:
+        yield "bot_catalog_snapshot_bytes", "gauge", "Размер снимка каталога (mmap)", {}, cat.snapshot["bytes"]
+    yield "bot_search_words", "gauge", "Слов в поисковом словаре", {}, search["words"]
+    yield "bot_search_trigrams", "gauge", "Триграмм в поисковом индексе", {}, search["trigrams"]
+    yield "bot_sessions", "gauge", "Сессий в памяти", {}, len(session_store)
+
+    if update_scheduler is not None:
+        sch = update_scheduler.stats()
+        yield "bot_scheduler_running", "gauge", "Выполняющиеся обработчики", {}, sch["running"]
+        yield "bot_scheduler_waiting", "gauge", "Апдейты в очередях пользователей", {}, sch["waiting"]
+        yield "bot_scheduler_users_queued", "gauge", "Пользователи с непустой очередью", {}, sch["users_queued"]
+
+    if OUTBOUND_LIMITS:
+        lim = outbound_limiter.stats()
+        yield "bot_outbound_sent_total", "counter", "Отправлено через лимитер", {}, lim["sent"]
+        yield "bot_outbound_coalesced_total", "counter", "Схлопнутые правки", {}, lim["coalesced"]
+        yield "bot_outbound_retried_total", "counter", "Повторы запросов", {}, lim["retried"]
+        yield "bot_outbound_throttled_seconds_total", "counter", "Время ожидания лимитов", {}, lim["throttled_seconds"]
+
+    resp = responder.stats()
+    yield "bot_edits_skipped_total", "counter", "Правки без изменений, не отправленные", {}, resp["edits_skipped"]
+    yield "bot_edits_not_modified_total", "counter", "Ответы «message is not modified»", {}, resp["not_modified"]
+    yield "bot_edit_fallbacks_total", "counter", "Неудачные правки, замененные новым сообщением", {}, resp["edit_fallbacks"]
+
+
+if bot_metrics is not None:
+    bot_metrics.registry.collector(collect_app_stats)
+
+
+@dp.startup()
+async def on_startup():
+    await session_store.start()
+    try:
+        # Имя бота нужно для кнопки-диплинка в инлайн-результатах
+        inline_search.bot_username = (await bot.me()).username
+    except Exception as e:
+        logger.warning(f"Не удалось получить имя бота для инлайн-режима: {e}")
+    if RELOAD_INTERVAL > 0:
+        catalog_watcher.start()
+    if bot_metrics is not None:
+        try:
+            await bot_metrics.start_server(METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.warning(f"Не удалось запустить сервер метрик: {e}")
+
+
+@dp.shutdown()
+async def on_shutdown():
+    if bot_metrics is not None:
+        await bot_metrics.stop_server()
+    await catalog_watcher.stop()
+    await session_store.close()
+    uni_details.close()
+    export_cache.close()
 
 
 async def main():
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_SECRET:
+            logger.error("Для режима webhook задайте WEBHOOK_SECRET.")
+            return
+        from webhook import run_webhook
+
+        logger.info(f"Бот запущен (webhook). Вузов в базе: {len(catalog)}")
+        await run_webhook(
+            dp,
+            bot,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            path=WEBHOOK_PATH,
+            secret=WEBHOOK_SECRET,
+            base_url=WEBHOOK_BASE_URL,
+        )
+        return
+
     await bot.delete_webhook(drop_pending_updates=True)
-    logger.info(f"Бот запущен. Вузов в базе: {len(universities)}")
+    logger.info(f"Бот запущен. Вузов в базе: {len(catalog)}")
     await dp.start_polling(bot)
 
 
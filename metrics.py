@@ -0,0 +1,257 @@
+"""Метрики бота в текстовом формате Prometheus и локальный эндпоинт /metrics.
+
+Без внешних зависимостей: счётчики, gauge и гистограммы реализованы здесь же,
+HTTP-сервер — aiohttp (идёт вместе с aiogram).
+
+``BotMetrics`` подключает (``setup_dispatcher`` и ``request_middleware``):
+
+* outer-middleware на апдейты — пропускная способность, число обработчиков
+  в работе, полная длительность обработки и её «вычислительная» часть (без
+  времени ожидания Bot API) по каждому обработчику;
+* inner-middleware на message/callback_query — только записывает имя
+  сработавшего обработчика;
+* request-middleware сессии — длительность и ошибки запросов к Bot API по
+  методам. Подключается первым, поэтому в длительность входит и ожидание
+  очереди лимитера (ratelimit.py) — это время не считается «вычислительным».
+
+Статистику кэшей и индексов отдают коллекторы — функции, которые вызываются
+при каждом запросе /metrics. Если метрики выключены, ничего не подключается
+и бот работает без единой лишней операции.
+"""
+
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Данные текущего апдейта: [имя обработчика, секунд в запросах к Bot API]
+_update_slot = ContextVar("update_slot", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.values = {}   # значения меток (кортеж) -> число
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name + _labels(self.label_names, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, labels: tuple, value: float):
+        self.values[labels] = value
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        self.series = {}   # значения меток -> [счётчики корзин..., сумма, количество]
+
+    def observe(self, labels: tuple, value: float):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        i = bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            s[i] += 1
+        s[-2] += value
+        s[-1] += 1
+
+    def samples(self):
+        n = len(self.buckets)
+        for labels, s in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, s[:n]):
+                cumulative += count
+                le = 'le="' + _number(float(bound)) + '"'
+                yield self.name + "_bucket" + _labels(self.label_names, labels, le), cumulative
+            yield self.name + "_bucket" + _labels(self.label_names, labels, 'le="+Inf"'), s[-1]
+            yield self.name + "_sum" + _labels(self.label_names, labels), s[-2]
+            yield self.name + "_count" + _labels(self.label_names, labels), s[-1]
+
+
+class Registry:
+    """Набор метрик и коллекторов; ``render()`` — текст для /metrics."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """fn() -> итерируемое из (имя, тип, описание, {метка: значение}, число)."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for m in self.metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(f"{name} {_number(value)}" for name, value in m.samples())
+
+        grouped = {}
+        for fn in self.collectors:
+            try:
+                for name, kind, help, labels, value in fn():
+                    entry = grouped.setdefault(name, (kind, help, []))
+                    entry[2].append((labels, value))
+            except Exception:
+                logger.exception("Ошибка коллектора метрик")
+        for name, (kind, help, samples) in grouped.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(name + _labels(labels.keys(), labels.values()) + " " + _number(value))
+        return "\n".join(lines) + "\n"
+
+
+class BotMetrics:
+    """Метрики обработки апдейтов и запросов к Bot API."""
+
+    def __init__(self, registry: Registry = None):
+        self.registry = registry or Registry()
+        r = self.registry
+        self.updates = r.add(Counter(
+            "bot_updates_total", "Обработанные апдейты", ("handler", "status")))
+        self.in_flight = r.add(Gauge(
+            "bot_handlers_in_flight", "Апдейты, обрабатываемые прямо сейчас"))
+        self.duration = r.add(Histogram(
+            "bot_handler_duration_seconds", "Полное время обработки апдейта", ("handler",)))
+        self.compute = r.add(Histogram(
+            "bot_handler_compute_seconds", "Время обработки без ожидания Bot API", ("handler",)))
+        self.api_duration = r.add(Histogram(
+            "bot_api_request_duration_seconds", "Длительность запросов к Bot API (с ожиданием лимитов)", ("method",)))
+        self.api_errors = r.add(Counter(
+            "bot_api_errors_total", "Ошибки запросов к Bot API", ("method", "error")))
+        self._runner = None
+
+    def setup_dispatcher(self, dp):
+        dp.update.outer_middleware(_UpdateMiddleware(self))
+        dp.message.middleware(_HandlerNameMiddleware())
+        dp.callback_query.middleware(_HandlerNameMiddleware())
+        dp.inline_query.middleware(_HandlerNameMiddleware())
+
+    def request_middleware(self) -> BaseRequestMiddleware:
+        return _ApiMiddleware(self)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    async def start_server(self, host: str, port: int):
+        async def handle(request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Метрики: http://{host}:{port}/metrics")
+
+    async def stop_server(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class _UpdateMiddleware(BaseMiddleware):
+    def __init__(self, metrics: BotMetrics):
+        self.m = metrics
+
+    async def __call__(self, handler, event, data):
+        slot = [None, 0.0]
+        token = _update_slot.set(slot)
+        self.m.in_flight.inc()
+        status = "ok"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _update_slot.reset(token)
+            self.m.in_flight.dec()
+            name = (slot[0] or "unhandled",)
+            self.m.updates.inc((name[0], status))
+            self.m.duration.observe(name, elapsed)
+            self.m.compute.observe(name, max(elapsed - slot[1], 0.0))
+
+
+class _HandlerNameMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        slot = _update_slot.get()
+        if slot is not None:
+            handler_obj = data.get("handler")
+            slot[0] = data.get("handler_name") or getattr(getattr(handler_obj, "callback", None), "__name__", None)
+        return await handler(event, data)
+
+
+class _ApiMiddleware(BaseRequestMiddleware):
+    def __init__(self, metrics: BotMetrics):
+        self.m = metrics
+
+    async def __call__(self, make_request, bot, method):
+        name = (type(method).__name__,)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.m.api_errors.inc((name[0], type(e).__name__))
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.m.api_duration.observe(name, elapsed)
+            slot = _update_slot.get()
+            if slot is not None:
+                slot[1] += elapsed
@@ -0,0 +1,92 @@
+"""Курсорная (keyset) навигация по списку ВУЗов.
+
+Кнопки «Назад»/«Далее» несут не номер страницы, а курсор крайней строки
+текущей страницы: версию каталога, её балл и ID (``3:120:ID042``). Результат
+фильтра (``CatalogIndex.query``, кэш filter_cache) уже отсортирован — по
+убыванию балла при фильтре по баллу, иначе в порядке строк, — поэтому
+позиция курсора находится бинарным поиском, и перелистывание стоит
+O(log n + размер страницы) без пересчёта и копирования всего списка.
+
+Если каталог перезагрузили между нажатиями, позиция восстанавливается по ID
+строки (row id в новом каталоге), а если строку удалили — по баллу (или от
+последней показанной позиции из сессии): список не «перескакивает» на чужую
+страницу, а продолжается с того же места.
+
+Курсор вместе с префиксом укладывается в 64 байта callback_data; для слишком
+длинных ID вместо него пишется позиция в списке (``3:#45``).
+"""
+
+from bisect import bisect_left, bisect_right
+
+CALLBACK_LIMIT = 64        # байт callback_data в Telegram
+VERSION_MOD = 4096         # версия каталога в курсоре — 3 шестнадцатеричные цифры
+
+
+def sort_key(index, by_score: bool):
+    """Ключ, по которому отсортирован результат index.query (None — сами row id)."""
+    if not by_score:
+        return None
+    scores = index.scores
+    return lambda row: (-scores[row], row)
+
+
+def catalog_tag(catalog) -> str:
+    return format(catalog.version % VERSION_MOD, "x")
+
+
+def make_cursor(catalog, rows, pos: int, by_score: bool, prefix: str) -> str:
+    """callback_data «prefix + курсор строки rows[pos]»."""
+    row = rows[pos]
+    uid = catalog.universities[row]["ID"]
+    score = catalog.index.scores[row] if by_score else ""
+    data = f"{prefix}{catalog_tag(catalog)}:{score}:{uid}"
+    if len(data.encode("utf-8")) > CALLBACK_LIMIT:
+        data = f"{prefix}{catalog_tag(catalog)}:#{pos}"
+    return data
+
+
+def seek(catalog, rows, cursor: str, by_score: bool, after: bool):
+    """Позиция курсора в отсортированном результате rows.
+
+    after=True — индекс первой строки после курсора (начало следующей
+    страницы), иначе — индекс самой строки курсора (конец предыдущей).
+    Возвращает (позиция, устарел ли курсор) или None, если курсор не разобрать
+    или его строки нет, а балла для поиска в курсоре нет.
+    """
+    tag, sep, rest = cursor.partition(":")
+    if not sep:
+        return None
+    stale = tag != catalog_tag(catalog)
+    if rest.startswith("#"):
+        try:
+            pos = int(rest[1:])
+        except ValueError:
+            return None
+        return min(len(rows), max(0, pos + after)), stale
+
+    score, sep, uid = rest.partition(":")
+    if not sep or not uid:
+        return None
+    row = catalog.by_id.row_of(uid)
+    search = bisect_right if after else bisect_left
+    if by_score:
+        try:
+            score = int(score)
+        except ValueError:
+            return None
+        # Удалённая строка: встаём перед всеми строками с тем же баллом
+        target = (-score, -1 if row is None else row)
+        return search(rows, target, key=sort_key(catalog.index, True)), stale
+    if row is None:
+        return None
+    return search(rows, row), stale
+
+
+def row_position(catalog, rows, uid: str, by_score: bool):
+    """Позиция строки uid в результате rows (или место, где она была бы); None — ID нет в каталоге."""
+    row = catalog.by_id.row_of(uid)
+    if row is None:
+        return None
+    if by_score:
+        return bisect_left(rows, (-catalog.index.scores[row], row), key=sort_key(catalog.index, True))
+    return bisect_left(rows, row)
@@ -0,0 +1,158 @@
+"""Планировщик исходящих запросов к Telegram Bot API.
+
+Подключается как request-middleware сессии бота, поэтому через него проходят
+все вызовы — ``message.answer``, ``edit_text``, ``bot.send_message`` — без
+изменений в обработчиках.
+
+* Общий token bucket (по умолчанию 30 сообщений/с) и отдельный bucket на чат
+  (1 сообщение/с). Bucket с ёмкостью b и скоростью r пропускает до b + r
+  запросов за любую секунду, поэтому по умолчанию ёмкость 1 — запросы идут
+  равномерно и не превышают лимит Telegram в скользящем окне. Ограничиваются
+  только методы с ``chat_id``; ``answerCallbackQuery``, ``getUpdates`` и т.п.
+  идут без очереди.
+* 429 (TelegramRetryAfter): чат блокируется на ``retry_after`` секунд, запрос
+  повторяется; ошибки 5xx/сети повторяются с экспоненциальной задержкой.
+* Если пока ``editMessageText`` ждёт своей очереди, для того же сообщения
+  пришла более новая правка, старая не отправляется вовсе.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import EditMessageText
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до появления токена (0 — можно отправлять сейчас)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+    def idle(self, now: float) -> bool:
+        """Bucket полон и не заблокирован — его можно выбросить без потери состояния."""
+        return self.delay(now) == 0 and self.tokens >= self.capacity
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Request-middleware: глобальный и по-чатовые лимиты, повторы и схлопывание правок."""
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 1.0,
+        global_burst: float = 1.0,
+        max_retries: int = 3,
+        max_chats: int = 10_000,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chats = OrderedDict()      # chat_id -> TokenBucket
+        self._edit_seq = {}              # (chat_id, message_id) -> номер последней правки
+        self._seq = 0
+
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.throttled_seconds = 0.0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            # Держим ограниченное число bucket'ов: полные можно удалить без последствий
+            if len(self._chats) > self.max_chats:
+                now = time.monotonic()
+                for cid in list(self._chats)[: len(self._chats) - self.max_chats]:
+                    if self._chats[cid].idle(now):
+                        del self._chats[cid]
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        edit_key = None
+        if isinstance(method, EditMessageText) and method.message_id is not None:
+            self._seq += 1
+            edit_key = (chat_id, method.message_id)
+            self._edit_seq[edit_key] = seq = self._seq
+
+        try:
+            attempt = 0
+            while True:
+                bucket = self._chat_bucket(chat_id)
+                started = time.monotonic()
+                while True:
+                    if edit_key is not None and self._edit_seq.get(edit_key) != seq:
+                        # Пришла более новая правка того же сообщения — эта уже не нужна
+                        self.coalesced += 1
+                        return True
+                    now = time.monotonic()
+                    wait = max(bucket.delay(now), self.global_bucket.delay(now))
+                    if wait <= 0:
+                        bucket.take()
+                        self.global_bucket.take()
+                        break
+                    await asyncio.sleep(wait)
+                self.throttled_seconds += time.monotonic() - started
+
+                try:
+                    result = await make_request(bot, method)
+                except TelegramRetryAfter as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    logger.warning(f"429 для чата {chat_id}: повтор через {e.retry_after} с")
+                    bucket.block(time.monotonic() + e.retry_after)
+                except (TelegramServerError, TelegramNetworkError):
+                    if attempt >= self.max_retries:
+                        raise
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                else:
+                    self.sent += 1
+                    return result
+                attempt += 1
+                self.retried += 1
+        finally:
+            if edit_key is not None and self._edit_seq.get(edit_key) == seq:
+                del self._edit_seq[edit_key]
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "chats_tracked": len(self._chats),
+        }
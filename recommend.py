@@ -0,0 +1,124 @@
+"""Подбор ВУЗов под балл ЕНТ абитуриента («куда я прохожу»).
+
+Фильтр по баллу в списке оставляет ВУЗы с MinScore >= балла, а абитуриенту
+нужны те, куда его балл проходит: MinScore <= балла. Подбор ранжирует такие
+ВУЗы по соответствию:
+
+    fit = SPEC_WEIGHT * доля совпавших направлений
+        + MARGIN_WEIGHT * (1 - min(запас, MARGIN_CAP) / MARGIN_CAP)
+
+где запас — балл минус MinScore. Из проходных выше те, что ближе к баллу
+(самый сильный ВУЗ, куда ещё проходишь); город — жёсткий фильтр.
+
+Список ВУЗов уже отсортирован по убыванию балла (``CatalogIndex.score_order``),
+поэтому проходные строки — его хвост, найденный бинарным поиском, и идут они
+по возрастанию запаса. Лучшие k держатся в куче; как только даже идеальное
+совпадение направлений с текущим запасом не обгонит худшего в куче, обход
+останавливается. Если ВУЗов с выбранными направлениями меньше, чем
+проходных, сначала считаются только они (``CatalogIndex.by_spec``), а
+остальные добираются тем же обходом. Стоимость зависит от числа просмотренных
+строк, а не от размера каталога; направления и города строки сравниваются по
+кодам колонок (``UniColumns``), без разбора строк.
+"""
+
+from bisect import bisect_left
+from heapq import heappush, heapreplace
+from typing import NamedTuple
+
+from catalog import NO_SCORE, norm, split_specs
+
+SPEC_WEIGHT = 1.0
+MARGIN_WEIGHT = 0.5     # меньше SPEC_WEIGHT: совпадение направлений важнее запаса
+MARGIN_CAP = 40         # запас, после которого «близость» к баллу уже не учитывается
+
+
+class Match(NamedTuple):
+    row: int
+    fit: float
+    margin: int     # балл минус MinScore (>= 0)
+    overlap: int    # сколько выбранных направлений есть в ВУЗе
+
+
+class Recommender:
+    """Подбор по снимку каталога; строится один раз на снимок (см. install_catalog)."""
+
+    def __init__(self, catalog):
+        cols = catalog.columns
+        self.index = catalog.index
+        self.city_codes = cols.city_codes
+        self.spec_codes = cols.spec_codes
+        self.city_norms = [norm(c) for c in cols.city_table]
+        self.spec_sets = [frozenset(s.lower() for s in split_specs(combo)) for combo in cols.spec_table]
+
+    def recommend(self, score: int, cities=(), specs=(), k: int = 10) -> list:
+        """До k лучших проходных ВУЗов (Match) по убыванию fit."""
+        if k <= 0:
+            return []
+        index = self.index
+        first = bisect_left(index.neg_scores, -score)   # первая строка с MinScore <= score
+
+        allowed = None
+        if cities:
+            wanted = {norm(c) for c in cities}
+            allowed = {code for code, city in enumerate(self.city_norms) if city in wanted}
+            if not allowed:
+                return []
+        prefs = frozenset(s for s in (norm(s) for s in specs) if s)
+
+        # Куча лучших k: (fit, MinScore, -row); при равном fit выше ВУЗ с большим баллом
+        heap = []
+        if prefs:
+            sets = [index.by_spec.get(p) or () for p in prefs]
+            if sum(len(rows) for rows in sets) < len(index.score_order) - first:
+                # Редкие направления: считаем только ВУЗы с совпадениями, остальные
+                # (fit — лишь близость к баллу) добираем обходом по запасу
+                matched = set().union(*sets)
+                self._push_matched(heap, matched, score, allowed, prefs, k)
+                self._scan(heap, first, score, allowed, frozenset(), k, skip=matched)
+            else:
+                self._scan(heap, first, score, allowed, prefs, k)
+        else:
+            self._scan(heap, first, score, allowed, prefs, k)
+
+        matches = []
+        for fit, ms, neg_row in sorted(heap, reverse=True):
+            overlap = len(prefs & self.spec_sets[self.spec_codes[-neg_row]]) if prefs else 0
+            matches.append(Match(-neg_row, fit, score - ms, overlap))
+        return matches
+
+    def _fit(self, row: int, margin: int, prefs) -> float:
+        fit = MARGIN_WEIGHT * (1.0 - min(margin, MARGIN_CAP) / MARGIN_CAP)
+        if prefs:
+            fit += SPEC_WEIGHT / len(prefs) * len(prefs & self.spec_sets[self.spec_codes[row]])
+        return fit
+
+    def _scan(self, heap, first: int, score: int, allowed, prefs, k: int, skip=()):
+        """Обход проходных строк по возрастанию запаса с ранней остановкой."""
+        order, neg_scores, city_codes = self.index.score_order, self.index.neg_scores, self.city_codes
+        best_overlap = SPEC_WEIGHT if prefs else 0.0
+        for pos in range(first, len(order)):
+            ms, row = -neg_scores[pos], order[pos]
+            margin = score - ms
+            if len(heap) == k:
+                # Лучшее, на что может рассчитывать эта и любая следующая строка
+                bound = best_overlap + MARGIN_WEIGHT * (1.0 - min(margin, MARGIN_CAP) / MARGIN_CAP)
+                if (bound, ms, -row) < heap[0]:
+                    break
+            if (allowed is not None and city_codes[row] not in allowed) or row in skip:
+                continue
+            _push(heap, (self._fit(row, margin, prefs), ms, -row), k)
+
+    def _push_matched(self, heap, rows, score: int, allowed, prefs, k: int):
+        scores, city_codes = self.index.scores, self.city_codes
+        for row in rows:
+            ms = scores[row]
+            if ms == NO_SCORE or ms > score or (allowed is not None and city_codes[row] not in allowed):
+                continue
+            _push(heap, (self._fit(row, score - ms, prefs), ms, -row), k)
+
+
+def _push(heap, entry, k: int):
+    if len(heap) < k:
+        heappush(heap, entry)
+    elif entry > heap[0]:
+        heapreplace(heap, entry)
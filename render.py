@@ -0,0 +1,104 @@
+"""Кэш готовых представлений: HTML карточек ВУЗов и инлайн-клавиатур.
+
+Данные между перезагрузками каталога неизменны, а объекты aiogram
+(InlineKeyboardMarkup и др.) заморожены, поэтому их можно строить один раз
+и переиспользовать во всех ответах.
+
+``build_uni_card`` не зависит от бота: тем же кодом карточки заранее
+рендерятся в снимок каталога (snapshot.py).
+"""
+
+import html
+
+from catalog import LRUCache
+
+
+class RenderCache:
+    """Мемоизация карточек (по ID ВУЗа), клавиатур (по ключу) и статичной разметки."""
+
+    def __init__(self, keyboards_maxsize: int = 1024, cards_maxsize: int = 1024):
+        self.cards = LRUCache(cards_maxsize)          # ID ВУЗа -> HTML карточки
+        self.keyboards = LRUCache(keyboards_maxsize)  # ключ -> разметка / (текст, разметка)
+        self.static = {}                              # имя -> разметка, не зависящая от данных
+
+    def card(self, uid: str, build):
+        return self.cards.get(uid, build)
+
+    def cached_card(self, uid: str):
+        """HTML карточки, если он уже построен (иначе None)."""
+        return self.cards.lookup(uid)
+
+    def keyboard(self, key, build):
+        return self.keyboards.get(key, build)
+
+    def static_markup(self, name: str, build):
+        markup = self.static.get(name)
+        if markup is None:
+            markup = build()
+            self.static[name] = markup
+        return markup
+
+    def clear(self):
+        """Сбрасывает всё, что зависит от данных каталога (статичная разметка остаётся)."""
+        self.cards.clear()
+        self.keyboards.clear()
+
+    def invalidate(self, uids):
+        """Сбрасывает карточки этих ВУЗов и клавиатуры (в них названия) — точечная перезагрузка."""
+        for uid in uids:
+            self.cards.discard(uid)
+        self.keyboards.clear()
+
+    def stats(self) -> dict:
+        return {"cards": self.cards.stats(), "keyboards": self.keyboards.stats()}
+
+
+def build_uni_card(uni: dict) -> str:
+    """Полное форматирование карточки ВУЗа (HTML-экранирование содержимого)."""
+    name = html.escape(uni.get("Name", "Без названия"))
+    city = html.escape(uni.get("City", "Не указан"))
+    specs = html.escape(uni.get("Specialties", ""))
+    min_score = uni.get("MinScore", "")
+    about = html.escape(uni.get("About", ""))
+    programs = html.escape(uni.get("Programs", ""))
+    admission = html.escape(uni.get("Admission", ""))
+    international = html.escape(uni.get("International", ""))
+    website = html.escape(uni.get("Website", ""))
+
+    lines = [
+        f"🎓 <b>{name}</b>",
+        "",
+        f"🏙 Город: <b>{city}</b>",
+        f"📊 Минимальный балл: {html.escape(str(min_score))}" if str(min_score) != "" else "",
+        f"📚 Направления: {specs}" if specs else "",
+        "━━━━━━━━━━━━━━━━━━",
+        "ℹ️ <b>Об университете</b>",
+        about or "Нет данных.",
+        "━━━━━━━━━━━━━━━━━━",
+        "🎓 <b>Программы</b>",
+        programs or "Нет данных.",
+        "━━━━━━━━━━━━━━━━━━",
+        "🎖 <b>Приём и стипендии</b>",
+        admission or "Нет данных.",
+        "━━━━━━━━━━━━━━━━━━",
+        "🌍 <b>Международное сотрудничество</b>",
+        international or "Нет данных.",
+        "━━━━━━━━━━━━━━━━━━",
+        f"🔗 <b>Сайт:</b>\n{website}" if website else "🔗 Сайт не указан",
+    ]
+
+    res = [l for l in lines if l]
+    return "\n".join(res)
+
+
+def build_uni_summary(uni: dict) -> str:
+    """Короткая карточка ВУЗа (название, город, балл, направления) — для инлайн-режима."""
+    min_score = str(uni.get("MinScore", ""))
+    specs = html.escape(uni.get("Specialties", ""))
+    lines = [
+        f"🎓 <b>{html.escape(uni.get('Name') or 'Без названия')}</b>",
+        f"🏙 Город: <b>{html.escape(uni.get('City') or 'Не указан')}</b>",
+        f"📊 Минимальный балл: {html.escape(min_score)}" if min_score else "",
+        f"📚 Направления: {specs}" if specs else "",
+    ]
+    return "\n".join(l for l in lines if l)
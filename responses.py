@@ -0,0 +1,210 @@
+"""Составление ответов в чат и учёт API-вызовов на действие пользователя.
+
+``Responder`` отправляет ответ одним сообщением. Старая Reply-клавиатура (кнопки
+"Фильтры", "⚖ Сравнение" и т.п. из прошлых версий бота) снимается не чаще одного
+раза за сессию: флаг хранится в сессии пользователя. Если снять клавиатуру нужно
+в сообщении с инлайн-кнопками, текст отправляется один раз с ReplyKeyboardRemove,
+а кнопки добавляются правкой разметки — без дублирования текста в чате.
+
+``Responder.edit`` хранит отпечаток (хэш текста и разметки) последнего
+содержимого каждого сообщения бота по ключу (chat_id, message_id). Правка с тем
+же содержимым не отправляется вовсе, а ответ Telegram «message is not modified»
+считается успехом — без трейсбека и без нового сообщения в чате.
+
+``CallStats`` считает, сколько запросов к Bot API приходится на один вызов
+каждого обработчика: inner-middleware диспетчера запоминает текущий обработчик
+в contextvar, а request-middleware сессии относит к нему каждый запрос.
+"""
+
+import logging
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import ReplyKeyboardRemove
+
+from catalog import LRUCache
+
+logger = logging.getLogger(__name__)
+
+_current_action = ContextVar("current_action", default=None)
+
+REPLY_KB_REMOVED = "reply_kb_removed"   # ключ флага в сессии
+
+
+def is_not_modified(error: TelegramBadRequest) -> bool:
+    return "message is not modified" in (error.message or "").lower()
+
+
+class Responder:
+    """Отправка ответа одним сообщением с однократным снятием Reply-клавиатуры."""
+
+    def __init__(self, bot, get_state, save_state=None, max_messages: int = 10_000):
+        self.bot = bot
+        self.get_state = get_state
+        self.save_state = save_state or (lambda user_id: None)
+        self.max_messages = max_messages
+        self._fingerprints = OrderedDict()   # (chat_id, message_id) -> отпечаток содержимого
+        self._markup_json = LRUCache(1024)   # id(разметки) -> (разметка, JSON)
+
+        self.edits_sent = 0
+        self.edits_skipped = 0
+        self.not_modified = 0
+        self.edit_fallbacks = 0
+
+    # --- отпечатки содержимого ---
+
+    def _markup_key(self, markup) -> str:
+        if markup is None:
+            return ""
+        # Разметка обычно берётся из RenderCache, поэтому JSON считается один раз
+        # на объект; сам объект хранится в записи, так что id не переиспользуется.
+        entry = self._markup_json.lookup(id(markup))
+        if entry is None or entry[0] is not markup:
+            entry = (markup, markup.model_dump_json(exclude_none=True))
+            self._markup_json.put(id(markup), entry)
+        return entry[1]
+
+    def fingerprint(self, text: str, reply_markup=None, **kwargs) -> int:
+        return hash((
+            text,
+            self._markup_key(reply_markup),
+            kwargs.get("parse_mode"),
+            kwargs.get("disable_web_page_preview"),
+        ))
+
+    def _remember(self, chat_id: int, message_id: int, fp: int):
+        key = (chat_id, message_id)
+        self._fingerprints[key] = fp
+        self._fingerprints.move_to_end(key)
+        if len(self._fingerprints) > self.max_messages:
+            self._fingerprints.popitem(last=False)
+
+    # --- отправка и правка ---
+
+    async def send(self, chat_id: int, user_id: int, text: str, reply_markup=None, **kwargs):
+        st = self.get_state(user_id)
+        if st.get(REPLY_KB_REMOVED):
+            return await self._send(chat_id, text, reply_markup, **kwargs)
+
+        st[REPLY_KB_REMOVED] = True
+        self.save_state(user_id)
+        msg = await self.bot.send_message(chat_id, text, reply_markup=ReplyKeyboardRemove(), **kwargs)
+        if reply_markup is None:
+            self._remember(chat_id, msg.message_id, self.fingerprint(text, None, **kwargs))
+            return msg
+        try:
+            await self.bot.edit_message_reply_markup(
+                chat_id=chat_id, message_id=msg.message_id, reply_markup=reply_markup
+            )
+        except TelegramBadRequest:
+            return await self._send(chat_id, text, reply_markup, **kwargs)
+        self._remember(chat_id, msg.message_id, self.fingerprint(text, reply_markup, **kwargs))
+        return msg
+
+    async def _send(self, chat_id: int, text: str, reply_markup=None, **kwargs):
+        msg = await self.bot.send_message(chat_id, text, reply_markup=reply_markup, **kwargs)
+        self._remember(chat_id, msg.message_id, self.fingerprint(text, reply_markup, **kwargs))
+        return msg
+
+    async def edit(self, message, text: str, reply_markup=None, **kwargs):
+        """Правит сообщение бота; без сетевого вызова, если содержимое не изменилось.
+
+        Если сообщение нельзя отредактировать (удалено, слишком старое),
+        отправляет новое.
+        """
+        chat_id, message_id = message.chat.id, message.message_id
+        fp = self.fingerprint(text, reply_markup, **kwargs)
+        if self._fingerprints.get((chat_id, message_id)) == fp:
+            self.edits_skipped += 1
+            return
+        try:
+            await self.bot.edit_message_text(
+                text=text, chat_id=chat_id, message_id=message_id, reply_markup=reply_markup, **kwargs
+            )
+            self.edits_sent += 1
+        except TelegramBadRequest as e:
+            if not is_not_modified(e):
+                logger.warning(f"Не удалось отредактировать сообщение ({e.message}); отправляю новое.")
+                self.edit_fallbacks += 1
+                await self._send(chat_id, text, reply_markup, **kwargs)
+                return
+            self.not_modified += 1
+        self._remember(chat_id, message_id, fp)
+
+    async def answer(self, message, text: str, reply_markup=None, **kwargs):
+        """Ответ на входящее сообщение (аналог message.answer)."""
+        return await self.send(message.chat.id, message.from_user.id, text, reply_markup, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "edits_sent": self.edits_sent,
+            "edits_skipped": self.edits_skipped,
+            "not_modified": self.not_modified,
+            "edit_fallbacks": self.edit_fallbacks,
+            "messages_tracked": len(self._fingerprints),
+        }
+
+
+class CallStats:
+    """Счётчики: вызовы обработчиков и запросы к Bot API по каждому обработчику."""
+
+    def __init__(self):
+        self.actions = {}   # обработчик -> {"updates": n, "calls": {метод: n}}
+
+    def _entry(self, action):
+        entry = self.actions.get(action)
+        if entry is None:
+            entry = self.actions[action] = {"updates": 0, "calls": {}}
+        return entry
+
+    def action_middleware(self) -> BaseMiddleware:
+        return _ActionMiddleware(self)
+
+    def request_middleware(self) -> BaseRequestMiddleware:
+        return _CallCounterMiddleware(self)
+
+    def stats(self) -> dict:
+        """{обработчик: {"updates", "calls", "calls_per_update", "methods"}}."""
+        result = {}
+        for action, entry in self.actions.items():
+            calls = sum(entry["calls"].values())
+            updates = entry["updates"]
+            result[action or "(вне обработчика)"] = {
+                "updates": updates,
+                "calls": calls,
+                "calls_per_update": round(calls / updates, 2) if updates else None,
+                "methods": dict(entry["calls"]),
+            }
+        return result
+
+    def reset(self):
+        self.actions.clear()
+
+
+class _ActionMiddleware(BaseMiddleware):
+    def __init__(self, stats: CallStats):
+        self.stats = stats
+
+    async def __call__(self, handler, event, data):
+        # Кнопки разбирает один диспетчер (callbacks.py) — он кладёт имя выбранного обработчика
+        name = data.get("handler_name") or getattr(getattr(data.get("handler"), "callback", None), "__name__", None)
+        self.stats._entry(name)["updates"] += 1
+        token = _current_action.set(name)
+        try:
+            return await handler(event, data)
+        finally:
+            _current_action.reset(token)
+
+
+class _CallCounterMiddleware(BaseRequestMiddleware):
+    def __init__(self, stats: CallStats):
+        self.stats = stats
+
+    async def __call__(self, make_request, bot, method):
+        calls = self.stats._entry(_current_action.get())["calls"]
+        name = type(method).__name__
+        calls[name] = calls.get(name, 0) + 1
+        return await make_request(bot, method)
@@ -0,0 +1,85 @@
+"""Параллельная обработка апдейтов с сохранением порядка для каждого пользователя.
+
+aiogram в режиме polling (``handle_as_tasks=True``) и webhook запускает каждый
+апдейт отдельной задачей: медленный запрос к Telegram у одного пользователя не
+задерживает остальных, но число задач не ограничено, а два быстрых нажатия
+одного пользователя (например, ``unis_next`` дважды) выполняются одновременно
+и гонятся на ``st["start"]``.
+
+``UserScheduler`` — outer-middleware апдейтов:
+
+* у каждого пользователя своя очередь — апдейт ждёт, пока завершится
+  обработка предыдущего апдейта того же пользователя;
+* одновременно выполняется не больше ``concurrency`` обработчиков (семафор).
+
+Очередь — цепочка future: каждый апдейт ждёт future предшественника и
+завершает свою. Обработчик выполняется в задаче самого апдейта, поэтому
+contextvars (метрики, учёт вызовов API) и исключения работают как без
+планировщика. Пустые очереди удаляются сразу.
+"""
+
+import asyncio
+
+from aiogram import BaseMiddleware
+
+
+class UserScheduler(BaseMiddleware):
+    """Outer-middleware: очередь на пользователя и общий лимит параллельных обработчиков."""
+
+    def __init__(self, concurrency: int = 32):
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tails = {}   # user_id -> future последнего апдейта в очереди пользователя
+
+        self.running = 0
+        self.waiting = 0
+        self.processed = 0
+
+    @staticmethod
+    def _key(data: dict):
+        user = data.get("event_from_user")
+        if user is not None:
+            return user.id
+        chat = data.get("event_chat")
+        return chat.id if chat is not None else None
+
+    async def __call__(self, handler, event, data):
+        key = self._key(data)
+        if key is None:
+            # Апдейт без пользователя и чата — только общий лимит
+            async with self._semaphore:
+                return await handler(event, data)
+
+        prev = self._tails.get(key)
+        done = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        self.waiting += 1
+        started = False
+        try:
+            if prev is not None:
+                # shield: отмена этого апдейта не должна отменять future соседа
+                await asyncio.shield(prev)
+            async with self._semaphore:
+                self.waiting -= 1
+                self.running += 1
+                started = True
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                self.waiting -= 1
+            done.set_result(None)
+            if self._tails.get(key) is done:
+                del self._tails[key]
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+            "users_queued": len(self._tails),
+            "processed": self.processed,
+        }
@@ -0,0 +1,278 @@
+"""Полнотекстовый поиск ВУЗов по названию, городу и направлениям.
+
+Индекс строится один раз при загрузке данных. Текст приводится к общему виду:
+нижний регистр и транслитерация кириллицы (включая казахские буквы) в латиницу,
+так что "КазНУ", "казну" и "kaznu" дают одно и то же слово.
+
+Устроен в два уровня:
+
+* словарь — все различные слова каталога; слово запроса сопоставляется словам
+  словаря по префиксу (отсортированный список + bisect) и по триграммам
+  (опечатки: "казнуу" -> "kaznu"). Словарь на порядки меньше числа строк;
+* постинги — для каждого (поле, слово) отсортированный массив row id.
+
+Поиск идёт по парам (слово, поле) в порядке убывания веса и останавливается,
+как только набрано k строк, поэтому время не зависит от размера каталога
+для популярных слов. Для запросов из нескольких слов кандидаты берутся
+по самому редкому слову и доранжируются кучей.
+"""
+
+import heapq
+import re
+from array import array
+from bisect import bisect_left, insort
+
+from catalog import LRUCache, split_specs
+
+_TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "c",
+    "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya",
+    # казахский алфавит
+    "ә": "a", "ғ": "g", "қ": "k", "ң": "n", "ө": "o", "ұ": "u", "ү": "u", "һ": "h", "і": "i",
+}
+_TRANSLIT_TABLE = str.maketrans(_TRANSLIT)
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# Поля документа и их веса в рейтинге
+FIELD_NAME, FIELD_CITY, FIELD_SPEC = 0, 1, 2
+FIELD_WEIGHTS = (3.0, 2.0, 1.0)
+
+MIN_SIMILARITY = 0.5     # порог похожести слова запроса и слова словаря
+MAX_EXPANSIONS = 16      # сколько слов словаря берём на одно слово запроса
+MAX_QUERY_WORDS = 6
+CANDIDATES_PER_RESULT = 20
+
+
+def normalize(text) -> str:
+    """Нижний регистр + транслитерация + только буквы/цифры через пробел."""
+    text = (text or "").lower().translate(_TRANSLIT_TABLE)
+    return " ".join(_NON_WORD.split(text)).strip()
+
+
+def trigrams(word: str) -> set:
+    """Триграммы слова с выравниванием по краям ("  w", " wo", ..., "d ")."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def document_words(uni) -> tuple:
+    """Множества слов строки по полям (название, город, направления)."""
+    return (
+        set(normalize(uni.get("Name")).split()),
+        set(normalize(uni.get("City")).split()),
+        {w for s in split_specs(uni.get("Specialties")) for w in normalize(s).split()},
+    )
+
+
+class SearchIndex:
+    """Двухуровневый индекс: словарь слов (префикс + триграммы) и постинги по полям."""
+
+    def __init__(self, unis: list):
+        word_ids = {}
+        postings = ({}, {}, {})   # поле -> word id -> [row, ...]
+
+        for row, uni in enumerate(unis):
+            for field, words in enumerate(document_words(uni)):
+                for word in words:
+                    wid = word_ids.setdefault(word, len(word_ids))
+                    postings[field].setdefault(wid, []).append(row)
+
+        self.words = [None] * len(word_ids)
+        for word, wid in word_ids.items():
+            self.words[wid] = word
+        self.word_ids = word_ids
+        self.sorted_words = sorted(word_ids)
+        # array вместо list: ~8 байт на элемент вместо ~36
+        self.postings = tuple({wid: array("q", rows) for wid, rows in p.items()} for p in postings)
+
+        grams = {}
+        for wid, word in enumerate(self.words):
+            for gram in trigrams(word):
+                grams.setdefault(gram, []).append(wid)
+        self.word_grams = {g: array("q", ids) for g, ids in grams.items()}
+        self._gram_count = [len(trigrams(w)) for w in self.words]
+
+        self._expansions = LRUCache(4096)
+
+    @classmethod
+    def from_parts(cls, words, word_ids, sorted_words, postings, word_grams, gram_count) -> "SearchIndex":
+        """Индекс из готовых структур (снимок каталога, snapshot.py).
+
+        Нужны только операции чтения: ``word_ids.get``, ``wid in postings[f]``,
+        ``postings[f][wid]``, ``word_grams.get`` и индексирование последовательностей.
+        """
+        index = cls.__new__(cls)
+        index.words = words
+        index.word_ids = word_ids
+        index.sorted_words = sorted_words
+        index.postings = postings
+        index.word_grams = word_grams
+        index._gram_count = gram_count
+        index._expansions = LRUCache(4096)
+        return index
+
+    def with_changes(self, old: dict, new: dict) -> "SearchIndex":
+        """Копия индекса, в которой переиндексированы только изменённые строки.
+
+        old/new — row id -> строка до и после изменения (None — строки нет).
+        Новые слова дописываются в словарь. Слова, оставшиеся без строк,
+        убираются из словаря и триграмм (их word id больше не используются).
+        """
+        words, word_ids, sorted_words = list(self.words), dict(self.word_ids), list(self.sorted_words)
+        postings = tuple(dict(p) for p in self.postings)
+        word_grams, gram_count = dict(self.word_grams), list(self._gram_count)
+        copied = set()   # (поле, word id) уже скопированных постингов
+        emptied = set()  # word id, потерявшие строки хотя бы в одном поле
+
+        def posting(field, wid):
+            # Постинг, опустевший раньше в этом же пакете, уже удалён — создаём заново
+            p = postings[field].get(wid)
+            if p is None or (field, wid) not in copied:
+                copied.add((field, wid))
+                p = postings[field][wid] = array("q", p or ())
+            return p
+
+        for row in sorted(old.keys() | new.keys()):
+            before = document_words(old[row]) if old.get(row) is not None else (set(), set(), set())
+            after = document_words(new[row]) if new.get(row) is not None else (set(), set(), set())
+            for field in (FIELD_NAME, FIELD_CITY, FIELD_SPEC):
+                for word in before[field] - after[field]:
+                    p = posting(field, word_ids[word])
+                    del p[bisect_left(p, row)]
+                    if not p:
+                        del postings[field][word_ids[word]]
+                        emptied.add(word_ids[word])
+                for word in after[field] - before[field]:
+                    wid = word_ids.get(word)
+                    if wid is None:
+                        wid = word_ids[word] = len(words)
+                        words.append(word)
+                        insort(sorted_words, word)
+                        grams = trigrams(word)
+                        for gram in grams:
+                            word_grams[gram] = array("q", word_grams.get(gram, ())) + array("q", [wid])
+                        gram_count.append(len(grams))
+                    insort(posting(field, wid), row)
+
+        for wid in emptied:
+            if any(wid in p for p in postings):
+                continue
+            word = words[wid]
+            del word_ids[word]
+            del sorted_words[bisect_left(sorted_words, word)]
+            for gram in trigrams(word):
+                ids = word_grams[gram]
+                rest = array("q", (w for w in ids if w != wid))
+                if rest:
+                    word_grams[gram] = rest
+                else:
+                    del word_grams[gram]
+
+        return SearchIndex.from_parts(words, word_ids, sorted_words, postings, word_grams, gram_count)
+
+    def stats(self) -> dict:
+        return {"words": len(self.words), "trigrams": len(self.word_grams), "expansions": self._expansions.stats()}
+
+    def _expand(self, word: str) -> list:
+        """Слова словаря, похожие на слово запроса: [(похожесть, word id), ...] по убыванию."""
+        return self._expansions.get(word, lambda: self._compute_expansions(word))
+
+    def _compute_expansions(self, word: str) -> list:
+        sims = {}
+
+        exact = self.word_ids.get(word)
+        if exact is not None:
+            sims[exact] = 1.0
+
+        # Префикс: "каз" -> "kazakh...", "kaznu", ...
+        if len(word) >= 2:
+            i = bisect_left(self.sorted_words, word)
+            n = 0
+            while i < len(self.sorted_words) and n < MAX_EXPANSIONS * 4:
+                cand = self.sorted_words[i]
+                if not cand.startswith(word):
+                    break
+                if cand != word:
+                    wid = self.word_ids[cand]
+                    sims[wid] = max(sims.get(wid, 0.0), 0.6 + 0.35 * len(word) / len(cand))
+                i += 1
+                n += 1
+
+        # Триграммы (коэффициент Дайса) — устойчивость к опечаткам
+        if len(word) >= 3:
+            q_grams = trigrams(word)
+            overlap = {}
+            for gram in q_grams:
+                for wid in self.word_grams.get(gram, ()):
+                    overlap[wid] = overlap.get(wid, 0) + 1
+            for wid, common in overlap.items():
+                dice = 2.0 * common / (len(q_grams) + self._gram_count[wid])
+                if dice >= MIN_SIMILARITY and dice > sims.get(wid, 0.0):
+                    sims[wid] = min(dice, 0.99)
+
+        best = heapq.nlargest(MAX_EXPANSIONS, ((s, -wid) for wid, s in sims.items()))
+        return [(s, -neg) for s, neg in best]
+
+    def _pairs(self, word: str) -> list:
+        """Пары (вес, поле, word id) для слова запроса по убыванию веса."""
+        pairs = []
+        for sim, wid in self._expand(word):
+            for field in (FIELD_NAME, FIELD_CITY, FIELD_SPEC):
+                if wid in self.postings[field]:
+                    pairs.append((sim * FIELD_WEIGHTS[field], field, wid))
+        pairs.sort(key=lambda p: (-p[0], p[1], p[2]))
+        return pairs
+
+    def _has(self, field: int, wid: int, row: int) -> bool:
+        posting = self.postings[field][wid]
+        i = bisect_left(posting, row)
+        return i < len(posting) and posting[i] == row
+
+    def search(self, query: str, k: int = 5) -> list:
+        """Возвращает до k row id, отсортированных по релевантности."""
+        words = list(dict.fromkeys(normalize(query).split()))[:MAX_QUERY_WORDS]
+        word_pairs = [p for p in (self._pairs(w) for w in words) if p]
+        if not word_pairs:
+            return []
+
+        # Ведущее слово — с наименьшим числом строк; остальные только доранжируют
+        word_pairs.sort(key=lambda ps: sum(len(self.postings[f][wid]) for _, f, wid in ps))
+        driver, others = word_pairs[0], word_pairs[1:]
+        limit = k if not others else max(k * CANDIDATES_PER_RESULT, 100)
+
+        # Пары идут по убыванию веса, поэтому первое появление строки — её лучший вес
+        candidates = {}
+        for weight, field, wid in driver:
+            for row in self.postings[field][wid]:
+                if row not in candidates:
+                    candidates[row] = weight
+                    if len(candidates) >= limit:
+                        break
+            if len(candidates) >= limit:
+                break
+
+        if not others:
+            return sorted(candidates, key=lambda r: (-candidates[r], r))
+
+        # Доранжирование: для каждого другого слова — лучший вес среди его пар
+        scores = dict(candidates)
+        for pairs in others:
+            found = {}
+            for weight, field, wid in pairs:
+                posting = self.postings[field][wid]
+                if len(posting) <= 4 * len(candidates):
+                    hits = (row for row in posting if row in candidates)
+                else:
+                    hits = (row for row in candidates if self._has(field, wid, row))
+                for row in hits:
+                    if row not in found:
+                        found[row] = weight
+                if len(found) == len(candidates):
+                    break
+            for row, weight in found.items():
+                scores[row] += weight
+
+        return heapq.nsmallest(k, scores, key=lambda r: (-scores[r], r))
@@ -0,0 +1,231 @@
+"""Хранилище пользовательских сессий (фильтры, страница, список сравнения).
+
+Два бэкенда с общим интерфейсом ``get(user_id) -> dict``:
+
+* ``MemorySessionStore`` — в памяти, с ограничением по числу пользователей (LRU)
+  и временем жизни (TTL). Память не растёт с числом когда-либо заходивших пользователей.
+* ``SQLiteSessionStore`` — тот же LRU-кэш в памяти плюс отложенная запись в SQLite:
+  изменённые сессии сбрасываются на диск пачкой раз в ``flush_interval`` секунд
+  в фоновом потоке, поэтому обработчики не ждут commit на каждый клик.
+
+Сессия — обычный dict, обработчики меняют его на месте, как раньше ``user_state``,
+и после изменения вызывают ``save(user_id)``: на диск попадают только изменённые сессии.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+logger = logging.getLogger(__name__)
+
+
+def new_session() -> dict:
+    return {
+        "filters": {
+            "city": None,
+            "spec": None,
+            "score": None,
+        },
+        "start": 0,   # позиция первой строки последней показанной страницы списка
+        "await_score": False,
+        "await_rec": False,   # ждём балл для подбора «куда я прохожу» (recommend.py)
+        "compare": [],
+        "reply_kb_removed": False,  # старая Reply-клавиатура уже снята (см. responses.py)
+    }
+
+
+class MemorySessionStore:
+    """Сессии в памяти с LRU-вытеснением и TTL (ttl=None — без ограничения по времени)."""
+
+    def __init__(self, maxsize: int = 100_000, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # user_id -> [сессия, момент истечения]
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, user_id: int) -> dict:
+        """Возвращает сессию пользователя, создавая её при необходимости."""
+        now = time.monotonic()
+        expires = now + self.ttl if self.ttl else None
+        entry = self._data.get(user_id)
+        if entry is not None and (expires is None or entry[1] > now):
+            entry[1] = expires
+            self._data.move_to_end(user_id)
+            return entry[0]
+
+        session = self._load(user_id) or new_session()
+        self._data[user_id] = [session, expires]
+        self._data.move_to_end(user_id)
+        self._evict(now)
+        return session
+
+    def _evict(self, now: float):
+        # Порядок в OrderedDict — порядок обращений, поэтому просроченные записи всегда в начале
+        data = self._data
+        while data:
+            user_id, (_, expires) = next(iter(data.items()))
+            if len(data) > self.maxsize or (expires is not None and expires <= now):
+                data.popitem(last=False)
+            else:
+                break
+
+    def save(self, user_id: int):
+        """Сессия изменена на месте; в памяти сохранять нечего."""
+
+    def _load(self, user_id: int):
+        return None
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class SQLiteSessionStore(MemorySessionStore):
+    """LRU-кэш сессий в памяти с отложенной пакетной записью в SQLite (WAL)."""
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = 100_000,
+        ttl: float = None,
+        flush_interval: float = 1.0,
+    ):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._dirty = {}   # user_id -> сессия, ожидающая записи
+        self._task = None
+        self._lock = threading.Lock()
+
+        # timeout: базу могут одновременно писать несколько процессов (cluster.py)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " user_id INTEGER PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+        self._conn.commit()
+        # Промах кэша читается в потоке событий отдельным соединением, без self._lock:
+        # запись держит блокировку на всё время executemany/commit, а в WAL читатель
+        # писателя не ждёт
+        self._reader = sqlite3.connect(path, check_same_thread=False, timeout=1)
+
+    def save(self, user_id: int):
+        """Помечает сессию изменённой: она будет записана при следующем сбросе."""
+        entry = self._data.get(user_id)
+        if entry is not None:
+            self._dirty[user_id] = entry[0]
+
+    def _load(self, user_id: int):
+        session = self._dirty.get(user_id)
+        if session is not None:
+            return session
+        try:
+            row = self._reader.execute(
+                "SELECT data, updated_at FROM sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        except sqlite3.Error:
+            logger.exception(f"Не удалось прочитать сессию пользователя {user_id}, создаю новую.")
+            return None
+        if row is None:
+            return None
+        if self.ttl and row[1] < time.time() - self.ttl:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            logger.warning(f"Повреждённая сессия пользователя {user_id}, создаю новую.")
+            return None
+
+    def _write(self, batch: list):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    batch,
+                )
+                if self.ttl:
+                    self._conn.execute(
+                        "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,)
+                    )
+
+    async def flush(self):
+        """Записывает все изменённые сессии одной транзакцией."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        now = time.time()
+        # Сериализуем в потоке событий, чтобы не гоняться с обработчиками за dict
+        batch = [(uid, json.dumps(s, ensure_ascii=False), now) for uid, s in dirty.items()]
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except sqlite3.Error:
+            logger.exception("Не удалось сохранить сессии, повторю при следующем сбросе.")
+            for uid, s in dirty.items():
+                self._dirty.setdefault(uid, s)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self._reader.close()
+        with self._lock:
+            self._conn.close()
+
+
+class SessionFSMStorage(BaseStorage):
+    """FSM-хранилище aiogram поверх хранилища сессий.
+
+    Состояние и данные FSM хранятся в той же сессии пользователя (ключ — user_id),
+    поэтому на них распространяются те же ограничения памяти и персистентность.
+    """
+
+    def __init__(self, store: MemorySessionStore):
+        self.store = store
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        self.store.get(key.user_id)["fsm_state"] = state.state if isinstance(state, State) else state
+        self.store.save(key.user_id)
+
+    async def get_state(self, key: StorageKey):
+        return self.store.get(key.user_id).get("fsm_state")
+
+    async def set_data(self, key: StorageKey, data: dict) -> None:
+        self.store.get(key.user_id)["fsm_data"] = dict(data)
+        self.store.save(key.user_id)
+
+    async def get_data(self, key: StorageKey) -> dict:
+        return dict(self.store.get(key.user_id).get("fsm_data") or {})
+
+    async def close(self) -> None:
+        await self.store.close()
@@ -0,0 +1,418 @@
+"""Бинарный снимок каталога: сборка офлайн и открытие через mmap.
+
+Сборка (один раз после изменения данных):
+
+    python snapshot.py build universities.db catalog.snap
+    python snapshot.py build universities_kz_filled.csv catalog.snap
+    python snapshot.py info catalog.snap
+
+Снимок содержит всё, что бот иначе строит при каждом старте: колонки списков,
+словарь по ID, индексы фильтров и полнотекстового поиска, готовый HTML карточек
+и полные тексты ВУЗов (JSON). Бот с ``CATALOG_SNAPSHOT`` открывает файл через
+mmap только для чтения и ничего не пересчитывает, а страницы файла лежат в page
+cache ОС и общие для всех процессов (см. cluster.py).
+
+Формат:
+
+* ``MAGIC`` (8 байт), версия формата и длина метаданных (``<II``);
+* метаданные — JSON: версия данных (хэш содержимого), число строк, списки
+  городов и направлений, нецелые MinScore и каталог секций
+  ``имя -> [смещение, длина, typecode]``;
+* секции, выровненные по 8 байт: массивы (открываются как ``memoryview.cast``),
+  таблицы строк (UTF-8 блоб + смещения) и CSR-списки row id
+  (``.offsets`` + ``.rows``: элементы i-го списка — ``rows[offsets[i]:offsets[i + 1]]``).
+
+Массивы пишутся в порядке байтов машины сборки (он записан в метаданных).
+Файл заменяется атомарно (os.replace): работающий бот видит либо старый снимок,
+либо новый, а CatalogWatcher подхватывает его так же, как изменения БД.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+
+from catalog import CatalogIndex
+from columns import StringTable, UniColumns
+from dataset import Catalog, row_to_uni
+from render import build_uni_card
+from search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"UNISNAP1"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<II")
+_ALIGN = 8
+
+CSV_COLUMNS = ("ID", "Name", "City", "Specialties", "MinScore", "About", "Programs",
+               "Admission", "Tour_3d", "International", "Website")
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+# ================== ЧТЕНИЕ ==================
+
+class _CSR(Sequence):
+    """i -> i-й список row id (срез общего массива, без копирования)."""
+
+    __slots__ = ("_offsets", "_rows")
+
+    def __init__(self, offsets, rows):
+        self._offsets = offsets
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._rows[self._offsets[i]:self._offsets[i + 1]]
+
+
+class _Permuted(Sequence):
+    """Последовательность seq в порядке order (слова словаря по алфавиту)."""
+
+    __slots__ = ("_seq", "_order")
+
+    def __init__(self, seq, order):
+        self._seq = seq
+        self._order = order
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, i):
+        return self._seq[self._order[i]]
+
+
+class _SortedMap(Mapping):
+    """Отображение по отсортированным ключам: поиск бинарный, без dict в памяти."""
+
+    __slots__ = ("_keys", "_values")
+
+    def __init__(self, keys, values):
+        self._keys = keys
+        self._values = values
+
+    def __getitem__(self, key):
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._values[i]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class _Postings(Mapping):
+    """word id -> row id поля; слова без вхождений в поле отсутствуют."""
+
+    __slots__ = ("_csr",)
+
+    def __init__(self, csr: _CSR):
+        self._csr = csr
+
+    def __getitem__(self, wid):
+        if 0 <= wid < len(self._csr):
+            rows = self._csr[wid]
+            if len(rows):
+                return rows
+        raise KeyError(wid)
+
+    def __contains__(self, wid):
+        offsets = self._csr._offsets
+        return 0 <= wid < len(offsets) - 1 and offsets[wid + 1] > offsets[wid]
+
+    def __iter__(self):
+        return (wid for wid in range(len(self._csr)) if wid in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def load_snapshot(path: str, version: int = 0):
+    """Открывает снимок через mmap и собирает Catalog без пересчёта. None — если файла нет.
+
+    ValueError — если файл не является снимком или собран в другом формате.
+    """
+    if not os.path.exists(path):
+        logger.error(f"Файл снимка каталога {path} не найден. Соберите его: python snapshot.py build")
+        return None
+
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path}: не снимок каталога")
+    fmt, meta_len = _HEADER.unpack_from(mm, len(MAGIC))
+    if fmt != FORMAT_VERSION:
+        raise ValueError(f"{path}: формат снимка {fmt}, ожидается {FORMAT_VERSION}")
+    start = len(MAGIC) + _HEADER.size
+    meta = json.loads(mm[start:start + meta_len])
+    if meta["byteorder"] != sys.byteorder:
+        raise ValueError(f"{path}: снимок собран с порядком байтов {meta['byteorder']}")
+
+    base = _aligned(start + meta_len)
+    buf = memoryview(mm)
+    sections = meta["sections"]
+
+    def arr(name):
+        offset, nbytes, typecode = sections[name]
+        return buf[base + offset:base + offset + nbytes].cast(typecode)
+
+    def strings(name):
+        return StringTable.from_buffers(arr(name + ".blob"), arr(name + ".offsets"))
+
+    def csr(name):
+        return _CSR(arr(name + ".offsets"), arr(name + ".rows"))
+
+    def keyed(name):
+        return _SortedMap(strings(name + ".keys"), csr(name))
+
+    columns = UniColumns.from_parts(
+        ids=strings("ids"),
+        names=strings("names"),
+        city_codes=arr("city_codes"),
+        city_table=strings("city_table"),
+        spec_codes=arr("spec_codes"),
+        spec_table=strings("spec_table"),
+        scores=arr("scores"),
+        score_raw={row: value for row, value in meta["score_raw"]},
+    )
+    index = CatalogIndex.from_parts(
+        size=meta["rows"],
+        by_city=keyed("by_city"),
+        by_spec=keyed("by_spec"),
+        scores=arr("index.scores"),
+        score_order=arr("index.score_order"),
+        neg_scores=arr("index.neg_scores"),
+    )
+    words = strings("words")
+    sorted_wids = arr("sorted_wids")
+    sorted_words = _Permuted(words, sorted_wids)
+    search = SearchIndex.from_parts(
+        words=words,
+        word_ids=_SortedMap(sorted_words, sorted_wids),
+        sorted_words=sorted_words,
+        postings=tuple(_Postings(csr(f"postings{f}")) for f in range(3)),
+        word_grams=keyed("grams"),
+        gram_count=arr("gram_count"),
+    )
+    info = {k: meta[k] for k in ("data_version", "source", "built_at", "rows")}
+    info["path"] = path
+    info["bytes"] = len(mm)
+    return Catalog.from_parts(
+        columns,
+        by_id_rows=_SortedMap(strings("by_id.keys"), arr("by_id.rows")),
+        index=index,
+        search=search,
+        cities=meta["cities"],
+        specialties=meta["specialties"],
+        cards=strings("cards"),
+        details=strings("details"),
+        snapshot=info,
+        version=version,
+    )
+
+
+class SnapshotDetails:
+    """Полные карточки из снимка; интерфейс как у dataset.DetailsStore.
+
+    Тексты уже лежат в mmap текущего каталога, поэтому ни потоков, ни кэша не нужно.
+    """
+
+    def __init__(self, get_catalog):
+        self._get_catalog = get_catalog
+
+    async def get_many(self, ids: list) -> dict:
+        catalog = self._get_catalog()
+        found = {}
+        for uid in ids:
+            uni = catalog.detail(uid)
+            if uni is not None:
+                found[uid] = uni
+        return found
+
+    async def get(self, uid: str):
+        return self._get_catalog().detail(uid)
+
+    def clear(self):
+        pass
+
+    def forget(self, ids):
+        pass
+
+    def close(self):
+        pass
+
+
+# ================== СБОРКА ==================
+
+def _csv_value(key: str, value: str):
+    if key == "MinScore":
+        # Как в SQLite с INTEGER-колонкой: число, если строка — целое, иначе как есть
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+    return value or ""
+
+
+def read_source(path: str) -> list:
+    """Полные карточки из universities.db или CSV того же формата, в исходном порядке."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return [{k: _csv_value(k, row.get(k)) for k in CSV_COLUMNS} for row in csv.DictReader(f)]
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [row_to_uni(r) for r in conn.execute("SELECT * FROM universities")]
+    finally:
+        conn.close()
+
+
+class _Writer:
+    """Копит секции снимка: (имя, typecode, байты)."""
+
+    def __init__(self):
+        self.sections = []
+
+    def array(self, name: str, typecode: str, values):
+        if not (isinstance(values, array) and values.typecode == typecode):
+            values = array(typecode, values)
+        self.sections.append((name, typecode, values.tobytes()))
+
+    def strings(self, name: str, table: StringTable):
+        blob, offsets = table.buffers()
+        self.array(name + ".offsets", "I", offsets)
+        self.sections.append((name + ".blob", "B", bytes(blob)))
+
+    def csr(self, name: str, lists):
+        offsets, rows = array("I", [0]), array("I")
+        for items in lists:
+            rows.extend(array("I", items))
+            offsets.append(len(rows))
+        self.array(name + ".offsets", "I", offsets)
+        self.array(name + ".rows", "I", rows)
+
+    def keyed(self, name: str, mapping: dict):
+        """Ключ (str) -> набор row id: отсортированные ключи + CSR отсортированных списков."""
+        keys = sorted(mapping)
+        self.strings(name + ".keys", StringTable(keys))
+        self.csr(name, (sorted(mapping[k]) for k in keys))
+
+    def write(self, path: str, meta: dict):
+        layout = {}
+        offset = 0
+        for name, typecode, data in self.sections:
+            layout[name] = [offset, len(data), typecode]
+            offset = _aligned(offset + len(data))
+        meta = {**meta, "sections": layout}
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        header = MAGIC + _HEADER.pack(FORMAT_VERSION, len(meta_bytes)) + meta_bytes
+
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(b"\0" * (_aligned(len(header)) - len(header)))
+            for _, _, data in self.sections:
+                f.write(data)
+                f.write(b"\0" * (_aligned(len(data)) - len(data)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+
+def build_snapshot(source: str, out_path: str) -> dict:
+    """Собирает снимок из universities.db / CSV в out_path; возвращает метаданные."""
+    unis = read_source(source)
+    cat = Catalog(unis)
+    cols, index, search = cat.columns, cat.index, cat.search
+
+    digest = hashlib.sha256()
+    for uni in unis:
+        digest.update(json.dumps(uni, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+    w = _Writer()
+    w.strings("ids", cols.ids)
+    w.strings("names", cols.names)
+    w.array("city_codes", "I", cols.city_codes)
+    w.strings("city_table", StringTable(cols.city_table))
+    w.array("spec_codes", "I", cols.spec_codes)
+    w.strings("spec_table", StringTable(cols.spec_table))
+    w.array("scores", "i", cols.scores)
+
+    by_id = sorted((uid, cat.by_id.row_of(uid)) for uid in cat.by_id)
+    w.strings("by_id.keys", StringTable(uid for uid, _ in by_id))
+    w.array("by_id.rows", "I", (row for _, row in by_id))
+
+    w.keyed("by_city", index.by_city)
+    w.keyed("by_spec", index.by_spec)
+    w.array("index.scores", "q", index.scores)
+    w.array("index.score_order", "q", index.score_order)
+    w.array("index.neg_scores", "q", index.neg_scores)
+
+    w.strings("words", StringTable(search.words))
+    w.array("sorted_wids", "I", (search.word_ids[word] for word in search.sorted_words))
+    for field, postings in enumerate(search.postings):
+        w.csr(f"postings{field}", (postings.get(wid, ()) for wid in range(len(search.words))))
+    w.keyed("grams", search.word_grams)
+    w.array("gram_count", "I", search._gram_count)
+
+    w.strings("cards", StringTable(build_uni_card(uni) for uni in unis))
+    w.strings("details", StringTable(json.dumps(uni, ensure_ascii=False) for uni in unis))
+
+    meta = {
+        "data_version": digest.hexdigest()[:16],
+        "source": os.path.basename(source),
+        "built_at": int(time.time()),
+        "rows": len(unis),
+        "byteorder": sys.byteorder,
+        "cities": cat.cities,
+        "specialties": cat.specialties,
+        "score_raw": sorted(cols.score_raw.items()),
+    }
+    w.write(out_path, meta)
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бинарный снимок каталога ВУЗов для быстрого старта.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="собрать снимок из SQLite (.db) или CSV")
+    build.add_argument("source", nargs="?", default=os.getenv("DB_PATH", "universities.db"))
+    build.add_argument("out", nargs="?", default=os.getenv("CATALOG_SNAPSHOT") or "catalog.snap")
+    info = sub.add_parser("info", help="показать метаданные снимка")
+    info.add_argument("path", nargs="?", default=os.getenv("CATALOG_SNAPSHOT") or "catalog.snap")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        meta = build_snapshot(args.source, args.out)
+        print(f"{args.out}: {meta['rows']} ВУЗов, версия данных {meta['data_version']}, "
+              f"{os.path.getsize(args.out) / 1e6:.1f} МБ за {time.perf_counter() - started:.1f} с")
+    else:
+        cat = load_snapshot(args.path)
+        if cat is None:
+            sys.exit(1)
+        for key, value in cat.snapshot.items():
+            print(f"{key:13} {value}")
+
+
+if __name__ == "__main__":
+    main()
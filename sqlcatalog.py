@@ -0,0 +1,372 @@
+"""Нормализованная схема каталога в SQLite и фильтры бота прямо в SQL.
+
+    python sqlcatalog.py migrate [--db universities.db]
+    python sqlcatalog.py rebuild
+    python sqlcatalog.py query --city Алматы --spec IT --score 100 [--limit 5] [--offset 10]
+    python sqlcatalog.py search "казну информатика"
+
+Миграция (``migrate``, идемпотентна, версия — ``PRAGMA user_version``) добавляет
+к ``universities``:
+
+* ``cities`` и ``specialties`` — справочники с нормализованным ключом ``norm``;
+* ``university_specialties`` — связь ВУЗ–направление по отдельным токенам
+  ``specialties`` (как ``split_specs``);
+* ``universities.city_id`` и вычисляемую колонку ``score`` (MinScore как в
+  CatalogIndex: пусто — 0, нецелое — NULL) и индексы по городу, баллу
+  и направлению;
+* ``universities_fts`` — полнотекстовый индекс FTS5 по названию, городу,
+  направлениям, описанию и программам.
+
+Колонки ``city`` и ``specialties`` остаются источником данных: справочники,
+связи и FTS поддерживаются триггерами при любой записи в ``universities``
+(импорт, ручной SQL). Ключ ``norm`` — ``lower(trim(...))`` по правилам SQLite:
+регистр нормализуется только для латиницы, поэтому параметры запросов
+нормализуются тем же выражением в SQL. FTS привязан к rowid строк: VACUUM
+может их перенумеровать, после него нужен ``rebuild``.
+
+``SQLCatalog`` отвечает на фильтры бота (город, направление, балл) с тем же
+порядком, что ``CatalogIndex.query``: без балла — в порядке строк, с баллом —
+по убыванию балла. Страницы — через LIMIT/OFFSET (``page``) или по ключу
+последней строки (``page_after``), без пересчёта всего списка.
+"""
+
+import argparse
+from contextlib import contextmanager
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+from dataset import row_to_listing
+
+SCHEMA_VERSION = 1
+FTS_TABLE = "universities_fts"
+FTS_COLUMNS = ("name", "city", "specialties", "about", "programs")
+FTS_WEIGHTS = (4.0, 2.0, 2.0, 1.0, 1.0)
+
+# MinScore -> балл для фильтра, как catalog.parse_score: NULL — 0, нецелое — NULL
+SCORE_EXPR = ("CASE typeof(min_score) WHEN 'null' THEN 0 WHEN 'integer' THEN min_score "
+              "WHEN 'real' THEN CAST(min_score AS INTEGER) END")
+
+
+def _specs_json(column: str) -> str:
+    """Выражение SQL: "IT, Математика" -> '["IT"," Математика"]' для json_each (в триггерах нельзя CTE)."""
+    text = f"replace(replace(replace(replace(coalesce({column}, ''), '\\', '\\\\'), '\"', '\\\"'), char(10), ' '), char(13), ' ')"
+    array = f"'[\"' || replace({text}, ',', '\",\"') || '\"]'"
+    return f"CASE WHEN json_valid({array}) THEN {array} ELSE '[]' END"
+
+
+def _link_statements(ref: str) -> str:
+    """Операторы, заполняющие справочники и связи для строки ref (NEW в триггере).
+
+    Без OR IGNORE: в триггере его перекрывает конфликт-клауза внешнего оператора
+    (апсерт importer.py), поэтому дубликаты отсекаются явно.
+    """
+    specs = _specs_json(f"{ref}.specialties")
+    return f"""
+    INSERT INTO cities (name, norm)
+        SELECT trim({ref}.city), lower(trim({ref}.city)) WHERE trim(coalesce({ref}.city, '')) != ''
+        AND NOT EXISTS (SELECT 1 FROM cities WHERE norm = lower(trim({ref}.city)));
+    UPDATE universities SET city_id = (SELECT id FROM cities WHERE norm = lower(trim({ref}.city)))
+        WHERE rowid = {ref}.rowid;
+    INSERT INTO specialties (name, norm)
+        SELECT min(trim(value)), lower(trim(value)) FROM json_each({specs})
+        WHERE trim(value) != '' AND NOT EXISTS (SELECT 1 FROM specialties WHERE norm = lower(trim(value)))
+        GROUP BY lower(trim(value));
+    INSERT INTO university_specialties (university_id, specialty_id)
+        SELECT DISTINCT {ref}.id, s.id FROM json_each({specs}) AS j JOIN specialties AS s ON s.norm = lower(trim(j.value));
+"""
+
+
+def _fts_values(ref: str) -> str:
+    return ", ".join(f"{ref}.{c}" for c in FTS_COLUMNS)
+
+
+TABLES = f"""
+CREATE TABLE IF NOT EXISTS cities (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    norm TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS specialties (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    norm TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS university_specialties (
+    university_id TEXT NOT NULL,
+    specialty_id INTEGER NOT NULL REFERENCES specialties(id),
+    PRIMARY KEY (university_id, specialty_id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    {", ".join(FTS_COLUMNS)},
+    content='universities', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_universities_city ON universities (city_id);
+CREATE INDEX IF NOT EXISTS idx_universities_city_score ON universities (city_id, score DESC);
+CREATE INDEX IF NOT EXISTS idx_universities_score ON universities (score DESC);
+CREATE INDEX IF NOT EXISTS idx_university_specialties_specialty ON university_specialties (specialty_id, university_id);
+"""
+
+TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS universities_norm_insert AFTER INSERT ON universities
+BEGIN
+    {_link_statements("NEW")}
+END;
+CREATE TRIGGER IF NOT EXISTS universities_fts_insert AFTER INSERT ON universities
+BEGIN
+    INSERT INTO {FTS_TABLE} (rowid, {", ".join(FTS_COLUMNS)}) VALUES (NEW.rowid, {_fts_values("NEW")});
+END;
+CREATE TRIGGER IF NOT EXISTS universities_norm_update AFTER UPDATE OF id, city, specialties ON universities
+BEGIN
+    DELETE FROM university_specialties WHERE university_id = OLD.id;
+    {_link_statements("NEW")}
+END;
+CREATE TRIGGER IF NOT EXISTS universities_fts_update AFTER UPDATE OF {", ".join(FTS_COLUMNS)} ON universities
+BEGIN
+    INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {", ".join(FTS_COLUMNS)}) VALUES ('delete', OLD.rowid, {_fts_values("OLD")});
+    INSERT INTO {FTS_TABLE} (rowid, {", ".join(FTS_COLUMNS)}) VALUES (NEW.rowid, {_fts_values("NEW")});
+END;
+CREATE TRIGGER IF NOT EXISTS universities_norm_delete AFTER DELETE ON universities
+BEGIN
+    DELETE FROM university_specialties WHERE university_id = OLD.id;
+    INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {", ".join(FTS_COLUMNS)}) VALUES ('delete', OLD.rowid, {_fts_values("OLD")});
+END;
+"""
+
+TRIGGER_NAMES = tuple(re.findall(r"CREATE TRIGGER IF NOT EXISTS (\w+)", TRIGGERS))
+
+# Полный пересчёт справочников, связей и FTS по текущему содержимому universities
+REBUILD = f"""
+DELETE FROM university_specialties;
+INSERT OR IGNORE INTO cities (name, norm)
+    SELECT trim(city), lower(trim(city)) FROM universities WHERE trim(coalesce(city, '')) != '' ORDER BY rowid;
+UPDATE universities SET city_id = (SELECT id FROM cities WHERE norm = lower(trim(universities.city)));
+INSERT OR IGNORE INTO specialties (name, norm)
+    SELECT trim(j.value), lower(trim(j.value)) FROM universities AS u, json_each({_specs_json("u.specialties")}) AS j
+    WHERE trim(j.value) != '' ORDER BY u.rowid;
+INSERT OR IGNORE INTO university_specialties (university_id, specialty_id)
+    SELECT u.id, s.id FROM universities AS u, json_each({_specs_json("u.specialties")}) AS j
+    JOIN specialties AS s ON s.norm = lower(trim(j.value));
+INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild');
+"""
+
+
+def is_migrated(conn: sqlite3.Connection) -> bool:
+    return conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION
+
+
+def migrate(conn: sqlite3.Connection) -> bool:
+    """Приводит схему к SCHEMA_VERSION; False — миграция уже была применена."""
+    if is_migrated(conn):
+        return False
+    columns = {r[1] for r in conn.execute("PRAGMA table_xinfo(universities)")}
+    if not columns:
+        raise sqlite3.OperationalError("в базе нет таблицы universities")
+    with conn:
+        if "city_id" not in columns:
+            conn.execute("ALTER TABLE universities ADD COLUMN city_id INTEGER REFERENCES cities(id)")
+        if "score" not in columns:
+            conn.execute(f"ALTER TABLE universities ADD COLUMN score INTEGER GENERATED ALWAYS AS ({SCORE_EXPR}) VIRTUAL")
+    conn.executescript(f"BEGIN; {TABLES} {REBUILD} {INDEXES} {TRIGGERS} PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+    conn.execute("ANALYZE")
+    return True
+
+
+@contextmanager
+def bulk_load(conn: sqlite3.Connection):
+    """Массовая запись в universities без построчных триггеров схемы.
+
+    FTS5 в триггере сбрасывает буфер на каждой строке, и импорт сотен тысяч
+    строк замедляется в разы. Внутри блока триггеры справочников и FTS сняты
+    (журнал catalog_changes продолжает работать), на выходе всё пересчитывается
+    одним проходом REBUILD и триггеры возвращаются — даже после ошибки.
+    """
+    if not is_migrated(conn):
+        yield
+        return
+    conn.commit()
+    conn.executescript("BEGIN; " + "".join(f"DROP TRIGGER IF EXISTS {t}; " for t in TRIGGER_NAMES) + "COMMIT;")
+    try:
+        yield
+    finally:
+        conn.commit()
+        conn.executescript(f"BEGIN; {REBUILD} {TRIGGERS} COMMIT;")
+
+
+_WORD = re.compile(r"\w+")
+
+
+class SQLCatalog:
+    """Фильтры и поиск по нормализованной схеме; соединение только для чтения на поток."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _where(city, spec, score) -> tuple:
+        """(FROM, условия, параметры) для фильтров бота."""
+        source, clauses, params = "universities AS u", [], []
+        if spec:
+            source += " JOIN university_specialties AS us ON us.university_id = u.id"
+            clauses.append("us.specialty_id = (SELECT id FROM specialties WHERE norm = lower(trim(?)))")
+            params.append(spec)
+        if city:
+            clauses.append("u.city_id = (SELECT id FROM cities WHERE norm = lower(trim(?)))")
+            params.append(city)
+        if score is not None:
+            clauses.append("u.score >= ?")
+            params.append(int(score))
+        return source, clauses, params
+
+    def _select(self, city, spec, score, extra: str = "", extra_params=(), order: str = None, limit=None, offset=0):
+        source, clauses, params = self._where(city, spec, score)
+        if extra:
+            clauses.append(extra)
+            params.extend(extra_params)
+        sql = f"SELECT u.rowid AS rowid, u.score AS score, u.id, u.name, u.city, u.specialties, u.min_score FROM {source}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY " + (order or ("u.score DESC, u.rowid" if score is not None else "u.rowid"))
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        return self._conn().execute(sql, params).fetchall()
+
+    def count(self, city=None, spec=None, score=None) -> int:
+        source, clauses, params = self._where(city, spec, score)
+        sql = f"SELECT COUNT(*) FROM {source}" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+        return self._conn().execute(sql, params).fetchone()[0]
+
+    def ids(self, city=None, spec=None, score=None) -> list:
+        """Все подходящие ID в порядке CatalogIndex.query."""
+        return [r["id"] for r in self._select(city, spec, score)]
+
+    def page(self, city=None, spec=None, score=None, limit: int = 5, offset: int = 0) -> list:
+        """Страница строк (словари как row_to_listing) через LIMIT/OFFSET."""
+        return [row_to_listing(r) for r in self._select(city, spec, score, limit=limit, offset=offset)]
+
+    def page_after(self, city=None, spec=None, score=None, after=None, before=None, limit: int = 5) -> tuple:
+        """Страница по ключу: строки после ``after`` (или перед ``before``) и ключи крайних строк.
+
+        Ключ — (балл, rowid) при фильтре по баллу, иначе (rowid,). Возвращает
+        (строки, ключ первой, ключ последней); ключи None, если страница пуста.
+        """
+        by_score = score is not None
+        extra, extra_params, order = "", [], None
+        key = after if after is not None else before
+        if key is not None:
+            if by_score:
+                s, rowid = key
+                op, cmp = (">", "<") if after is not None else ("<", ">")
+                # Первое условие — граница диапазона по индексу балла
+                extra = f"u.score {cmp}= ? AND (u.score {cmp} ? OR u.rowid {op} ?)"
+                extra_params = [s, s, rowid]
+            else:
+                extra = "u.rowid > ?" if after is not None else "u.rowid < ?"
+                extra_params = [key[0]]
+        if before is not None:
+            order = "u.score ASC, u.rowid DESC" if by_score else "u.rowid DESC"
+        rows = self._select(city, spec, score, extra, extra_params, order, limit)
+        if before is not None:
+            rows.reverse()
+        if not rows:
+            return [], None, None
+
+        def key_of(r):
+            return (r["score"], r["rowid"]) if by_score else (r["rowid"],)
+
+        return [row_to_listing(r) for r in rows], key_of(rows[0]), key_of(rows[-1])
+
+    def search(self, text: str, limit: int = 5) -> list:
+        """Полнотекстовый поиск (FTS5, префиксы слов): сначала все слова, иначе любое."""
+        words = _WORD.findall(text or "")[:6]
+        if not words:
+            return []
+        terms = ['"' + w.replace('"', '""') + '"*' for w in words]
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        sql = (
+            f"SELECT u.id, u.name, u.city, u.specialties, u.min_score FROM {FTS_TABLE} AS f "
+            f"JOIN universities AS u ON u.rowid = f.rowid WHERE {FTS_TABLE} MATCH ? "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}), u.rowid LIMIT ?"
+        )
+        conn = self._conn()
+        rows = conn.execute(sql, (" AND ".join(terms), limit)).fetchall()
+        if not rows and len(terms) > 1:
+            rows = conn.execute(sql, (" OR ".join(terms), limit)).fetchall()
+        return [row_to_listing(r) for r in rows]
+
+    def cities(self) -> list:
+        return [r[0] for r in self._conn().execute(
+            "SELECT c.name FROM cities AS c WHERE EXISTS (SELECT 1 FROM universities AS u WHERE u.city_id = c.id) "
+            "ORDER BY c.name")]
+
+    def specialties(self) -> list:
+        return [r[0] for r in self._conn().execute(
+            "SELECT s.name FROM specialties AS s WHERE EXISTS "
+            "(SELECT 1 FROM university_specialties AS us WHERE us.specialty_id = s.id) ORDER BY s.name")]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нормализованная схема каталога и запросы фильтров в SQL.")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "universities.db"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="создать справочники, связи, индексы и FTS5")
+    sub.add_parser("rebuild", help="пересчитать справочники, связи и FTS (например, после VACUUM)")
+    query = sub.add_parser("query", help="фильтр как в боте")
+    query.add_argument("--city")
+    query.add_argument("--spec")
+    query.add_argument("--score", type=int)
+    query.add_argument("--limit", type=int, default=5)
+    query.add_argument("--offset", type=int, default=0)
+    search = sub.add_parser("search", help="полнотекстовый поиск")
+    search.add_argument("text")
+    search.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command in ("migrate", "rebuild"):
+        conn = sqlite3.connect(args.db)
+        try:
+            if args.command == "migrate":
+                print("схема обновлена" if migrate(conn) else f"схема уже версии {SCHEMA_VERSION}")
+            elif not is_migrated(conn):
+                sys.exit("схема не мигрирована: сначала python sqlcatalog.py migrate")
+            else:
+                conn.executescript(f"BEGIN; {REBUILD} COMMIT;")
+                print("справочники, связи и FTS пересчитаны")
+        finally:
+            conn.close()
+        return
+
+    cat = SQLCatalog(args.db)
+    if args.command == "query":
+        print(f"найдено: {cat.count(args.city, args.spec, args.score)}")
+        rows = cat.page(args.city, args.spec, args.score, args.limit, args.offset)
+    else:
+        rows = cat.search(args.text, args.limit)
+    for u in rows:
+        print(f"{u['ID']:>10}  {u['MinScore']!s:>5}  {u['City']:<14} {u['Name']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Режим webhook: приём апдейтов через локальный aiohttp-сервер вместо long polling.
+
+Включается переменной окружения ``BOT_MODE=webhook`` (см. main.py). Для локальной
+проверки без Telegram можно отправить записанные апдейты прямо в эндпоинт:
+
+    python webhook.py updates.jsonl --url http://127.0.0.1:8080/webhook --secret <WEBHOOK_SECRET>
+
+где updates.jsonl — по одному JSON-объекту Update на строку.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import signal
+
+from aiohttp import ClientSession, web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, path: str, secret: str) -> web.Application:
+    """Собирает aiohttp-приложение с обработчиком апдейтов и проверкой секрета."""
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret).register(app, path=path)
+    # startup/shutdown диспетчера и закрытие сессии бота вместе с приложением
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    *,
+    host: str,
+    port: int,
+    path: str,
+    secret: str,
+    base_url: str = "",
+):
+    """Запускает webhook-сервер и ждёт SIGINT/SIGTERM для корректной остановки.
+
+    Если задан base_url (публичный HTTPS-адрес), регистрирует webhook в Telegram;
+    без него сервер только принимает POST-запросы локально.
+    """
+    app = build_webhook_app(dp, bot, path, secret)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"Webhook-сервер слушает http://{host}:{port}{path}")
+
+    if base_url:
+        await bot.set_webhook(
+            base_url.rstrip("/") + path,
+            secret_token=secret,
+            drop_pending_updates=True,
+        )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Остановка webhook-сервера...")
+        # Дожидаемся обработки принятых запросов и закрываем сессию бота
+        await runner.cleanup()
+
+
+async def post_updates(path: str, url: str, secret: str):
+    """Отправляет апдейты из JSONL-файла в webhook-эндпоинт (для локальных тестов)."""
+    async with ClientSession() as session:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                update = json.loads(line)
+                async with session.post(url, json=update, headers={SECRET_HEADER: secret}) as resp:
+                    print(update.get("update_id"), resp.status)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отправка записанных апдейтов в локальный webhook.")
+    parser.add_argument("file", help="JSONL-файл с объектами Update")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default="")
+    args = parser.parse_args()
+    asyncio.run(post_updates(args.file, args.url, args.secret))